@@ -0,0 +1,34 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+"""create employment change watermark table
+
+Revision ID: 3c2f6d1e9a47
+Revises: 0f89bea353d5
+Create Date: 2026-10-17 09:12:41.503218
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "3c2f6d1e9a47"
+down_revision: Union[str, None] = "0f89bea353d5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "employment_change_watermark",
+        sa.Column("institution_identifier", sa.String(20), primary_key=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("employment_change_watermark")
@@ -0,0 +1,41 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+"""add run statistics to rundb table
+
+Revision ID: 5b9e0c3a7d12
+Revises: 8d41b7c2e5f0
+Create Date: 2026-10-17 11:24:09.672315
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "5b9e0c3a7d12"
+down_revision: Union[str, None] = "8d41b7c2e5f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("rundb", sa.Column("institution_identifier", sa.String(20)))
+    op.add_column(
+        "rundb",
+        sa.Column("dry_run", sa.Boolean, nullable=False, server_default=sa.false()),
+    )
+    op.add_column("rundb", sa.Column("duration", sa.Float))
+    op.add_column("rundb", sa.Column("units_added", sa.Integer))
+    op.add_column("rundb", sa.Column("units_updated", sa.Integer))
+
+
+def downgrade() -> None:
+    op.drop_column("rundb", "units_updated")
+    op.drop_column("rundb", "units_added")
+    op.drop_column("rundb", "duration")
+    op.drop_column("rundb", "dry_run")
+    op.drop_column("rundb", "institution_identifier")
@@ -0,0 +1,36 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+"""create apply NY logic failure table
+
+Revision ID: 8d41b7c2e5f0
+Revises: 3c2f6d1e9a47
+Create Date: 2026-10-17 10:03:27.118942
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "8d41b7c2e5f0"
+down_revision: Union[str, None] = "3c2f6d1e9a47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "apply_ny_logic_failure",
+        sa.Column("institution_identifier", sa.String(20), primary_key=True),
+        sa.Column("org_unit_uuid", sa.Uuid, primary_key=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("error", sa.Text, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("apply_ny_logic_failure")
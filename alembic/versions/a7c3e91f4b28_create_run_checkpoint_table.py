@@ -0,0 +1,44 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+"""create run checkpoint table
+
+Revision ID: a7c3e91f4b28
+Revises: 5b9e0c3a7d12
+Create Date: 2026-10-17 12:41:55.204716
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c3e91f4b28"
+down_revision: Union[str, None] = "5b9e0c3a7d12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "run_checkpoint",
+        sa.Column("institution_identifier", sa.String(20), primary_key=True),
+        sa.Column("org_unit_uuid", sa.Uuid, primary_key=True),
+        sa.Column("position", sa.Integer, nullable=False),
+        sa.Column("mutation", sa.String(20), nullable=False),
+        sa.Column("parent_uuid", sa.Uuid, nullable=False),
+        sa.Column("name", sa.Text, nullable=False),
+        sa.Column("user_key", sa.Text, nullable=False),
+        sa.Column("org_unit_level_uuid", sa.Uuid),
+        sa.Column("validity_from", sa.DateTime(timezone=True)),
+        sa.Column("validity_to", sa.DateTime(timezone=True)),
+        sa.Column("in_obsolete_units_subtree", sa.Boolean, nullable=False),
+        sa.Column("applied", sa.Boolean, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("run_checkpoint")
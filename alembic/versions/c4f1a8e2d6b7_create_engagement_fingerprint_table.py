@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+"""create engagement fingerprint table
+
+Revision ID: c4f1a8e2d6b7
+Revises: e2b8d4f61c93
+Create Date: 2026-10-17 16:21:47.305918
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f1a8e2d6b7"
+down_revision: Union[str, None] = "e2b8d4f61c93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "engagement_fingerprint",
+        sa.Column("institution_identifier", sa.String(20), primary_key=True),
+        sa.Column("cpr", sa.String(10), primary_key=True),
+        sa.Column("employment_identifier", sa.String(20), primary_key=True),
+        sa.Column("sd_fingerprint", sa.String(64), nullable=False),
+        sa.Column("mo_fingerprint", sa.String(64), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("engagement_fingerprint")
@@ -0,0 +1,37 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+"""create full sync cursor table
+
+Revision ID: e2b8d4f61c93
+Revises: a7c3e91f4b28
+Create Date: 2026-10-17 14:03:12.871530
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "e2b8d4f61c93"
+down_revision: Union[str, None] = "a7c3e91f4b28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "full_sync_cursor",
+        sa.Column("institution_identifier", sa.String(20), primary_key=True),
+        sa.Column("cpr", sa.String(10)),
+        sa.Column("processed", sa.Integer, nullable=False),
+        sa.Column("total", sa.Integer, nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("full_sync_cursor")
@@ -0,0 +1,48 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+"""create engagement fingerprint unit table
+
+Revision ID: f3a9c7d2e5b1
+Revises: c4f1a8e2d6b7
+Create Date: 2026-10-18 09:12:33.518204
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "f3a9c7d2e5b1"
+down_revision: Union[str, None] = "c4f1a8e2d6b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "engagement_fingerprint_unit",
+        sa.Column("institution_identifier", sa.String(20), primary_key=True),
+        sa.Column("cpr", sa.String(10), primary_key=True),
+        sa.Column("employment_identifier", sa.String(20), primary_key=True),
+        sa.Column("org_unit_uuid", sa.Uuid, primary_key=True),
+    )
+    op.create_index(
+        "ix_engagement_fingerprint_unit_org_unit_uuid",
+        "engagement_fingerprint_unit",
+        ["org_unit_uuid"],
+    )
+    # The existing fingerprints do not cover any units, so they would never be
+    # invalidated by changes to the unit tree
+    op.execute("DELETE FROM engagement_fingerprint")
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_engagement_fingerprint_unit_org_unit_uuid",
+        table_name="engagement_fingerprint_unit",
+    )
+    op.drop_table("engagement_fingerprint_unit")
@@ -15,12 +15,12 @@ from httpx import Client
 from httpx import Timeout
 from more_itertools import first
 from more_itertools import one
-from sdclient.client import SDClient
 from sdclient.responses import Department
 
 from sdtoolplus.addresses import DARAddressUUID
 from sdtoolplus.models import AddressTypeUserKey
 from sdtoolplus.sd.addresses import get_addresses
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sd.importer import get_sd_departments
 
 QUERY_GET_LINE_MANAGEMENT_CLASS = gql(
@@ -165,7 +165,7 @@ async def main(
     client_secret: str,
     mo_base_url: str,
 ):
-    sd_client = SDClient(username, password)
+    sd_client = AsyncSDClient(username, password)
 
     timeout = 120
     gql_client = GraphQLClient(
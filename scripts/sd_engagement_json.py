@@ -11,11 +11,11 @@ from typing import Any
 import click
 import structlog.stdlib
 from more_itertools import last
+from sdclient.client import SDClient
 from sdclient.exceptions import SDEmploymentNotFound
 from sdclient.exceptions import SDRootElementNotFound
 from sdclient.requests import GetEmploymentChangedRequest
 
-from sdtoolplus.depends import SDClient
 from sdtoolplus.mo.timelines.common import timeline_interval_to_mo_validity
 from sdtoolplus.models import Engagement
 from sdtoolplus.models import EngagementTimeline
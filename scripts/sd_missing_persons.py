@@ -7,6 +7,7 @@ from datetime import date
 import click
 import structlog.stdlib
 from pydantic import BaseModel
+from sdclient.client import SDClient
 from sdclient.exceptions import SDRootElementNotFound
 from sdclient.requests import GetPersonRequest
 from sdclient.responses import GetPersonResponse
@@ -18,7 +19,6 @@ from sdtoolplus.autogenerated_graphql_client import ListenerFilter
 from sdtoolplus.autogenerated_graphql_client import NamespaceFilter
 from sdtoolplus.config import SDToolPlusSettings
 from sdtoolplus.config import get_settings
-from sdtoolplus.depends import SDClient
 
 logger = structlog.stdlib.get_logger()
 
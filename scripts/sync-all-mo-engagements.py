@@ -15,6 +15,7 @@ from more_itertools import last
 from scripts.common import get_gql_client
 from sdtoolplus.autogenerated_graphql_client import EventSendInput
 from sdtoolplus.autogenerated_graphql_client import GraphQLClient
+from sdtoolplus.mo.event_publisher import EventPublisher
 from sdtoolplus.models import PersonAndEmploymentGraphQLEvent
 
 ENGAGEMENT_UUID_SYNC_URL = "http://localhost:8000/events/mo/engagement"
@@ -67,36 +68,52 @@ async def sync_all_mo_engagements(
     engagements_csv_file: Path,
     processed_csv_file: Path,
     priority: int,
+    batch_size: int,
+    concurrency: int,
 ) -> None:
     processed = load_processed(processed_csv_file)
 
-    with open(engagements_csv_file, newline="") as fp:
-        reader = csv.DictReader(fp)
-        for i, row in enumerate(reader):
-            user_key = row["user_key"]
-            if user_key in processed:
+    # The engagements whose events have been published, but not yet flushed
+    pending: list[str] = []
+
+    async def flush(publisher: EventPublisher) -> None:
+        try:
+            await publisher.flush()
+        except Exception as error:
+            logger.error("Could not queue engagements", user_keys=pending, error=error)
+        else:
+            for user_key in pending:
+                append_processed(processed_csv_file, user_key)
+                processed.add(user_key)
+        pending.clear()
+
+    async with EventPublisher(gql_client, batch_size, concurrency) as publisher:
+        with open(engagements_csv_file, newline="") as fp:
+            reader = csv.DictReader(fp)
+            for i, row in enumerate(reader):
+                user_key = row["user_key"]
+                if user_key in processed:
+                    logger.info(
+                        "Skipping already processed engagement",
+                        user_key=user_key,
+                        counter=i,
+                    )
+                    continue
+
+                institution_identifier, employment_identifier = user_key.split("-")
+                cpr = last(row["cpr"].split(":"))
+
                 logger.info(
-                    "Skipping already processed engagement",
-                    user_key=user_key,
+                    "Queuing engagement",
+                    institution_identifier=institution_identifier,
+                    cpr=cpr,
+                    employment_identifier=employment_identifier,
+                    employee_uuid=row["employee"],
                     counter=i,
                 )
-                continue
-
-            institution_identifier, employment_identifier = user_key.split("-")
-            cpr = last(row["cpr"].split(":"))
-
-            logger.info(
-                "Queuing engagement",
-                institution_identifier=institution_identifier,
-                cpr=cpr,
-                employment_identifier=employment_identifier,
-                employee_uuid=row["employee"],
-                counter=i,
-            )
 
-            try:
-                await gql_client.send_event(
-                    input=EventSendInput(
+                await publisher.publish(
+                    EventSendInput(
                         namespace="sd",
                         routing_key="person-and-employment",
                         subject=PersonAndEmploymentGraphQLEvent(
@@ -107,14 +124,14 @@ async def sync_all_mo_engagements(
                         priority=priority,
                     )
                 )
-            except Exception as error:
-                logger.error(
-                    "Could not queue engagement", user_key=user_key, error=error
-                )
-                continue
+                pending.append(user_key)
+
+                # Record the processed engagements regularly, such that the
+                # script can be restarted without queuing them again
+                if len(pending) >= batch_size * concurrency:
+                    await flush(publisher)
 
-            append_processed(processed_csv_file, user_key)
-            processed.add(user_key)
+        await flush(publisher)
 
 
 @click.group()
@@ -145,17 +162,36 @@ def cli():
     default=20_000,
     help="The queue priority",
 )
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=100,
+    help="The number of events sent to MO per GraphQL request",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=5,
+    help="The number of concurrent GraphQL requests",
+)
 def user_key_sync(
     engagements_csv_file: Path,
     processed_csv_file: Path,
     priority: int,
+    batch_size: int,
+    concurrency: int,
 ) -> None:
     logger.info("Script started")
 
     gql_client = get_gql_client()
     asyncio.run(
         sync_all_mo_engagements(
-            gql_client, engagements_csv_file, processed_csv_file, priority
+            gql_client,
+            engagements_csv_file,
+            processed_csv_file,
+            priority,
+            batch_size,
+            concurrency,
         )
     )
 
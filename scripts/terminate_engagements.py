@@ -13,6 +13,7 @@ import structlog
 from more_itertools import last
 from more_itertools import one
 from more_itertools import partition
+from sdclient.client import SDClient
 from sdclient.exceptions import SDCallError
 from sdclient.exceptions import SDEmploymentNotFound
 from sdclient.exceptions import SDRootElementNotFound
@@ -21,7 +22,6 @@ from sdclient.requests import GetEmploymentChangedRequest
 from scripts.common import get_gql_client
 from sdtoolplus.autogenerated_graphql_client import GraphQLClient
 from sdtoolplus.config import get_settings
-from sdtoolplus.depends import SDClient
 from sdtoolplus.exceptions import MoreThanOneEngagementError
 from sdtoolplus.exceptions import NoValueError
 from sdtoolplus.mo.timelines.engagement import get_engagement_timeline
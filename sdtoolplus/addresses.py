@@ -12,7 +12,6 @@ from uuid import UUID
 import structlog
 from fastramqpi.os2mo_dar_client import AsyncDARClient
 from more_itertools import only
-from sdclient.client import SDClient
 
 from sdtoolplus.config import SDToolPlusSettings
 from sdtoolplus.depends import GraphQLClient
@@ -30,6 +29,7 @@ from sdtoolplus.mo_org_unit_importer import MOOrgTreeImport
 from sdtoolplus.mo_org_unit_importer import OrgUnitNode
 from sdtoolplus.mo_org_unit_importer import OrgUnitUUID
 from sdtoolplus.models import AddressTypeUserKey
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sd.importer import get_sd_units
 
 DARAddressUUID: TypeAlias = UUID
@@ -217,7 +217,7 @@ class AddressFixer:
     def __init__(
         self,
         gql_client: GraphQLClient,
-        sd_client: SDClient,
+        sd_client: AsyncSDClient,
         dar_client: AsyncDARClient,
         settings: SDToolPlusSettings,
         current_inst_id: str,
@@ -244,7 +244,9 @@ class AddressFixer:
 
         # Get the MO units
         logger.info("Getting MO units...")
-        mo_org_tree_import = MOOrgTreeImport(persistent_client)
+        mo_org_tree_import = MOOrgTreeImport(
+            persistent_client, page_size=self.settings.mo_org_units_page_size
+        )
         mo_org_units = mo_org_tree_import.get_org_units(org_unit)
 
         mo_units = [OrgUnitNode.from_org_unit(org_unit) for org_unit in mo_org_units]
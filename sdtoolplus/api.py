@@ -1,6 +1,5 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-import asyncio
 import datetime
 import re
 from typing import Any
@@ -8,35 +7,51 @@ from uuid import UUID
 
 import structlog
 from fastapi import APIRouter
+from fastapi import Query
 from fastapi import Response
 from fastramqpi.os2mo_dar_client import AsyncDARClient
 from more_itertools import one
-from sdclient.client import SDClient
-from sdclient.exceptions import SDCallError
-from sdclient.exceptions import SDRootElementNotFound
+from pydantic import PositiveInt
 from sdclient.requests import GetDepartmentRequest
 from sdclient.responses import Department
 from starlette.status import HTTP_200_OK
+from starlette.status import HTTP_400_BAD_REQUEST
+from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 
 from . import depends
 from .addresses import AddressFixer
 from .app import App
+from .app import execute_institutions
 from .autogenerated_graphql_client import ClassFilter
 from .autogenerated_graphql_client import EngagementFilter
 from .autogenerated_graphql_client import EventSendInput
 from .autogenerated_graphql_client import FacetFilter
+from .config import TIMEZONE
 from .db.rundb import Status
 from .db.rundb import delete_last_run
+from .db.rundb import get_employment_change_watermark
+from .db.rundb import get_full_sync_cursor
+from .db.rundb import get_runs
 from .db.rundb import get_status
+from .db.rundb import has_run_checkpoint
+from .db.rundb import persist_employment_change_watermark
 from .db.rundb import run_db_end_operations
 from .db.rundb import run_db_start_operations
 from .exceptions import UnknownNYLevel
+from .full_sync import queue_all_sd_employments
 from .job_positions import sync_professions
+from .mo.event_publisher import get_event_publisher
 from .mo_class import MOOrgUnitLevelMap
+from .mo_org_unit_importer import OrgUnitUUID
 from .models import OrgGraphQLEvent
 from .models import PersonAndEmploymentGraphQLEvent
+from .sd.employment import get_changed_employments
+from .sd.importer import get_sd_organization
 from .sd.person import get_all_sd_persons
-from .sd.person import get_sd_person_engagements
+from .sd.tree import get_sd_parent_map
+from .sync.org_unit import sync_ous
+from .tree_diff_executor import AddOrgUnitMutation
+from .tree_diff_executor import UpdateOrgUnitMutation
 from .tree_tools import tree_as_string
 
 logger = structlog.stdlib.get_logger()
@@ -56,11 +71,11 @@ async def print_mo_tree(settings: depends.Settings) -> str:
 
 
 @router.get("/tree/sd")
-async def print_sd_tree(settings: depends.Settings) -> str:
+async def print_sd_tree(settings: depends.Settings, sd_client: depends.SDClient) -> str:
     """
     For debugging problems. Prints the SD tree.
     """
-    sdtoolplus: App = App(settings)
+    sdtoolplus: App = App(settings, sd_client=sd_client)
     mo_org_unit_level_map = MOOrgUnitLevelMap(sdtoolplus.session)
     sd_tree = await sdtoolplus.get_sd_tree(mo_org_unit_level_map)
     return tree_as_string(sd_tree)
@@ -73,8 +88,8 @@ async def rundb_get_status(engine: depends.Engine) -> int:
     status.
 
     Returns:
-        0 if status is "completed", 1 if status is "running" and 3 in case of
-        an error.
+        0 if status is "completed", 1 if status is "running" (or "failed") and
+        3 in case of an error.
     """
     try:
         status = await get_status(engine)
@@ -89,6 +104,29 @@ async def rundb_delete_last_run(engine: depends.Engine):
     return {"msg": "Last run deleted"}
 
 
+@router.get("/rundb/runs")
+async def rundb_get_runs(
+    engine: depends.Engine, limit: PositiveInt = 100
+) -> list[dict]:
+    """
+    Get the latest runs (newest first) including the run statistics, i.e. the
+    duration and the number of added and updated units of the completed runs.
+    """
+    runs = await get_runs(engine, limit)
+    return [
+        {
+            "timestamp": run.timestamp,
+            "status": run.status,
+            "institution_identifier": run.institution_identifier,
+            "dry_run": run.dry_run,
+            "duration": run.duration,
+            "units_added": run.units_added,
+            "units_updated": run.units_updated,
+        }
+        for run in runs
+    ]
+
+
 @router.post("/job-functions/sync")
 async def sync_job_functions(
     sd_client: depends.SDClient,
@@ -106,19 +144,42 @@ async def trigger(
     settings: depends.Settings,
     engine: depends.Engine,
     response: Response,
+    graphql_client: depends.GraphQLClient,
+    sd_client: depends.SDClient,
     org_unit: UUID | None = None,
     inst_id: str | None = None,
     dry_run: bool = False,
+    resume: bool = False,
 ) -> list[dict] | dict:
+    """
+    Compare the SD and MO trees and add or update the MO units accordingly.
+
+    If `resume` is true and the previous run was interrupted, the run is
+    resumed from the checkpoint of the interrupted run, i.e. only the
+    mutations which were not applied by the interrupted run are executed.
+    """
     logger.info("Starting run", org_unit=str(org_unit), dry_run=dry_run)
+    started = datetime.datetime.now(tz=TIMEZONE)
+    institution_identifier = (
+        inst_id if inst_id is not None else settings.sd_institution_identifier
+    )
 
-    run_db_start_operations_resp = await run_db_start_operations(
-        engine, dry_run, response
+    resuming = (
+        resume
+        and not dry_run
+        and await get_status(engine) == Status.RUNNING
+        and await has_run_checkpoint(engine, institution_identifier)
     )
-    if run_db_start_operations_resp is not None:
-        return run_db_start_operations_resp
+    if resuming:
+        logger.info("Resuming interrupted run", inst_id=institution_identifier)
+    else:
+        run_db_start_operations_resp = await run_db_start_operations(
+            engine, dry_run, response, institution_identifier
+        )
+        if run_db_start_operations_resp is not None:
+            return run_db_start_operations_resp
 
-    sdtoolplus: App = App(settings, inst_id)
+    sdtoolplus: App = App(settings, inst_id, graphql_client, engine, sd_client)
 
     results: list[dict] = [
         {
@@ -127,24 +188,151 @@ async def trigger(
             "mutation_result": str(result),
         }
         async for org_unit_node, mutation, result in sdtoolplus.execute(
-            org_unit=org_unit, dry_run=dry_run
+            org_unit=org_unit, dry_run=dry_run, resume=resuming
         )
     ]
     logger.info("Finished adding or updating org unit objects")
 
-    # Send email notifications for illegal moves
-    if settings.email_notifications_enabled and not dry_run:
+    # Send email notifications for illegal moves. The trees are not compared
+    # when resuming a run, so the illegal moves are not known in this case.
+    if settings.email_notifications_enabled and not dry_run and not resuming:
         sdtoolplus.send_email_notification()
 
-    await run_db_end_operations(engine, dry_run)
+    mutation_types = [result["type"] for result in results]
+    await run_db_end_operations(
+        engine,
+        dry_run,
+        institution_identifier,
+        started,
+        units_added=mutation_types.count(AddOrgUnitMutation.__name__),
+        units_updated=mutation_types.count(UpdateOrgUnitMutation.__name__),
+    )
     logger.info("Run completed!")
 
     return results
 
 
+@router.post("/trigger/institutions", status_code=HTTP_200_OK)
+async def trigger_institutions(
+    settings: depends.Settings,
+    engine: depends.Engine,
+    response: Response,
+    graphql_client: depends.GraphQLClient,
+    sd_client: depends.SDClient,
+    inst_ids: list[str] | None = Query(None),
+    dry_run: bool = False,
+) -> dict:
+    """
+    Same as /trigger, but for several SD institutions (by default all the
+    institutions in the "mo_subtree_paths_for_root" setting) in a single run.
+    The SD trees are fetched and compared to the MO tree concurrently.
+
+    Returns a map from each institution to either its processed units
+    ("results") or the error ("error") if the run failed for the institution.
+    If the run failed for any institution, the response status is 500 and the
+    run is recorded as failed (with the statistics of the other institutions).
+    """
+    if inst_ids is None:
+        if settings.mo_subtree_paths_for_root is None:
+            response.status_code = HTTP_400_BAD_REQUEST
+            return {
+                "msg": "No institutions given and mo_subtree_paths_for_root not set"
+            }
+        inst_ids = list(settings.mo_subtree_paths_for_root)
+
+    logger.info("Starting multi-institution run", inst_ids=inst_ids, dry_run=dry_run)
+    started = datetime.datetime.now(tz=TIMEZONE)
+
+    run_db_start_operations_resp = await run_db_start_operations(
+        engine, dry_run, response
+    )
+    if run_db_start_operations_resp is not None:
+        return run_db_start_operations_resp
+
+    apps = [
+        App(settings, inst_id, graphql_client, engine, sd_client)
+        for inst_id in inst_ids
+    ]
+    executed = await execute_institutions(
+        apps, dry_run=dry_run, concurrency=settings.institution_concurrency
+    )
+    logger.info("Finished adding or updating org unit objects")
+
+    succeeded = {
+        inst_id: inst_results
+        for inst_id, inst_results in executed.items()
+        if not isinstance(inst_results, BaseException)
+    }
+    failed = {
+        inst_id: error
+        for inst_id, error in executed.items()
+        if isinstance(error, BaseException)
+    }
+
+    # Send email notifications for illegal moves
+    if settings.email_notifications_enabled and not dry_run:
+        for app in apps:
+            if app.current_inst_id in succeeded:
+                app.send_email_notification()
+
+    results: dict[str, dict] = {
+        inst_id: {
+            "results": [
+                {
+                    "type": mutation.__class__.__name__,
+                    "unit": repr(org_unit_node),
+                    "mutation_result": str(result),
+                }
+                for org_unit_node, mutation, result in inst_results
+            ]
+        }
+        for inst_id, inst_results in succeeded.items()
+    }
+    results.update(
+        {inst_id: {"error": str(error)} for inst_id, error in failed.items()}
+    )
+
+    mutation_types = [
+        result["type"]
+        for inst_results in results.values()
+        for result in inst_results.get("results", [])
+    ]
+    await run_db_end_operations(
+        engine,
+        dry_run,
+        started=started,
+        units_added=mutation_types.count(AddOrgUnitMutation.__name__),
+        units_updated=mutation_types.count(UpdateOrgUnitMutation.__name__),
+        status=Status.FAILED if failed else Status.COMPLETED,
+    )
+    if failed:
+        logger.error("Run failed for institutions", inst_ids=list(failed))
+        response.status_code = HTTP_500_INTERNAL_SERVER_ERROR
+    else:
+        logger.info("Run completed!")
+
+    return results
+
+
+@router.post("/trigger/apply-ny-logic/failed", status_code=HTTP_200_OK)
+async def retry_failed_apply_ny_logic(
+    settings: depends.Settings,
+    engine: depends.Engine,
+    inst_id: str | None = None,
+) -> dict:
+    """
+    Replay the apply-NY-logic calls which failed during previous runs (after
+    all retries).
+    """
+    sdtoolplus: App = App(settings, inst_id, engine=engine)
+    failed = await sdtoolplus.retry_apply_ny_logic_failures()
+    return {"failed": [str(org_unit_uuid) for org_unit_uuid in failed]}
+
+
 @router.post("/trigger/addresses", status_code=HTTP_200_OK)
 async def trigger_addresses(
     settings: depends.Settings,
+    sd_client: depends.SDClient,
     engine: depends.Engine,
     response: Response,
     gql_client: depends.GraphQLClient,
@@ -153,22 +341,23 @@ async def trigger_addresses(
     dry_run: bool = False,
 ) -> list[dict] | dict:
     logger.info("Starting address run", org_unit=str(org_unit), dry_run=dry_run)
+    started = datetime.datetime.now(tz=TIMEZONE)
+    institution_identifier = (
+        inst_id if inst_id is not None else settings.sd_institution_identifier
+    )
 
     run_db_start_operations_resp = await run_db_start_operations(
-        engine, dry_run, response
+        engine, dry_run, response, institution_identifier
     )
     if run_db_start_operations_resp is not None:
         return run_db_start_operations_resp
 
     addr_fixer = AddressFixer(
         gql_client,
-        SDClient(
-            settings.sd_username,
-            settings.sd_password.get_secret_value(),
-        ),
+        sd_client,
         AsyncDARClient(),
         settings,
-        inst_id if inst_id is not None else settings.sd_institution_identifier,
+        institution_identifier,
     )
 
     results: list[dict] = [
@@ -184,7 +373,7 @@ async def trigger_addresses(
     ]
     logger.info("Finished adding or updating org unit objects")
 
-    await run_db_end_operations(engine, dry_run)
+    await run_db_end_operations(engine, dry_run, institution_identifier, started)
     logger.info("Run completed!")
 
     return results
@@ -192,6 +381,7 @@ async def trigger_addresses(
 
 @router.post("/timeline/sync/person/all")
 async def sync_all_persons(
+    settings: depends.Settings,
     sd_client: depends.SDClient,
     graphql_client: depends.GraphQLClient,
     institution_identifier: str,
@@ -226,8 +416,9 @@ async def sync_all_persons(
         "Syncing persons",
         events=len(events),
     )
-    for e in events:
-        await graphql_client.send_event(input=e)
+    async with get_event_publisher(graphql_client, settings) as publisher:
+        for e in events:
+            await publisher.publish(e)
 
     logger.info(f"Done queueing sync all SD persons in {institution_identifier}")
 
@@ -236,21 +427,35 @@ async def sync_all_persons(
 
 @router.post("/timeline/sync/person-and-engagement/all/sd", status_code=HTTP_200_OK)
 async def full_timeline_sync_sd_engagements(
+    settings: depends.Settings,
     sd_client: depends.SDClient,
     gql_client: depends.GraphQLClient,
+    engine: depends.Engine,
     institution_identifier: str,
     sync_active_persons: bool = True,
     sync_passive_persons: bool = False,
+    resume: bool = False,
 ) -> dict:
     """
     Sync engagements of all SD persons, i.e.
 
     1) Read all persons from SD
-    2) Loop through these and for each get a list of their SD employments
-    3) Loop through the list of SD employments and queue these for sync
+    2) Get the SD employments of the persons concurrently (see the
+       "sd_person_sync_concurrency" and "sd_max_requests_per_second" settings)
+    3) Queue the SD employments for sync
+
+    The progress is persisted in the RunDB (see the /progress endpoint below).
+    If `resume` is true, a previously interrupted sync (or a sync where some of
+    the SD calls failed) is resumed where it stopped.
     """
     logger.info(f"Syncing all SD employments in {institution_identifier}")
 
+    resume_after = None
+    if resume:
+        cursor = await get_full_sync_cursor(engine, institution_identifier)
+        resume_after = cursor.cpr if cursor is not None else None
+        logger.info("Resuming SD employment sync", resume_after=resume_after)
+
     sd_persons = await get_all_sd_persons(
         sd_client=sd_client,
         institution_identifier=institution_identifier,
@@ -259,41 +464,16 @@ async def full_timeline_sync_sd_engagements(
         sync_passive_persons=sync_passive_persons,
     )
 
-    error_cprs: list[str] = []
-    for person in sd_persons:
-        if person.cpr.endswith("0000"):
-            continue
-        try:
-            res = await get_sd_person_engagements(
-                sd_client=sd_client,
-                institution_identifier=institution_identifier,
-                cpr=person.cpr,
-            )
-        except SDRootElementNotFound:
-            logger.info(
-                "Person could not be found in sd",
-                institution_identifier=institution_identifier,
-                person=person,
-            )
-            continue
-        except SDCallError:
-            logger.error("SD call failed", cpr=person.cpr)
-            error_cprs.append(person.cpr)
-            continue
-
-        logger.info("Found engagements", engagements=res)
-
-        for e in one(res.Person).Employment:
-            event = EventSendInput(
-                namespace="sd",
-                routing_key="person-and-employment",
-                subject=PersonAndEmploymentGraphQLEvent(
-                    institution_identifier=institution_identifier,
-                    cpr=person.cpr,
-                    employment_identifier=e.EmploymentIdentifier,
-                ).json(),
-            )
-            await gql_client.send_event(input=event)
+    async with get_event_publisher(gql_client, settings) as publisher:
+        error_cprs = await queue_all_sd_employments(
+            sd_client=sd_client,
+            publisher=publisher,
+            engine=engine,
+            institution_identifier=institution_identifier,
+            sd_persons=sd_persons,
+            concurrency=settings.sd_person_sync_concurrency,
+            resume_after=resume_after,
+        )
 
     logger.info(
         f"Done queueing sync for all SD employments in {institution_identifier}"
@@ -302,6 +482,92 @@ async def full_timeline_sync_sd_engagements(
     return {"msg": "success", "error_cprs": error_cprs}
 
 
+@router.get("/timeline/sync/person-and-engagement/all/sd/progress")
+async def full_timeline_sync_sd_engagements_progress(
+    engine: depends.Engine, institution_identifier: str
+) -> dict:
+    """
+    Get the progress of the current (or the last unfinished) sync of all SD
+    persons in the institution.
+    """
+    cursor = await get_full_sync_cursor(engine, institution_identifier)
+    if cursor is None:
+        return {"msg": "No unfinished sync"}
+    return {
+        "cursor": cursor.cpr,
+        "processed": cursor.processed,
+        "total": cursor.total,
+        "timestamp": cursor.timestamp,
+    }
+
+
+@router.post("/timeline/sync/person-and-engagement/changed/sd", status_code=HTTP_200_OK)
+async def changed_timeline_sync_sd_engagements(
+    sd_client: depends.SDClient,
+    gql_client: depends.GraphQLClient,
+    engine: depends.Engine,
+    response: Response,
+    institution_identifier: str,
+    since: datetime.datetime | None = None,
+) -> dict:
+    """
+    Sync the SD employments changed since the last time this endpoint was
+    called, i.e.
+
+    1) Get the watermark (the end of the previously processed interval) for the
+       institution from the RunDB (or use the "since" parameter, if provided)
+    2) Get all SD employments changed since the watermark
+    3) Queue these for sync
+    4) Store the new watermark in the RunDB
+
+    This allows for a cheap catch-up after e.g. an outage of the SD AMQP events
+    without having to sync all SD persons.
+    """
+    if since is None:
+        since = await get_employment_change_watermark(engine, institution_identifier)
+    if since is None:
+        response.status_code = HTTP_400_BAD_REQUEST
+        return {"msg": "No watermark found - the 'since' parameter must be provided"}
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=TIMEZONE)
+    else:
+        since = since.astimezone(TIMEZONE)
+    until = datetime.datetime.now(tz=TIMEZONE)
+
+    changed_employments = await get_changed_employments(
+        sd_client=sd_client,
+        institution_identifier=institution_identifier,
+        since=since,
+        until=until,
+    )
+    logger.info(
+        "Found changed SD employments",
+        institution_identifier=institution_identifier,
+        since=since,
+        until=until,
+        changed=len(changed_employments),
+    )
+
+    for cpr, employment_identifier in sorted(changed_employments):
+        if cpr.endswith("0000"):
+            continue
+        event = EventSendInput(
+            namespace="sd",
+            routing_key="person-and-employment",
+            subject=PersonAndEmploymentGraphQLEvent(
+                institution_identifier=institution_identifier,
+                cpr=cpr,
+                employment_identifier=employment_identifier,
+            ).json(),
+        )
+        await gql_client.send_event(input=event)
+
+    # Only advance the watermark when all the changes have been queued
+    await persist_employment_change_watermark(engine, institution_identifier, until)
+
+    return {"msg": "success", "since": since, "until": until}
+
+
 @router.post("/timeline/sync/engagement/all/mo", status_code=HTTP_200_OK)
 async def full_timeline_sync_mo_engagements(
     gql_client: depends.GraphQLClient,
@@ -361,11 +627,20 @@ async def full_timeline_sync_mo_engagements(
 
 @router.post("/timeline/sync/ou/all", status_code=HTTP_200_OK)
 async def full_timeline_sync_ous(
+    settings: depends.Settings,
     sd_client: depends.SDClient,
     gql_client: depends.GraphQLClient,
     institution_identifier: str,
     dry_run: bool = False,
+    in_process: bool = False,
+    max_concurrency: PositiveInt = 10,
 ) -> dict:
+    """
+    Sync all SD units in the institution. Per default, an event is queued for
+    each unit. If `in_process` is true, the units are instead synced directly
+    by this request, concurrently but without syncing a unit before its
+    ancestors.
+    """
     logger.info(f"Syncing all SD units in {institution_identifier}")
     # TODO: This only works when all unit_levels are integers
     ny_regex = re.compile(r"NY(\d)-niveau")
@@ -381,8 +656,7 @@ async def full_timeline_sync_ous(
         priority = DEFAULT_PRIORITY - int(one(match.groups()))
         return priority
 
-    departments = await asyncio.to_thread(
-        sd_client.get_department,
+    departments = await sd_client.get_department(
         GetDepartmentRequest(
             InstitutionIdentifier=institution_identifier,
             ActivationDate=datetime.datetime.now(),
@@ -398,32 +672,55 @@ async def full_timeline_sync_ous(
         )
         return {"msg": "success"}
 
-    events = []
+    priorities: dict[OrgUnitUUID, int] = {}
     for d in departments.Department:
         try:
-            priority = priority_from_level(d)
+            priorities[d.DepartmentUUIDIdentifier] = priority_from_level(d)  # type: ignore
         except UnknownNYLevel:
             logger.warning(
                 "Unknown NY level. Skipping...",
                 org_unit=str(d.DepartmentUUIDIdentifier),
                 level=d.DepartmentLevelIdentifier,
             )
-            continue
+
+    if in_process:
+        today = datetime.date.today()
+        sd_org = await get_sd_organization(
+            sd_client, institution_identifier, today, today
+        )
+        failed = await sync_ous(
+            sd_client=sd_client,
+            gql_client=gql_client,
+            institution_identifier=institution_identifier,
+            org_units=priorities,
+            parents=get_sd_parent_map(sd_org),
+            settings=settings,
+            max_concurrency=max_concurrency,
+        )
+        logger.info(f"Done syncing all SD units in {institution_identifier}")
+        return {
+            "msg": f"{len(priorities) - len(failed)} OUs synced",
+            "failed": [str(org_unit) for org_unit in failed],
+        }
+
+    events = []
+    for org_unit, priority in priorities.items():
         events.append(
             EventSendInput(
                 namespace="sd",
                 routing_key="org",
                 subject=OrgGraphQLEvent(
                     institution_identifier=institution_identifier,
-                    org_unit=d.DepartmentUUIDIdentifier,
+                    org_unit=org_unit,
                 ).json(),
                 priority=priority,
             )
         )
 
     logger.info("Syncing units", events=len(events))
-    for e in events:
-        await gql_client.send_event(input=e)
+    async with get_event_publisher(gql_client, settings) as publisher:
+        for e in events:
+            await publisher.publish(e)
 
     logger.info(f"Done queueing sync all SD units in {institution_identifier}")
     return {"msg": f"{len(events)} OU events queued"}
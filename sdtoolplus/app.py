@@ -1,17 +1,25 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
+from collections.abc import Iterable
 from typing import AsyncIterator
 from uuid import UUID
 
 import httpx
 import structlog
-from httpx import HTTPStatusError
-from httpx import Response
 from httpx import Timeout
 from more_itertools import last
-from sdclient.client import SDClient
+from sqlalchemy import Engine
 
+from .checkpoint import CheckpointedTreeDiff
+from .checkpoint import get_run_checkpoint
 from .config import SDToolPlusSettings
+from .db.rundb import delete_run_checkpoint
+from .db.rundb import get_apply_ny_logic_failures
+from .db.rundb import get_pending_run_checkpoint
+from .db.rundb import mark_run_checkpoint_applied
+from .db.rundb import persist_run_checkpoint
+from .depends import GraphQLClient
 from .diff_org_trees import OrgTreeDiff
 from .diff_org_trees import in_obsolete_units_subtree
 from .email import build_email_body
@@ -21,9 +29,13 @@ from .mo_class import MOClass
 from .mo_class import MOOrgUnitLevelMap
 from .mo_class import MOOrgUnitTypeMap
 from .mo_org_unit_importer import MOOrgTreeImport
+from .mo_org_unit_importer import OrgUnit
 from .mo_org_unit_importer import OrgUnitNode
 from .mo_org_unit_importer import OrgUnitUUID
 from .mo_org_unit_importer import OrgUUID
+from .ny_logic import ApplyNYLogicDispatcher
+from .sd.client import AsyncSDClient
+from .sd.client import get_sd_client
 from .sd.importer import get_sd_tree
 from .tree_diff_executor import AnyMutation
 from .tree_diff_executor import TreeDiffExecutor
@@ -90,9 +102,25 @@ def _get_mo_root_uuid(
 
 class App:
     def __init__(
-        self, settings: SDToolPlusSettings, current_inst_id: str | None = None
+        self,
+        settings: SDToolPlusSettings,
+        current_inst_id: str | None = None,
+        gql_client: GraphQLClient | None = None,
+        engine: Engine | None = None,
+        sd_client: AsyncSDClient | None = None,
     ):
         self.settings: SDToolPlusSettings = settings
+        # The database engine used for recording failed apply-NY-logic calls
+        # and the run checkpoints
+        self.engine = engine
+        # Set when resuming an interrupted run from its checkpoint
+        self.checkpointed_tree_diff: CheckpointedTreeDiff | None = None
+        # The async GraphQL client used by the TreeDiffExecutor for sending
+        # the mutations concurrently (see tree_diff_executor_concurrency)
+        self.gql_client = gql_client
+        # The SD client shared by the SD tree fetch and the TreeDiffExecutor,
+        # such that they share the SD response cache and the rate limiter
+        self.sd_client = sd_client if sd_client is not None else get_sd_client(settings)
 
         self.current_inst_id = (
             current_inst_id
@@ -107,10 +135,11 @@ class App:
         self.session = get_graphql_client(settings)
 
         self.mo_tree_children: list[OrgUnitNode] | None = None
-        self.mo_org_tree_import = MOOrgTreeImport(self.session)
-        self.clear_mo_tree_cache()
+        self.mo_org_tree_import = MOOrgTreeImport(
+            self.session, page_size=settings.mo_org_units_page_size
+        )
 
-        self.client = httpx.Client(
+        self.client = httpx.AsyncClient(
             base_url=str(self.settings.sd_lon_base_url),
             timeout=Timeout(timeout=self.settings.httpx_timeout_ny_logic),
         )
@@ -125,11 +154,6 @@ class App:
     async def get_sd_tree(
         self, mo_org_unit_level_map: MOOrgUnitLevelMap
     ) -> OrgUnitNode:
-        sd_client = SDClient(
-            self.settings.sd_username,
-            self.settings.sd_password.get_secret_value(),
-        )
-
         sd_root_uuid = _get_sd_root_uuid(
             self.mo_org_tree_import.get_org_uuid(),
             self.settings.use_mo_root_uuid_as_sd_root_uuid,
@@ -139,7 +163,7 @@ class App:
         )
 
         return await get_sd_tree(
-            sd_client,
+            self.sd_client,
             self.current_inst_id,
             mo_org_unit_level_map,
             sd_root_uuid,
@@ -168,9 +192,16 @@ class App:
 
         return tree
 
+    def use_mo_org_units(self, org_units: Iterable[OrgUnit]) -> None:
+        """
+        Build the MO tree from MO units which have already been fetched (e.g.
+        by another App instance) instead of fetching them from MO.
+        """
+        self.mo_tree_children = self.mo_org_tree_import.build_trees(org_units)
+
     def clear_mo_tree_cache(self) -> None:
         logger.info("Clearing MO tree cache")
-        self.mo_org_tree_import.get_org_units.cache_clear()
+        self.mo_tree_children = None
 
     async def get_tree_diff_executor(self) -> TreeDiffExecutor:
         logger.info("Getting TreeDiffExecutor")
@@ -192,15 +223,18 @@ class App:
 
         # Get the MO tree
         logger.info(event="Fetching MO org tree ...")
-        mo_org_tree_as_single = self.get_mo_tree()
+        mo_org_tree_as_single = await asyncio.to_thread(self.get_mo_tree)
         logger.info(
             "MO tree",
             mo_org_tree=repr(mo_org_tree_as_single),
             children=[repr(child) for child in mo_org_tree_as_single.children],
         )
 
-        # Construct org tree diff
-        self.tree_diff = OrgTreeDiff(
+        # Construct org tree diff. This is done in a thread, since the MO
+        # queries made by the OrgTreeDiff are blocking, and the diffs of
+        # several institutions may run concurrently (see execute_institutions)
+        self.tree_diff = await asyncio.to_thread(
+            OrgTreeDiff,
             mo_org_tree_as_single,
             sd_org_tree,
             mo_org_unit_level_map,
@@ -217,36 +251,116 @@ class App:
             self.tree_diff,
             mo_org_unit_type,
             org_uuid,
+            self.gql_client,
+            self.sd_client,
+        )
+
+    async def get_resumed_tree_diff_executor(self) -> TreeDiffExecutor:
+        """
+        Get a TreeDiffExecutor for the mutations of the run checkpoint which
+        were not applied by the interrupted run. The SD and MO trees are not
+        fetched.
+        """
+        assert self.engine is not None
+        logger.info("Getting TreeDiffExecutor from run checkpoint")
+
+        checkpoint = await get_pending_run_checkpoint(self.engine, self.current_inst_id)
+        logger.info("Resuming run", pending_mutations=len(checkpoint))
+        self.checkpointed_tree_diff = CheckpointedTreeDiff(checkpoint)
+
+        mo_org_unit_type_map = MOOrgUnitTypeMap(self.session)
+        mo_org_unit_type: MOClass = mo_org_unit_type_map[self.settings.org_unit_type]
+
+        return TreeDiffExecutor(
+            self.session,
+            self.settings,
+            self.current_inst_id,
+            self.checkpointed_tree_diff,
+            mo_org_unit_type,
+            self.mo_org_tree_import.get_org_uuid(),
+            self.gql_client,
+            self.sd_client,
         )
 
     async def execute(
-        self, org_unit: UUID | None = None, dry_run: bool = False
+        self, org_unit: UUID | None = None, dry_run: bool = False, resume: bool = False
     ) -> AsyncIterator[tuple[OrgUnitNode, AnyMutation, UUID]]:
         """Call `TreeDiffExecutor.execute`, and call the SDLøn 'fix_departments' API
         for each 'add' and 'update' operation.
 
+        If a database engine is given, the planned mutations are persisted as a
+        run checkpoint, and each mutation is marked as applied when it has been
+        executed. An interrupted run can then be resumed from the checkpoint.
+
         Args:
             org_unit: Unit to be processed (if not None) by TreeDiffExecutor
             dry_run: whether to perform a dry run or not
+            resume: whether to resume an interrupted run from its checkpoint
+              instead of comparing the SD and MO trees
 
         Returns:
             Iterator which iterates over the processed units
         """
-        executor: TreeDiffExecutor = await self.get_tree_diff_executor()
+        executor: TreeDiffExecutor = (
+            await self.get_resumed_tree_diff_executor()
+            if resume
+            else await self.get_tree_diff_executor()
+        )
+
+        checkpoint_engine = self.engine if not dry_run else None
+        if checkpoint_engine is not None and not resume:
+            await persist_run_checkpoint(
+                checkpoint_engine,
+                self.current_inst_id,
+                get_run_checkpoint(
+                    self.current_inst_id,
+                    executor.get_units_to_add(org_unit),
+                    executor.get_units_to_update(org_unit),
+                    self.settings.obsolete_unit_roots,
+                ),
+            )
+
         org_unit_node: OrgUnitNode
         mutation: AnyMutation
         result: UUID
-        async for org_unit_node, mutation, result in executor.execute(
-            org_unit=org_unit, dry_run=dry_run
-        ):
-            logger.info("Successfully executed mutation", org_unit=str(org_unit))
-            if self._should_apply_ny_logic(mutation, org_unit_node, dry_run):
-                self._call_apply_ny_logic(result)  # type: ignore
-            yield (
-                org_unit_node,
-                mutation,
-                result,
-            )
+        async with self._get_ny_logic_dispatcher() as ny_logic_dispatcher:
+            async for org_unit_node, mutation, result in executor.execute(
+                org_unit=org_unit, dry_run=dry_run
+            ):
+                logger.info("Successfully executed mutation", org_unit=str(org_unit))
+                if checkpoint_engine is not None:
+                    await mark_run_checkpoint_applied(
+                        checkpoint_engine, self.current_inst_id, org_unit_node.uuid
+                    )
+                if self._should_apply_ny_logic(mutation, org_unit_node, dry_run):
+                    ny_logic_dispatcher.submit(result)
+                yield (
+                    org_unit_node,
+                    mutation,
+                    result,
+                )
+
+        if checkpoint_engine is not None:
+            await delete_run_checkpoint(checkpoint_engine, self.current_inst_id)
+
+    async def retry_apply_ny_logic_failures(self) -> list[OrgUnitUUID]:
+        """
+        Call the apply-NY-logic endpoint again for the units recorded in the
+        database, i.e. the units for which the call previously failed.
+
+        Returns:
+            The units for which the call failed again
+        """
+        assert self.engine is not None
+        org_unit_uuids = await get_apply_ny_logic_failures(
+            self.engine, self.current_inst_id
+        )
+        logger.info("Retrying apply-NY-logic calls", org_units=len(org_unit_uuids))
+
+        async with self._get_ny_logic_dispatcher() as ny_logic_dispatcher:
+            for org_unit_uuid in org_unit_uuids:
+                ny_logic_dispatcher.submit(org_unit_uuid)
+        return ny_logic_dispatcher.failed
 
     def send_email_notification(self):
         subtrees_with_engs = self.tree_diff.get_subtrees_with_engs()
@@ -280,34 +394,82 @@ class App:
             self.settings.apply_ny_logic is False
             or dry_run
             or not isinstance(mutation, UpdateOrgUnitMutation)
-            or in_obsolete_units_subtree(
-                org_unit_node, self.settings.obsolete_unit_roots
-            )
+            or self._in_obsolete_units_subtree(org_unit_node)
         ):
             return False
         return True
 
-    def _call_apply_ny_logic(self, org_unit_uuid: OrgUnitUUID) -> None:
-        logger.info("Apply NY logic", org_unit_uuid=org_unit_uuid)
-
-        url: str = f"/trigger/apply-ny-logic/{org_unit_uuid}"
-        response: Response = self.client.post(
-            url, params={"institution_identifier": self.current_inst_id}
-        )
-
-        # NOTE: if _call_apply_ny_logic fails, you will have to make the
-        # failing POST request again manually to make sure the NY logic
-        # has been applied properly for the given org unit
-        try:
-            response.raise_for_status()
-        except HTTPStatusError as error:
-            logger.error(
-                "Apply-NY-logic call failed!!", org_unit_uuid=str(org_unit_uuid)
+    def _in_obsolete_units_subtree(self, org_unit_node: OrgUnitNode) -> bool:
+        # The ancestors of the units restored from a run checkpoint are not
+        # known, so we use the value recorded in the checkpoint instead
+        if self.checkpointed_tree_diff is not None:
+            return (
+                org_unit_node.uuid
+                in self.checkpointed_tree_diff.units_in_obsolete_units_subtree
             )
-            raise error
+        return in_obsolete_units_subtree(
+            org_unit_node, self.settings.obsolete_unit_roots
+        )
 
-        logger.info("NY logic applied successfully")
+    def _get_ny_logic_dispatcher(self) -> ApplyNYLogicDispatcher:
+        return ApplyNYLogicDispatcher(
+            self.client,
+            self.current_inst_id,
+            self.engine,
+            concurrency=self.settings.apply_ny_logic_concurrency,
+            retries=self.settings.apply_ny_logic_retries,
+            retry_backoff=self.settings.apply_ny_logic_retry_backoff,
+        )
 
     @staticmethod
     def _get_effective_root_path(path_ou_uuids: list[OrgUnitUUID]):
         return "/".join([str(ou_uuid) for ou_uuid in path_ou_uuids])
+
+
+async def execute_institutions(
+    apps: list[App], dry_run: bool = False, concurrency: int = 1
+) -> dict[str, list[tuple[OrgUnitNode, AnyMutation, UUID]] | BaseException]:
+    """
+    Call `App.execute` for the apps of several SD institutions concurrently.
+
+    The MO units are fetched from MO only once and shared by the apps, which
+    each build their own MO tree from the units. If the execution fails for
+    one or more of the institutions, the remaining institutions are still
+    executed, and the error is returned in place of the processed units of the
+    failed institution.
+
+    Args:
+        apps: the apps to execute, one per SD institution
+        dry_run: whether to perform a dry run or not
+        concurrency: the number of institutions to execute concurrently
+
+    Returns:
+        Map from the SD institution identifiers to the processed units (or the
+        error, if the execution failed for the institution)
+    """
+    if not apps:
+        return dict()
+
+    logger.info("Fetching MO units for all institutions")
+    mo_org_units = await asyncio.to_thread(apps[0].mo_org_tree_import.get_org_units)
+    for app in apps:
+        app.use_mo_org_units(mo_org_units)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def execute(app: App) -> list[tuple[OrgUnitNode, AnyMutation, UUID]]:
+        async with semaphore:
+            logger.info("Executing institution", inst_id=app.current_inst_id)
+            return [x async for x in app.execute(dry_run=dry_run)]
+
+    results = await asyncio.gather(
+        *(execute(app) for app in apps), return_exceptions=True
+    )
+
+    for app, result in zip(apps, results):
+        if isinstance(result, BaseException):
+            logger.error(
+                "Execution failed", inst_id=app.current_inst_id, error=str(result)
+            )
+
+    return {app.current_inst_id: result for app, result in zip(apps, results)}
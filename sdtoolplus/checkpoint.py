@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+from collections.abc import Iterator
+
+from ramodels.mo import Validity
+
+from .db.models import RunCheckpoint
+from .diff_org_trees import in_obsolete_units_subtree
+from .mo_org_unit_importer import OrgUnitNode
+from .mo_org_unit_importer import OrgUnitUUID
+
+ADD = "add"
+UPDATE = "update"
+
+
+def get_run_checkpoint(
+    institution_identifier: str,
+    units_to_add: list[OrgUnitNode],
+    units_to_update: list[OrgUnitNode],
+    obsolete_unit_roots: list[OrgUnitUUID],
+) -> list[RunCheckpoint]:
+    """
+    Get the run checkpoint, i.e. the planned mutations in the order they are
+    applied by the TreeDiffExecutor.
+
+    Args:
+        institution_identifier: the SD institution identifier
+        units_to_add: the units to add
+        units_to_update: the units to update
+        obsolete_unit_roots: the roots of the obsolete units subtrees
+
+    Returns:
+        The run checkpoint
+    """
+    planned = [(ADD, unit) for unit in units_to_add] + [
+        (UPDATE, unit) for unit in units_to_update
+    ]
+    return [
+        RunCheckpoint(
+            institution_identifier=institution_identifier,
+            org_unit_uuid=unit.uuid,
+            position=position,
+            mutation=mutation,
+            parent_uuid=unit.parent.uuid,
+            name=unit.name,
+            user_key=unit.user_key,
+            org_unit_level_uuid=unit.org_unit_level_uuid,
+            validity_from=unit.validity.from_date if unit.validity else None,
+            validity_to=unit.validity.to_date if unit.validity else None,
+            in_obsolete_units_subtree=in_obsolete_units_subtree(
+                unit, obsolete_unit_roots
+            ),
+            applied=False,
+        )
+        for position, (mutation, unit) in enumerate(planned)
+    ]
+
+
+class CheckpointedTreeDiff:
+    """
+    Stand-in for the OrgTreeDiff when resuming an interrupted run. The units
+    to add and update are restored from the run checkpoint instead of being
+    found by comparing the SD and MO trees.
+
+    The units are linked to each other (and to placeholder nodes for parents
+    not in the checkpoint), such that the parent UUIDs are the same as in the
+    original run and units are still executed after their parents.
+    """
+
+    def __init__(self, checkpoint: list[RunCheckpoint]) -> None:
+        self.checkpoint = checkpoint
+
+        nodes = {
+            entry.org_unit_uuid: OrgUnitNode(
+                uuid=entry.org_unit_uuid,
+                parent_uuid=entry.parent_uuid,
+                user_key=entry.user_key,
+                name=entry.name,
+                org_unit_level_uuid=entry.org_unit_level_uuid,
+                validity=Validity(
+                    from_date=entry.validity_from, to_date=entry.validity_to
+                )
+                if entry.validity_from is not None
+                else None,
+            )
+            for entry in checkpoint
+        }
+        placeholders: dict[OrgUnitUUID, OrgUnitNode] = {}
+        for entry in checkpoint:
+            parent = nodes.get(entry.parent_uuid)
+            if parent is None:
+                parent = placeholders.setdefault(
+                    entry.parent_uuid,
+                    OrgUnitNode(uuid=entry.parent_uuid, user_key="", name=""),
+                )
+            nodes[entry.org_unit_uuid].parent = parent
+
+        self.units_to_add = [
+            nodes[entry.org_unit_uuid] for entry in checkpoint if entry.mutation == ADD
+        ]
+        self.units_to_update = [
+            nodes[entry.org_unit_uuid]
+            for entry in checkpoint
+            if entry.mutation == UPDATE
+        ]
+        self.units_in_obsolete_units_subtree = {
+            entry.org_unit_uuid
+            for entry in checkpoint
+            if entry.in_obsolete_units_subtree
+        }
+
+    def get_units_to_add(self) -> Iterator[OrgUnitNode]:
+        yield from self.units_to_add
+
+    def get_units_to_update(self) -> Iterator[OrgUnitNode]:
+        yield from self.units_to_update
@@ -12,6 +12,9 @@ from pydantic import BaseModel
 from pydantic import BaseSettings
 from pydantic import EmailStr
 from pydantic import Field
+from pydantic import NonNegativeFloat
+from pydantic import NonNegativeInt
+from pydantic import PositiveFloat
 from pydantic import PositiveInt
 from pydantic import SecretStr
 from pydantic import root_validator
@@ -23,6 +26,11 @@ SD_RETRY_WAIT_TIME = 15
 SD_RETRY_ATTEMPTS = 10
 TIMEZONE = ZoneInfo("Europe/Copenhagen")
 PNUMBER_CLASS_USER_KEY = "Pnummer"
+# Time-to-live (in seconds) of the cached MO class lookups
+MO_CLASS_CACHE_TTL = 60 * 60
+# Time-to-live (in seconds) of the cached MO related unit lookups (see
+# cache_mo_related_units)
+MO_RELATED_UNIT_CACHE_TTL = 15 * 60
 
 
 class Mode(Enum):
@@ -40,6 +48,27 @@ class SDAMQPSettings(BaseModel):
     url: AmqpDsn
     tls: AMQPTLS | None = None
 
+    # The SD AMQP messages are collected for up to batch_window seconds (or
+    # until batch_max_size messages have been collected) and then sent to MO as
+    # events in a single GraphQL request
+    batch_window: NonNegativeFloat = 0.5
+    batch_max_size: PositiveInt = 500
+    # The employment and person messages are collected for up to
+    # person_and_employment_window seconds instead, since SD typically emits
+    # several messages for the same person within a few seconds. Duplicate
+    # events within the window are only sent once, and a person event is
+    # dropped if the window contains employment events for the same person.
+    person_and_employment_window: NonNegativeFloat = 5
+    # The prefetch count of each consumer is adapted to the time it takes to send
+    # a batch to MO, i.e. it is doubled when a batch is sent in less than
+    # target_latency seconds and halved otherwise
+    prefetch_min: PositiveInt = 10
+    prefetch_max: PositiveInt = 2000
+    target_latency: PositiveFloat = 1
+    # Number of seconds to wait before sending the next batch after a batch
+    # could not be sent to MO (the messages of which are requeued)
+    retry_delay: NonNegativeFloat = 5
+
     class Config:
         env_nested_delimiter = "__"
 
@@ -51,6 +80,13 @@ class SDToolPlusSettings(BaseSettings):
 
     apply_ny_logic: bool = True
     httpx_timeout_ny_logic: PositiveInt = 120
+    # Number of apply-NY-logic calls sent to the SD integration concurrently
+    apply_ny_logic_concurrency: PositiveInt = 5
+    # Number of times a failed apply-NY-logic call is retried. The delay before
+    # retry n is apply_ny_logic_retry_backoff * 2^(n-1) seconds. Calls which
+    # still fail are recorded in the database (see /trigger/apply-ny-logic/failed)
+    apply_ny_logic_retries: NonNegativeInt = 3
+    apply_ny_logic_retry_backoff: NonNegativeFloat = 1
 
     elevate_managers: bool = False
 
@@ -64,6 +100,9 @@ class SDToolPlusSettings(BaseSettings):
     # above.
     mo_subtree_paths_for_root: dict[str, list[OrgUnitUUID]] | None = None
 
+    # Number of institutions synced concurrently by /trigger/institutions
+    institution_concurrency: PositiveInt = 4
+
     # Some of the SD institution units (i.e. the MO units which are
     # *institutions* and NOT *departments* in SD) may for historic reasons have
     # been created with random UUIDs in MO, which does not match the SD
@@ -84,6 +123,37 @@ class SDToolPlusSettings(BaseSettings):
     sd_password: SecretStr
     sd_url_subpath_xml_endpoints: str = ""
     sd_url_subpath_json_endpoints: str = ""
+    # Size of the connection pool shared by all SD calls, i.e. the maximum number
+    # of concurrent SD calls, and the number of idle keep-alive connections to keep
+    sd_max_connections: PositiveInt = 10
+    sd_max_keepalive_connections: PositiveInt = 10
+    # Maximum number of SD calls started per second (0 means no limit)
+    sd_max_requests_per_second: NonNegativeFloat = 0
+
+    # Number of seconds to cache SD department and department parent history
+    # responses (0 disables the cache) and the maximum number of cached responses
+    sd_cache_ttl: NonNegativeInt = 60
+    sd_cache_maxsize: PositiveInt = 1024
+    # Number of seconds between rebuilds of the SD department parent maps used
+    # for elevating engagements to the NY-levels (0 disables the maps, i.e.
+    # the parents are looked up per department). Each map is built from a
+    # single GetOrganization call covering the entire history of the
+    # institution.
+    sd_department_parent_map_ttl: NonNegativeInt = 0
+
+    # Number of SD persons whose employments are fetched concurrently by the
+    # full SD person and engagement sync
+    sd_person_sync_concurrency: PositiveInt = 5
+
+    # Number of org units fetched from MO per (paginated) GraphQL request when
+    # building the MO org unit tree
+    mo_org_units_page_size: PositiveInt = 500
+
+    # Number of org unit add/update mutations the TreeDiffExecutor sends to MO
+    # concurrently. The units are processed level by level (by depth in the
+    # tree), such that only sibling units are mutated concurrently. 1 means that
+    # the mutations are executed one at a time.
+    tree_diff_executor_concurrency: PositiveInt = 1
 
     # Whether to run in "municipality" mode or "region" mode.
     # In "municipality" mode, we
@@ -100,6 +170,11 @@ class SDToolPlusSettings(BaseSettings):
     # have any relations, and so on.
     # This option is only available in region mode
     use_recursive_mo_ou_relation_lookup: bool = False
+    # If true, the related unit lookups (including the recursive lookups) are
+    # cached per unit and interval, such that the engagements in the same unit
+    # do not repeat the same lookups. The cache is invalidated on MO related
+    # unit and org unit events. This option is only available in region mode
+    cache_mo_related_units: bool = False
 
     # If true, we prefix the engagement user keys in "municipality" mode
     prefix_engagement_user_keys: bool = False
@@ -139,6 +214,24 @@ class SDToolPlusSettings(BaseSettings):
     disable_mo_person_events: bool = False
     # If true, we disable all MO engagement events
     disable_mo_engagement_events: bool = False
+    # Number of SD person-and-employment events processed concurrently. Events
+    # for the same (institution, CPR, employment) are still processed one at a
+    # time, as the sync is exclusive on that key
+    sd_person_engagement_events_parallelism: PositiveInt = 1
+    # Number of MO engagement events processed concurrently (see above)
+    mo_engagement_events_parallelism: PositiveInt = 1
+    # Maximum number of engagement mutations sent to MO in a single (aliased)
+    # GraphQL request when syncing an engagement timeline. 0 disables the batching,
+    # i.e. each mutation is sent in its own request.
+    mo_engagement_mutation_batch_size: NonNegativeInt = 0
+    # Number of events sent to MO in a single (aliased) GraphQL request and the
+    # number of concurrent requests, when the full sync endpoints queue events
+    # in bulk (see EventPublisher)
+    mo_event_batch_size: PositiveInt = 100
+    mo_event_concurrency: PositiveInt = 5
+    # If true, we disable the MO class events used for invalidating the MO class
+    # cache
+    disable_mo_class_events: bool = False
 
     # SD AMQP
     sd_amqp: SDAMQPSettings | None = None
@@ -171,6 +264,10 @@ class SDToolPlusSettings(BaseSettings):
     db_password: SecretStr
     db_host: str = "sd-db"
     db_name: str = "sdtool_plus"
+    # Size of the RunDB connection pool and the number of connections allowed
+    # in addition to the pool size
+    db_pool_size: PositiveInt = 5
+    db_max_overflow: NonNegativeInt = 10
 
     # List of UUIDs of "Udgåede afdelinger" (there can be several of these)
     obsolete_unit_roots: list[OrgUnitUUID]
@@ -234,6 +331,17 @@ class SDToolPlusSettings(BaseSettings):
     # unknown unit.
     terminate_engagements_in_unknown_in_past: bool = False
 
+    # Skip the sync of an engagement if neither the SD employment (and leave)
+    # timeline nor the MO engagement (and leave) timeline has changed since the
+    # last successful sync of the engagement. Since the unit tree affects the
+    # placement of the engagements, the fingerprint of an engagement is removed
+    # on SD org and MO org unit events for its SD departments and MO units (and
+    # for the engagements in "Unknown", on MO related unit events and, with the
+    # recursive related unit lookup, on all MO org unit events). NOTE: changes
+    # to the associations and to the settings do not trigger a sync of the
+    # engagement.
+    skip_unchanged_engagements: bool = False
+
     class Config:
         env_nested_delimiter = "__"
 
@@ -249,6 +357,10 @@ class SDToolPlusSettings(BaseSettings):
                 raise ValueError(
                     "USE_RECURSIVE_MO_OU_RELATION_LOOKUP can only be set in region mode"
                 )
+            if values["cache_mo_related_units"]:
+                raise ValueError(
+                    "CACHE_MO_RELATED_UNITS can only be set in region mode"
+                )
             return values
 
         if values["unknown_unit"] is None:
@@ -11,4 +11,9 @@ def get_db_url(settings: SDToolPlusSettings) -> str:
 
 
 def get_engine(settings: SDToolPlusSettings) -> Engine:
-    return create_engine(get_db_url(settings), pool_pre_ping=True)
+    return create_engine(
+        get_db_url(settings),
+        pool_pre_ping=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+    )
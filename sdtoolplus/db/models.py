@@ -1,9 +1,14 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
 from datetime import datetime
+from uuid import UUID
 
+from sqlalchemy import Boolean
 from sqlalchemy import DateTime
 from sqlalchemy import String
+from sqlalchemy import Text
+from sqlalchemy import Uuid
+from sqlalchemy import false
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
@@ -19,3 +24,113 @@ class RunDB(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     status: Mapped[str] = mapped_column(String(20))
+    institution_identifier: Mapped[str | None] = mapped_column(String(20))
+    dry_run: Mapped[bool] = mapped_column(
+        Boolean, default=False, server_default=false()
+    )
+    # Run statistics, which are only set for completed runs
+    duration: Mapped[float | None]  # seconds
+    units_added: Mapped[int | None]
+    units_updated: Mapped[int | None]
+
+
+class EmploymentChangeWatermark(Base):
+    """
+    The time up to which the SD employment changes have been queued for sync
+    (per institution) by the incremental SD employment sync.
+    """
+
+    __tablename__ = "employment_change_watermark"
+
+    institution_identifier: Mapped[str] = mapped_column(String(20), primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class ApplyNYLogicFailure(Base):
+    """
+    Units for which the call to the SD integrations apply-NY-logic endpoint
+    failed (after all retries). The records are removed again when the call
+    succeeds.
+    """
+
+    __tablename__ = "apply_ny_logic_failure"
+
+    institution_identifier: Mapped[str] = mapped_column(String(20), primary_key=True)
+    org_unit_uuid: Mapped[UUID] = mapped_column(Uuid, primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    error: Mapped[str] = mapped_column(Text)
+
+
+class RunCheckpoint(Base):
+    """
+    The org unit mutations planned by a /trigger run (per institution) and
+    whether they have been applied. Used for resuming an interrupted run
+    without fetching and comparing the SD and MO trees again.
+    """
+
+    __tablename__ = "run_checkpoint"
+
+    institution_identifier: Mapped[str] = mapped_column(String(20), primary_key=True)
+    org_unit_uuid: Mapped[UUID] = mapped_column(Uuid, primary_key=True)
+    position: Mapped[int]
+    # "add" or "update"
+    mutation: Mapped[str] = mapped_column(String(20))
+    parent_uuid: Mapped[UUID] = mapped_column(Uuid)
+    name: Mapped[str] = mapped_column(Text)
+    user_key: Mapped[str] = mapped_column(Text)
+    org_unit_level_uuid: Mapped[UUID | None] = mapped_column(Uuid)
+    validity_from: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    validity_to: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    in_obsolete_units_subtree: Mapped[bool] = mapped_column(Boolean)
+    applied: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class FullSyncCursor(Base):
+    """
+    The progress of the full SD person and engagement sync (per institution).
+    The SD persons are processed in CPR order and `cpr` is the last CPR up to
+    which all persons have been processed, i.e. an interrupted sync can be
+    resumed after this CPR.
+    """
+
+    __tablename__ = "full_sync_cursor"
+
+    institution_identifier: Mapped[str] = mapped_column(String(20), primary_key=True)
+    cpr: Mapped[str | None] = mapped_column(String(10))
+    processed: Mapped[int]
+    total: Mapped[int]
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class EngagementFingerprint(Base):
+    """
+    Fingerprints (SHA-256 hashes) of the SD employment and leave timelines and
+    of the MO engagement and leave timelines (read back from MO) after the last
+    successful sync of an engagement. Used for skipping the sync of engagements
+    where neither SD nor MO has changed since then. A fingerprint is removed
+    when one of its units (see `EngagementFingerprintUnit`) changes.
+    """
+
+    __tablename__ = "engagement_fingerprint"
+
+    institution_identifier: Mapped[str] = mapped_column(String(20), primary_key=True)
+    cpr: Mapped[str] = mapped_column(String(10), primary_key=True)
+    employment_identifier: Mapped[str] = mapped_column(String(20), primary_key=True)
+    sd_fingerprint: Mapped[str] = mapped_column(String(64))
+    mo_fingerprint: Mapped[str] = mapped_column(String(64))
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class EngagementFingerprintUnit(Base):
+    """
+    The org units (SD departments and MO units) covered by an engagement
+    fingerprint, i.e. the units for which changes to the unit tree may change
+    the placement of the engagement.
+    """
+
+    __tablename__ = "engagement_fingerprint_unit"
+
+    institution_identifier: Mapped[str] = mapped_column(String(20), primary_key=True)
+    cpr: Mapped[str] = mapped_column(String(10), primary_key=True)
+    employment_identifier: Mapped[str] = mapped_column(String(20), primary_key=True)
+    org_unit_uuid: Mapped[UUID] = mapped_column(Uuid, primary_key=True, index=True)
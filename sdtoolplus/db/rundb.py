@@ -1,7 +1,15 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Iterable
 from datetime import datetime
 from enum import Enum
+from functools import wraps
+from typing import ParamSpec
+from typing import TypeVar
+from uuid import UUID
 from zoneinfo import ZoneInfo
 
 import structlog
@@ -11,22 +19,54 @@ from sqlalchemy import Engine
 from sqlalchemy import delete
 from sqlalchemy import desc
 from sqlalchemy import select
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 
+from sdtoolplus.db.models import ApplyNYLogicFailure
+from sdtoolplus.db.models import EmploymentChangeWatermark
+from sdtoolplus.db.models import EngagementFingerprint
+from sdtoolplus.db.models import EngagementFingerprintUnit
+from sdtoolplus.db.models import FullSyncCursor
+from sdtoolplus.db.models import RunCheckpoint
 from sdtoolplus.db.models import RunDB
 
 logger = structlog.stdlib.get_logger()
 
+P = ParamSpec("P")
+T = TypeVar("T")
+
 
 class Status(Enum):
     COMPLETED = "completed"
     RUNNING = "running"
+    # The run finished, but failed for one or more SD institutions
+    FAILED = "failed"
+
+
+def _in_thread(func: Callable[P, T]) -> Callable[P, Awaitable[T]]:
+    """
+    Run the (blocking) database operation in a worker thread, such that the
+    event loop is not blocked while waiting for the database. The threads get
+    their connections from the connection pool of the engine.
+    """
 
+    @wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        return await asyncio.to_thread(func, *args, **kwargs)
 
-async def get_status(engine: Engine) -> Status:
+    return wrapper
+
+
+@_in_thread
+def get_status(engine: Engine) -> Status:
     with Session(engine) as session:
-        statement = select(RunDB.status).order_by(desc(RunDB.id)).limit(1)
+        statement = (
+            select(RunDB.status)
+            .where(RunDB.dry_run.is_(False))
+            .order_by(desc(RunDB.id))
+            .limit(1)
+        )
         status = session.execute(statement).scalar_one_or_none()
 
         # status is only "None" the very first time the application is run
@@ -35,26 +75,320 @@ async def get_status(engine: Engine) -> Status:
         return Status(status) if status is not None else Status.COMPLETED
 
 
-async def persist_status(engine: Engine, status: Status) -> None:
+@_in_thread
+def persist_status(
+    engine: Engine,
+    status: Status,
+    institution_identifier: str | None = None,
+    dry_run: bool = False,
+    duration: float | None = None,
+    units_added: int | None = None,
+    units_updated: int | None = None,
+) -> None:
     with Session(engine) as session:
         run = RunDB(
             timestamp=datetime.now(tz=ZoneInfo("Europe/Copenhagen")),
             status=status.value,
+            institution_identifier=institution_identifier,
+            dry_run=dry_run,
+            duration=duration,
+            units_added=units_added,
+            units_updated=units_updated,
         )
         session.add(run)
         session.commit()
 
 
-async def delete_last_run(engine: Engine) -> None:
+@_in_thread
+def delete_last_run(engine: Engine) -> None:
     with Session(engine) as session:
-        last_run = select(RunDB.id).order_by(desc(RunDB.id)).limit(1)
-        statement = delete(RunDB).where(RunDB.id == last_run)
+        last_run = (
+            select(RunDB.id)
+            .where(RunDB.dry_run.is_(False))
+            .order_by(desc(RunDB.id))
+            .limit(1)
+        )
+        statement = delete(RunDB).where(RunDB.id == last_run.scalar_subquery())
         session.execute(statement)
         session.commit()
 
 
+@_in_thread
+def get_runs(engine: Engine, limit: int) -> list[RunDB]:
+    """Get the latest runs (newest first) for tracking the run statistics."""
+    with Session(engine) as session:
+        statement = select(RunDB).order_by(desc(RunDB.id)).limit(limit)
+        return list(session.execute(statement).scalars())
+
+
+@_in_thread
+def get_employment_change_watermark(
+    engine: Engine, institution_identifier: str
+) -> datetime | None:
+    with Session(engine) as session:
+        watermark = session.get(EmploymentChangeWatermark, institution_identifier)
+        return watermark.timestamp if watermark is not None else None
+
+
+@_in_thread
+def persist_employment_change_watermark(
+    engine: Engine, institution_identifier: str, timestamp: datetime
+) -> None:
+    with Session(engine) as session:
+        session.merge(
+            EmploymentChangeWatermark(
+                institution_identifier=institution_identifier, timestamp=timestamp
+            )
+        )
+        session.commit()
+
+
+@_in_thread
+def persist_apply_ny_logic_failure(
+    engine: Engine, institution_identifier: str, org_unit_uuid: UUID, error: str
+) -> None:
+    with Session(engine) as session:
+        session.merge(
+            ApplyNYLogicFailure(
+                institution_identifier=institution_identifier,
+                org_unit_uuid=org_unit_uuid,
+                timestamp=datetime.now(tz=ZoneInfo("Europe/Copenhagen")),
+                error=error,
+            )
+        )
+        session.commit()
+
+
+@_in_thread
+def delete_apply_ny_logic_failure(
+    engine: Engine, institution_identifier: str, org_unit_uuid: UUID
+) -> None:
+    with Session(engine) as session:
+        statement = delete(ApplyNYLogicFailure).where(
+            ApplyNYLogicFailure.institution_identifier == institution_identifier,
+            ApplyNYLogicFailure.org_unit_uuid == org_unit_uuid,
+        )
+        session.execute(statement)
+        session.commit()
+
+
+@_in_thread
+def get_apply_ny_logic_failures(
+    engine: Engine, institution_identifier: str
+) -> list[UUID]:
+    with Session(engine) as session:
+        statement = (
+            select(ApplyNYLogicFailure.org_unit_uuid)
+            .where(ApplyNYLogicFailure.institution_identifier == institution_identifier)
+            .order_by(ApplyNYLogicFailure.timestamp)
+        )
+        return list(session.execute(statement).scalars())
+
+
+@_in_thread
+def persist_run_checkpoint(
+    engine: Engine, institution_identifier: str, checkpoint: list[RunCheckpoint]
+) -> None:
+    """Replace the run checkpoint of the institution."""
+    with Session(engine) as session:
+        session.execute(
+            delete(RunCheckpoint).where(
+                RunCheckpoint.institution_identifier == institution_identifier
+            )
+        )
+        session.add_all(checkpoint)
+        session.commit()
+
+
+@_in_thread
+def mark_run_checkpoint_applied(
+    engine: Engine, institution_identifier: str, org_unit_uuid: UUID
+) -> None:
+    with Session(engine) as session:
+        statement = (
+            update(RunCheckpoint)
+            .where(
+                RunCheckpoint.institution_identifier == institution_identifier,
+                RunCheckpoint.org_unit_uuid == org_unit_uuid,
+            )
+            .values(applied=True)
+        )
+        session.execute(statement)
+        session.commit()
+
+
+@_in_thread
+def get_pending_run_checkpoint(
+    engine: Engine, institution_identifier: str
+) -> list[RunCheckpoint]:
+    """Get the mutations of the run checkpoint which have not been applied."""
+    with Session(engine) as session:
+        statement = (
+            select(RunCheckpoint)
+            .where(
+                RunCheckpoint.institution_identifier == institution_identifier,
+                RunCheckpoint.applied.is_(False),
+            )
+            .order_by(RunCheckpoint.position)
+        )
+        return list(session.execute(statement).scalars())
+
+
+@_in_thread
+def has_run_checkpoint(engine: Engine, institution_identifier: str) -> bool:
+    with Session(engine) as session:
+        statement = (
+            select(RunCheckpoint.org_unit_uuid)
+            .where(RunCheckpoint.institution_identifier == institution_identifier)
+            .limit(1)
+        )
+        return session.execute(statement).first() is not None
+
+
+@_in_thread
+def delete_run_checkpoint(engine: Engine, institution_identifier: str) -> None:
+    with Session(engine) as session:
+        session.execute(
+            delete(RunCheckpoint).where(
+                RunCheckpoint.institution_identifier == institution_identifier
+            )
+        )
+        session.commit()
+
+
+@_in_thread
+def get_full_sync_cursor(
+    engine: Engine, institution_identifier: str
+) -> FullSyncCursor | None:
+    with Session(engine) as session:
+        return session.get(FullSyncCursor, institution_identifier)
+
+
+@_in_thread
+def persist_full_sync_cursor(
+    engine: Engine,
+    institution_identifier: str,
+    cpr: str | None,
+    processed: int,
+    total: int,
+) -> None:
+    with Session(engine) as session:
+        session.merge(
+            FullSyncCursor(
+                institution_identifier=institution_identifier,
+                cpr=cpr,
+                processed=processed,
+                total=total,
+                timestamp=datetime.now(tz=ZoneInfo("Europe/Copenhagen")),
+            )
+        )
+        session.commit()
+
+
+@_in_thread
+def delete_full_sync_cursor(engine: Engine, institution_identifier: str) -> None:
+    with Session(engine) as session:
+        session.execute(
+            delete(FullSyncCursor).where(
+                FullSyncCursor.institution_identifier == institution_identifier
+            )
+        )
+        session.commit()
+
+
+@_in_thread
+def get_engagement_fingerprint(
+    engine: Engine, institution_identifier: str, cpr: str, employment_identifier: str
+) -> EngagementFingerprint | None:
+    with Session(engine) as session:
+        return session.get(
+            EngagementFingerprint, (institution_identifier, cpr, employment_identifier)
+        )
+
+
+@_in_thread
+def persist_engagement_fingerprint(
+    engine: Engine,
+    institution_identifier: str,
+    cpr: str,
+    employment_identifier: str,
+    sd_fingerprint: str,
+    mo_fingerprint: str,
+    org_unit_uuids: Iterable[UUID],
+) -> None:
+    with Session(engine) as session:
+        session.merge(
+            EngagementFingerprint(
+                institution_identifier=institution_identifier,
+                cpr=cpr,
+                employment_identifier=employment_identifier,
+                sd_fingerprint=sd_fingerprint,
+                mo_fingerprint=mo_fingerprint,
+                timestamp=datetime.now(tz=ZoneInfo("Europe/Copenhagen")),
+            )
+        )
+        session.execute(
+            delete(EngagementFingerprintUnit).where(
+                EngagementFingerprintUnit.institution_identifier
+                == institution_identifier,
+                EngagementFingerprintUnit.cpr == cpr,
+                EngagementFingerprintUnit.employment_identifier
+                == employment_identifier,
+            )
+        )
+        session.add_all(
+            EngagementFingerprintUnit(
+                institution_identifier=institution_identifier,
+                cpr=cpr,
+                employment_identifier=employment_identifier,
+                org_unit_uuid=org_unit_uuid,
+            )
+            for org_unit_uuid in set(org_unit_uuids)
+        )
+        session.commit()
+
+
+@_in_thread
+def delete_engagement_fingerprints(
+    engine: Engine, org_unit_uuids: Iterable[UUID]
+) -> None:
+    """
+    Delete the fingerprints of the engagements covering any of the given units.
+    """
+    covered = select(
+        EngagementFingerprintUnit.institution_identifier,
+        EngagementFingerprintUnit.cpr,
+        EngagementFingerprintUnit.employment_identifier,
+    ).where(EngagementFingerprintUnit.org_unit_uuid.in_(set(org_unit_uuids)))
+    with Session(engine) as session:
+        keys = session.execute(covered).all()
+        for institution_identifier, cpr, employment_identifier in keys:
+            session.execute(
+                delete(EngagementFingerprint).where(
+                    EngagementFingerprint.institution_identifier
+                    == institution_identifier,
+                    EngagementFingerprint.cpr == cpr,
+                    EngagementFingerprint.employment_identifier
+                    == employment_identifier,
+                )
+            )
+            session.execute(
+                delete(EngagementFingerprintUnit).where(
+                    EngagementFingerprintUnit.institution_identifier
+                    == institution_identifier,
+                    EngagementFingerprintUnit.cpr == cpr,
+                    EngagementFingerprintUnit.employment_identifier
+                    == employment_identifier,
+                )
+            )
+        session.commit()
+
+
 async def run_db_start_operations(
-    engine: Engine, dry_run: bool, response: Response
+    engine: Engine,
+    dry_run: bool,
+    response: Response,
+    institution_identifier: str | None = None,
 ) -> dict | None:
     if dry_run:
         return None
@@ -67,12 +401,38 @@ async def run_db_start_operations(
         return {"msg": "Previous run did not complete successfully!"}
     logger.info("Previous run completed successfully")
 
-    await persist_status(engine, Status.RUNNING)
+    await persist_status(engine, Status.RUNNING, institution_identifier)
 
     return None
 
 
-async def run_db_end_operations(engine: Engine, dry_run: bool) -> None:
-    if not dry_run:
-        await persist_status(engine, Status.COMPLETED)
-    dipex_last_success_timestamp.set_to_current_time()
+async def run_db_end_operations(
+    engine: Engine,
+    dry_run: bool,
+    institution_identifier: str | None = None,
+    started: datetime | None = None,
+    units_added: int | None = None,
+    units_updated: int | None = None,
+    status: Status = Status.COMPLETED,
+) -> None:
+    """
+    Record the completed (or failed) run along with its statistics. Dry runs
+    are recorded as well (for the statistics), but they are ignored by
+    `get_status`.
+    """
+    duration = (
+        (datetime.now(tz=ZoneInfo("Europe/Copenhagen")) - started).total_seconds()
+        if started is not None
+        else None
+    )
+    await persist_status(
+        engine,
+        status,
+        institution_identifier=institution_identifier,
+        dry_run=dry_run,
+        duration=duration,
+        units_added=units_added,
+        units_updated=units_updated,
+    )
+    if status == Status.COMPLETED:
+        dipex_last_success_timestamp.set_to_current_time()
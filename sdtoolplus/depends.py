@@ -5,10 +5,10 @@ from typing import Annotated
 from fastapi import Depends
 from fastramqpi.depends import from_user_context
 from fastramqpi.ramqp.depends import from_context
-from sdclient.client import SDClient as _SDClient
 from sqlalchemy import Engine as _Engine
 
 from sdtoolplus.autogenerated_graphql_client import GraphQLClient as _GraphQLClient
+from sdtoolplus.sd.client import AsyncSDClient as _SDClient
 
 from .config import SDToolPlusSettings as _Settings
 
@@ -7,13 +7,13 @@ from uuid import UUID
 from zoneinfo import ZoneInfo
 
 import structlog
+from anytree import PreOrderIter  # type: ignore
 from anytree.util import commonancestors  # type: ignore
-from more_itertools import one
 from more_itertools import partition
 from pydantic import BaseModel
 
 from .config import SDToolPlusSettings
-from .graphql import GET_ENGAGEMENTS
+from .graphql import GET_UNITS_WITH_ENGAGEMENTS
 from .graphql import get_graphql_client
 from .mo_class import MOOrgUnitLevelMap
 from .mo_org_unit_importer import OrgUnitNode
@@ -89,6 +89,7 @@ class OrgTreeDiff:
         self.nodes_processed: set[OrgUnitUUID] = set()
         self.engs_in_subtree: set[OrgUnitUUID] = set()
         self.units_with_engs: set[tuple[str, OrgUnitUUID]] = set()
+        self.units_with_active_engs: set[OrgUnitUUID] = set()
 
         logger.info("Comparing the SD and MO trees")
         self._compare_trees()
@@ -134,6 +135,10 @@ class OrgTreeDiff:
             units=units_to_move_to_obsolete_subtree_list,
         )
 
+        self._prefetch_units_with_active_engagements(
+            units_to_move_to_obsolete_subtree_list
+        )
+
         # Partition units into 1) those with active engagements and 2) those
         # who do not have active engagements
         units_to_move, units_not_to_move = partition(
@@ -179,31 +184,71 @@ class OrgTreeDiff:
 
         return parent_should_be_updated or name_should_be_updated
 
-    def _has_active_engagements(self, org_unit_node: OrgUnitNode) -> bool:
+    def _prefetch_units_with_active_engagements(
+        self, subtree_roots: list[OrgUnitNode]
+    ) -> None:
         """
-        Check if the unit has current or future active engagements
+        Fetch the units with current or future active engagements in the
+        subtrees of the given units, such that the subtree checks below can be
+        answered without querying MO once per unit. The units are fetched from
+        MO page by page (using cursor pagination) and the result is stored in
+        self.units_with_active_engs.
 
         Args:
-            org_unit_node: the unit to check
-
-        Returns:
-            True if the unit has current or future active engagements or False otherwise
+            subtree_roots: the roots of the subtrees to check
         """
+        unit_uuids = {
+            str(node.uuid) for root in subtree_roots for node in PreOrderIter(root)
+        }
+        if not unit_uuids:
+            return
+
+        logger.info("Getting units with active engagements", units=len(unit_uuids))
 
         # TODO: has to be done in this way for now, but we will use the FastRAMQPI
         # GraphQL client in the future
         gql_client = get_graphql_client(self.settings)
+        from_date = datetime.now(tz=ZoneInfo("Europe/Copenhagen")).isoformat()
+
+        next_cursor = None
+        while True:
+            r = gql_client.execute(
+                GET_UNITS_WITH_ENGAGEMENTS,
+                variable_values={
+                    "uuids": sorted(unit_uuids),
+                    "from_date": from_date,
+                    "limit": self.settings.mo_org_units_page_size,
+                    "cursor": next_cursor,
+                },
+            )
+            self.units_with_active_engs.update(
+                UUID(obj["current"]["uuid"])
+                for obj in r["org_units"]["objects"]
+                if obj["current"] is not None and obj["current"]["engagements"]
+            )
 
-        r = gql_client.execute(
-            GET_ENGAGEMENTS,
-            variable_values={
-                "uuid": str(org_unit_node.uuid),
-                "from_date": datetime.now(tz=ZoneInfo("Europe/Copenhagen")).isoformat(),
-            },
-        )
-        has_active_engagements = (
-            len(one(r["org_units"]["objects"])["current"]["engagements"]) > 0
+            next_cursor = r["org_units"]["page_info"]["next_cursor"]
+            if next_cursor is None:
+                break
+
+        logger.info(
+            "Got units with active engagements",
+            units=len(self.units_with_active_engs),
         )
+
+    def _has_active_engagements(self, org_unit_node: OrgUnitNode) -> bool:
+        """
+        Check if the unit has current or future active engagements. The
+        engagements must have been prefetched with
+        _prefetch_units_with_active_engagements.
+
+        Args:
+            org_unit_node: the unit to check
+
+        Returns:
+            True if the unit has current or future active engagements or False otherwise
+        """
+        has_active_engagements = org_unit_node.uuid in self.units_with_active_engs
         if has_active_engagements:
             self.units_with_engs.add((org_unit_node.name, org_unit_node.uuid))
 
@@ -1,6 +1,5 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-import asyncio
 import math
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
@@ -8,12 +7,8 @@ from contextlib import suppress
 from datetime import datetime
 from datetime import time
 from datetime import timedelta
-from functools import partial
-from functools import wraps
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Callable
-from typing import Coroutine
 from urllib.parse import urlencode
 from uuid import UUID
 from zoneinfo import ZoneInfo
@@ -30,20 +25,28 @@ from more_itertools import last
 from more_itertools import one
 from more_itertools import only
 from pydantic import Json
+from sqlalchemy import Engine
 
 from sdtoolplus import depends
 from sdtoolplus.autogenerated_graphql_client.input_types import EngagementFilter
 from sdtoolplus.autogenerated_graphql_client.input_types import EventSendInput
 from sdtoolplus.autogenerated_graphql_client.input_types import OrganisationUnitFilter
 from sdtoolplus.config import SDAMQPSettings
+from sdtoolplus.config import SDToolPlusSettings
+from sdtoolplus.db.rundb import delete_engagement_fingerprints
 from sdtoolplus.depends import GraphQLClient
 from sdtoolplus.exceptions import PersonNotFoundError
+from sdtoolplus.mo.timelines.common import clear_mo_class_cache
 from sdtoolplus.mo.timelines.engagement import get_engagement_types_to_process
+from sdtoolplus.mo.timelines.related_unit import clear_related_unit_cache
+from sdtoolplus.mo_org_unit_importer import OrgUnitUUID
 from sdtoolplus.models import EmploymentAMQPEvent
 from sdtoolplus.models import OrgAMQPEvent
 from sdtoolplus.models import OrgGraphQLEvent
 from sdtoolplus.models import PersonAMQPEvent
 from sdtoolplus.models import PersonAndEmploymentGraphQLEvent
+from sdtoolplus.sd_amqp import SDAMQPBatchConsumer
+from sdtoolplus.sd_amqp import coalesce_person_and_employment_events
 from sdtoolplus.sync.common import split_engagement_user_key
 from sdtoolplus.sync.engagement import sync_engagement
 from sdtoolplus.sync.engagement import sync_person_and_engagement
@@ -80,107 +83,89 @@ async def sd_amqp_lifespan(
         except Exception as e:
             raise ConnectionError("Failed to connect to SD AMQP") from e
 
-        channel = await connection.channel()
-        await channel.set_qos(prefetch_count=10)
-
-        # Queues
+        # Queues. Each consumer gets a channel of its own (see
+        # SDAMQPBatchConsumer). The employment and person events are consumed
+        # together, such that they can be coalesced.
         graphql_client: GraphQLClient = context["graphql_client"]
-        queues = {
-            "employment-events": partial(
-                process_sd_amqp_employment_event,
-                graphql_client=graphql_client,
-            ),
-            "org-events": partial(
-                process_sd_amqp_org_event,
+        consumers = [
+            SDAMQPBatchConsumer(
+                name="person-and-employment",
+                channel=await connection.channel(),
+                queues={
+                    "employment-events": employment_amqp_event_to_graphql_event,
+                    "person-events": person_amqp_event_to_graphql_event,
+                },
                 graphql_client=graphql_client,
+                settings=settings,
+                window=settings.person_and_employment_window,
+                coalesce=coalesce_person_and_employment_events,
             ),
-            "person-events": partial(
-                process_sd_amqp_person_event,
+            SDAMQPBatchConsumer(
+                name="org",
+                channel=await connection.channel(),
+                queues={"org-events": org_amqp_event_to_graphql_event},
                 graphql_client=graphql_client,
+                settings=settings,
+                window=settings.batch_window,
             ),
-        }
-        for name, callback in queues.items():
-            queue = await channel.get_queue(name)
-            await queue.consume(process_sd_amqp_message(callback), timeout=5)
+        ]
+        for consumer in consumers:
+            await consumer.start()
 
         try:
             yield  # wait until terminate
         finally:
             logger.info("Disconnecting from SD AMQP")
+            for consumer in consumers:
+                await consumer.close()
             await connection.close()
 
 
-def process_sd_amqp_message(
-    func: Callable[[AbstractIncomingMessage], Coroutine],
-) -> Callable[[AbstractIncomingMessage], Coroutine]:
-    @wraps(func)
-    async def wrapper(message: AbstractIncomingMessage):
-        log = logger.bind(message=message)
-        log.info("Processing SD AMQP message", body=message.body)
-        # Requeue message on exception so it can be retried
-        async with message.process(requeue=True):
-            try:
-                return await func(message)
-            except Exception:
-                log.exception("Exception in SD AMQP message processing")
-                await asyncio.sleep(5)
-                raise
-
-    return wrapper
-
-
 # SD AMQP Handlers
 # Converts SD AMQP messages to OS2mo GraphQL events.
 
 
-async def process_sd_amqp_employment_event(
-    message: AbstractIncomingMessage, graphql_client: GraphQLClient
-) -> None:
+def employment_amqp_event_to_graphql_event(
+    message: AbstractIncomingMessage,
+) -> EventSendInput:
     event = EmploymentAMQPEvent.parse_raw(message.body)
-
-    await graphql_client.send_event(
-        input=EventSendInput(
-            namespace="sd",
-            routing_key="person-and-employment",
-            subject=PersonAndEmploymentGraphQLEvent(
-                institution_identifier=event.instCode,
-                employment_identifier=event.tjnr,
-                cpr=event.cpr,
-            ).json(),
-        )
+    return EventSendInput(
+        namespace="sd",
+        routing_key="person-and-employment",
+        subject=PersonAndEmploymentGraphQLEvent(
+            institution_identifier=event.instCode,
+            employment_identifier=event.tjnr,
+            cpr=event.cpr,
+        ).json(),
     )
 
 
-async def process_sd_amqp_org_event(
-    message: AbstractIncomingMessage, graphql_client: GraphQLClient
-) -> None:
+def org_amqp_event_to_graphql_event(
+    message: AbstractIncomingMessage,
+) -> EventSendInput:
     event = OrgAMQPEvent.parse_raw(message.body)
     # TODO: Set priority to ensure proper parent/children synchronisation order?
-    await graphql_client.send_event(
-        input=EventSendInput(
-            namespace="sd",
-            routing_key="org",
-            subject=OrgGraphQLEvent(
-                institution_identifier=event.instCode,
-                org_unit=event.orgUnitUuid,
-            ).json(),
-        )
+    return EventSendInput(
+        namespace="sd",
+        routing_key="org",
+        subject=OrgGraphQLEvent(
+            institution_identifier=event.instCode,
+            org_unit=event.orgUnitUuid,
+        ).json(),
     )
 
 
-async def process_sd_amqp_person_event(
-    message: AbstractIncomingMessage, graphql_client: GraphQLClient
-) -> None:
+def person_amqp_event_to_graphql_event(
+    message: AbstractIncomingMessage,
+) -> EventSendInput:
     event = PersonAMQPEvent.parse_raw(message.body)
-    await graphql_client.send_event(
-        input=EventSendInput(
-            namespace="sd",
-            routing_key="person-and-employment",
-            subject=PersonAndEmploymentGraphQLEvent(
-                institution_identifier=event.instCode,
-                cpr=event.cpr,
-            ).json(),
-        )
+    return EventSendInput(
+        namespace="sd",
+        routing_key="person-and-employment",
+        subject=PersonAndEmploymentGraphQLEvent(
+            institution_identifier=event.instCode,
+            cpr=event.cpr,
+        ).json(),
     )
 
 
@@ -216,6 +201,7 @@ async def _sd_person_and_employment(
     settings: depends.Settings,
     sd_client: depends.SDClient,
     gql_client: depends.GraphQLClient,
+    engine: depends.Engine,
     event: Event[Json[PersonAndEmploymentGraphQLEvent]],
 ) -> dict:
     person_engagement: PersonAndEmploymentGraphQLEvent = event.subject
@@ -225,6 +211,7 @@ async def _sd_person_and_employment(
         settings=settings,
         sd_client=sd_client,
         gql_client=gql_client,
+        engine=engine,
         institution_identifier=person_engagement.institution_identifier,
         cpr=person_engagement.cpr,
         employment_identifier=person_engagement.employment_identifier,
@@ -237,6 +224,7 @@ async def _sync_engagement_by_uuid(
     settings,
     sd_client,
     gql_client: GraphQLClient,
+    engine: Engine,
     mo_engagement_uuid: UUID,
 ) -> None:
     mo_engagements = await gql_client.get_engagements(
@@ -294,6 +282,7 @@ async def _sync_engagement_by_uuid(
     await sync_engagement(
         sd_client=sd_client,
         gql_client=gql_client,
+        engine=engine,
         institution_identifier=institution_identifier,
         cpr=mo_person_cpr,
         employment_identifier=employment_identifier,
@@ -306,6 +295,7 @@ async def _mo_engagement(
     settings: depends.Settings,
     sd_client: depends.SDClient,
     gql_client: depends.GraphQLClient,
+    engine: depends.Engine,
     event: Event[UUID],
 ) -> None:
     mo_engagement_uuid = event.subject
@@ -314,6 +304,7 @@ async def _mo_engagement(
         settings=settings,
         sd_client=sd_client,
         gql_client=gql_client,
+        engine=engine,
         mo_engagement_uuid=mo_engagement_uuid,
     )
 
@@ -323,6 +314,7 @@ async def _mo_manager(
     settings: depends.Settings,
     sd_client: depends.SDClient,
     gql_client: depends.GraphQLClient,
+    engine: depends.Engine,
     event: Event[UUID],
 ) -> None:
     mo_manager_uuid = event.subject
@@ -351,6 +343,7 @@ async def _mo_manager(
             settings=settings,
             sd_client=sd_client,
             gql_client=gql_client,
+            engine=engine,
             mo_engagement_uuid=engagement_uuid,
         )
 
@@ -360,11 +353,17 @@ async def _sd_org(
     settings: depends.Settings,
     sd_client: depends.SDClient,
     gql_client: depends.GraphQLClient,
+    engine: depends.Engine,
     event: Event[Json[OrgGraphQLEvent]],
 ) -> dict:
     org = event.subject
     logger.info("Received SD org event", subject=org)
 
+    # The unit has changed in SD, so we cannot use any cached responses for it
+    sd_client.invalidate_department(org.org_unit)
+    if settings.skip_unchanged_engagements:
+        await delete_engagement_fingerprints(engine, [org.org_unit])
+
     await sync_ou(
         sd_client=sd_client,
         gql_client=gql_client,
@@ -377,15 +376,36 @@ async def _sd_org(
     return {"msg": "success"}
 
 
+def _recursive_lookup_units(settings: SDToolPlusSettings) -> list[OrgUnitUUID]:
+    """
+    The placement of the engagements in "Unknown" depends on the parents of
+    their units in the recursive related unit lookup, so any change to the unit
+    tree may change it.
+    """
+    if (
+        settings.use_recursive_mo_ou_relation_lookup
+        and settings.unknown_unit is not None
+    ):
+        return [settings.unknown_unit]
+    return []
+
+
 @router.post("/events/mo/org-unit")
 async def _mo_org_unit(
     settings: depends.Settings,
     sd_client: depends.SDClient,
     gql_client: depends.GraphQLClient,
+    engine: depends.Engine,
     event: Event[UUID],
 ) -> None:
     mo_org_unit_uuid = event.subject
     logger.info("Received MO OU event", uuid=str(mo_org_unit_uuid))
+    # The parents of the unit may have changed
+    clear_related_unit_cache()
+    if settings.skip_unchanged_engagements:
+        await delete_engagement_fingerprints(
+            engine, [mo_org_unit_uuid, *_recursive_lookup_units(settings)]
+        )
 
     assert settings.mo_subtree_paths_for_root is not None
     mo_org_units = await gql_client.get_org_unit_user_keys(
@@ -431,6 +451,26 @@ async def _mo_org_unit(
     )
 
 
+@router.post("/events/mo/class")
+async def _mo_class(event: Event[UUID]) -> None:
+    logger.info("Received MO class event", uuid=str(event.subject))
+    clear_mo_class_cache()
+
+
+@router.post("/events/mo/related-unit")
+async def _mo_related_unit(
+    settings: depends.Settings,
+    engine: depends.Engine,
+    event: Event[UUID],
+) -> None:
+    logger.info("Received MO related unit event", uuid=str(event.subject))
+    clear_related_unit_cache()
+    if settings.skip_unchanged_engagements and settings.unknown_unit is not None:
+        # Only the engagements placed in "Unknown" are (re)placed in related
+        # units (see `engagement_ou_strategy_region`)
+        await delete_engagement_fingerprints(engine, [settings.unknown_unit])
+
+
 @router.post("/events/mo/person", dependencies=[Depends(sd_api_open)])
 async def _mo_person(
     settings: depends.Settings,
@@ -0,0 +1,176 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+
+import structlog
+from more_itertools import one
+from sdclient.exceptions import SDCallError
+from sdclient.exceptions import SDRootElementNotFound
+from sqlalchemy import Engine
+
+from .autogenerated_graphql_client import EventSendInput
+from .db.rundb import delete_full_sync_cursor
+from .db.rundb import persist_full_sync_cursor
+from .mo.event_publisher import EventPublisher
+from .models import Person
+from .models import PersonAndEmploymentGraphQLEvent
+from .sd.client import AsyncSDClient
+from .sd.person import get_sd_person_engagements
+
+logger = structlog.stdlib.get_logger()
+
+PROGRESS_INTERVAL = 100
+
+
+async def _queue_person_employments(
+    sd_client: AsyncSDClient,
+    publisher: EventPublisher,
+    institution_identifier: str,
+    cpr: str,
+) -> bool:
+    """
+    Queue the SD employments of the person for sync.
+
+    Returns:
+        False if the employments could not be fetched from SD and True otherwise
+    """
+    try:
+        res = await get_sd_person_engagements(
+            sd_client=sd_client,
+            institution_identifier=institution_identifier,
+            cpr=cpr,
+        )
+    except SDRootElementNotFound:
+        logger.info(
+            "Person could not be found in sd",
+            institution_identifier=institution_identifier,
+            cpr=cpr,
+        )
+        return True
+    except SDCallError:
+        logger.error("SD call failed", cpr=cpr)
+        return False
+
+    logger.info("Found engagements", engagements=res)
+
+    for e in one(res.Person).Employment:
+        event = EventSendInput(
+            namespace="sd",
+            routing_key="person-and-employment",
+            subject=PersonAndEmploymentGraphQLEvent(
+                institution_identifier=institution_identifier,
+                cpr=cpr,
+                employment_identifier=e.EmploymentIdentifier,
+            ).json(),
+        )
+        await publisher.publish(event)
+
+    return True
+
+
+async def queue_all_sd_employments(
+    sd_client: AsyncSDClient,
+    publisher: EventPublisher,
+    engine: Engine,
+    institution_identifier: str,
+    sd_persons: list[Person],
+    concurrency: int,
+    resume_after: str | None = None,
+) -> list[str]:
+    """
+    Queue the SD employments of the given persons for sync. The persons are
+    processed in CPR order by a pool of `concurrency` workers.
+
+    The progress is logged and persisted (as a `FullSyncCursor`) for every
+    `PROGRESS_INTERVAL` processed persons. The cursor is the last CPR up to
+    which all persons have been processed successfully, so if the sync is
+    interrupted (or SD calls fail, e.g. because the SD API closes for the
+    night), it can be resumed from the cursor by passing it as `resume_after`.
+    The cursor is removed when all persons have been processed successfully.
+
+    Args:
+        sd_client: the SD client
+        publisher: the publisher used for sending the events to MO
+        engine: the database engine used for persisting the cursor
+        institution_identifier: the SD institution identifier
+        sd_persons: the SD persons
+        concurrency: the number of persons to process concurrently
+        resume_after: only process the persons with a CPR after this one
+
+    Returns:
+        The CPRs of the persons for which the SD calls failed
+    """
+    persons = sorted(
+        (
+            person
+            for person in sd_persons
+            if not person.cpr.endswith("0000")
+            and (resume_after is None or person.cpr > resume_after)
+        ),
+        key=lambda person: person.cpr,
+    )
+    total = len(persons)
+    logger.info(
+        "Queueing SD employments for sync",
+        institution_identifier=institution_identifier,
+        persons=total,
+        resume_after=resume_after,
+    )
+
+    succeeded = [False] * total
+    # Index of the first person which has not been processed successfully
+    cursor_index = 0
+    processed = 0
+    error_cprs: list[str] = []
+    persist_lock = asyncio.Lock()
+
+    def get_cursor() -> str | None:
+        nonlocal cursor_index
+        while cursor_index < total and succeeded[cursor_index]:
+            cursor_index += 1
+        return persons[cursor_index - 1].cpr if cursor_index > 0 else resume_after
+
+    async def persist_progress() -> None:
+        async with persist_lock:
+            cursor = get_cursor()
+            # Make sure the events of the persons up to the cursor have been
+            # sent before persisting the cursor
+            await publisher.flush()
+            logger.info(
+                "SD employment sync progress",
+                institution_identifier=institution_identifier,
+                processed=processed,
+                total=total,
+                errors=len(error_cprs),
+                cursor=cursor,
+            )
+            await persist_full_sync_cursor(
+                engine, institution_identifier, cursor, processed, total
+            )
+
+    # The workers share the iterator, so each person is processed once
+    person_iter = enumerate(persons)
+
+    async def worker() -> None:
+        nonlocal processed
+        for index, person in person_iter:
+            ok = await _queue_person_employments(
+                sd_client, publisher, institution_identifier, person.cpr
+            )
+            succeeded[index] = ok
+            if not ok:
+                error_cprs.append(person.cpr)
+
+            processed += 1
+            if processed % PROGRESS_INTERVAL == 0:
+                await persist_progress()
+
+    async with asyncio.TaskGroup() as task_group:
+        for _ in range(concurrency):
+            task_group.create_task(worker())
+    await persist_progress()
+
+    if not error_cprs:
+        await delete_full_sync_cursor(engine, institution_identifier)
+
+    return sorted(error_cprs)
@@ -15,17 +15,23 @@ from sdtoolplus.mo_org_unit_importer import Address
 from sdtoolplus.mo_org_unit_importer import AddressTypeUUID
 from sdtoolplus.mo_org_unit_importer import OrgUnitNode
 
-GET_ENGAGEMENTS = gql(
+GET_UNITS_WITH_ENGAGEMENTS = gql(
     """
-    query GetOrgUnitEngagements($uuid: UUID!, $from_date: DateTime!) {
-      org_units(filter: {uuids: [$uuid]}) {
+    query GetOrgUnitsWithEngagements(
+      $uuids: [UUID!]!, $from_date: DateTime!, $limit: int, $cursor: Cursor
+    ) {
+      org_units(filter: {uuids: $uuids}, limit: $limit, cursor: $cursor) {
         objects {
           current {
+            uuid
             engagements(filter: {from_date: $from_date, to_date: null}) {
               uuid
             }
           }
         }
+        page_info {
+          next_cursor
+        }
       }
     }
     """
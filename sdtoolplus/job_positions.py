@@ -1,6 +1,5 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-import asyncio
 from collections.abc import Iterator
 from dataclasses import dataclass
 from dataclasses import field
@@ -13,7 +12,6 @@ from uuid import uuid4
 import structlog
 from more_itertools import one
 from more_itertools import only
-from sdclient.client import SDClient
 from sdclient.requests import GetProfessionRequest
 from sdclient.responses import ProfessionObj
 
@@ -24,6 +22,7 @@ from sdtoolplus.autogenerated_graphql_client.input_types import FacetFilter
 from sdtoolplus.autogenerated_graphql_client.input_types import ValidityInput
 from sdtoolplus.config import TIMEZONE
 from sdtoolplus.depends import GraphQLClient
+from sdtoolplus.sd.client import AsyncSDClient
 
 logger = structlog.stdlib.get_logger()
 
@@ -199,7 +198,7 @@ def walk(
 
 
 async def sync_professions(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     graphql_client: GraphQLClient,
     institution_identifier: str,
     force_class_start_date: date | None = None,
@@ -208,8 +207,7 @@ async def sync_professions(
     mo_engagement_job_function_uuid = one(
         (await graphql_client.get_facet_uuid("engagement_job_function")).objects
     ).uuid
-    sd_professions = await asyncio.to_thread(
-        sd_client.get_profession,
+    sd_professions = await sd_client.get_profession(
         GetProfessionRequest(InstitutionIdentifier=institution_identifier),
     )
     for sd_parent, sd_profession in walk(
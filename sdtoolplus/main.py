@@ -7,7 +7,6 @@ from fastramqpi.events import GraphQLEvents
 from fastramqpi.events import Listener
 from fastramqpi.events import Namespace
 from fastramqpi.main import FastRAMQPI
-from sdclient.client import SDClient
 
 from sdtoolplus.roots import ensure_sd_institution_units_and_unknown_unit
 
@@ -20,6 +19,7 @@ from .events import sd_amqp_lifespan
 from .middleware import ExceptionLoggerMiddleware
 from .middleware import RequestIDMiddleware
 from .minisync.api import minisync_router
+from .sd.client import get_sd_client
 
 logger = structlog.stdlib.get_logger()
 
@@ -49,7 +49,10 @@ def _configure_listeners(settings: SDToolPlusSettings) -> list[Listener]:
                     user_key="person-and-employment",
                     routing_key="person-and-employment",
                     path="/events/sd/person-and-employment",
-                    parallelism=1,
+                    # The handler is exclusive on (institution, CPR, employment),
+                    # so events for different employments can safely be
+                    # processed in parallel
+                    parallelism=settings.sd_person_engagement_events_parallelism,
                 )
             )
     if not settings.disable_mo_events:
@@ -83,6 +86,27 @@ def _configure_listeners(settings: SDToolPlusSettings) -> list[Listener]:
                     user_key="engagement",
                     routing_key="engagement",
                     path="/events/mo/engagement",
+                    # See the comment on the SD person-and-employment listener
+                    parallelism=settings.mo_engagement_events_parallelism,
+                )
+            )
+        if not settings.disable_mo_class_events:
+            listeners.append(
+                Listener(
+                    namespace="mo",
+                    user_key="class",
+                    routing_key="class",
+                    path="/events/mo/class",
+                    parallelism=1,
+                )
+            )
+        if settings.cache_mo_related_units or settings.skip_unchanged_engagements:
+            listeners.append(
+                Listener(
+                    namespace="mo",
+                    user_key="related_unit",
+                    routing_key="related_unit",
+                    path="/events/mo/related-unit",
                     parallelism=1,
                 )
             )
@@ -120,13 +144,10 @@ def create_fastramqpi() -> FastRAMQPI:
     engine = get_engine(settings)
     fastramqpi.add_context(engine=engine)
 
-    sd_client = SDClient(
-        sd_username=settings.sd_username,
-        sd_password=settings.sd_password.get_secret_value(),
-        url_subpath_xml_endpoints=settings.sd_url_subpath_xml_endpoints,
-        url_subpath_json_endpoints=settings.sd_url_subpath_json_endpoints,
-    )
+    sd_client = get_sd_client(settings)
     fastramqpi.add_context(sd_client=sd_client)
+    # Close the SD connection pool on shutdown
+    fastramqpi.add_lifespan_manager(sd_client, priority=1000)
 
     if settings.ensure_sd_institution_units:
         fastramqpi.add_lifespan_manager(
@@ -33,6 +33,7 @@ async def _sync_person_and_engagement(
     settings: depends.Settings,
     sd_client: depends.SDClient,
     gql_client: depends.GraphQLClient,
+    engine: depends.Engine,
     payload: EngagementSyncPayload,
 ) -> dict:
     """
@@ -58,6 +59,7 @@ async def _sync_person_and_engagement(
         settings=settings,
         sd_client=sd_client,
         gql_client=gql_client,
+        engine=engine,
         institution_identifier=payload.institution_identifier,
         cpr=payload.cpr,
         employment_identifier=payload.employment_identifier,
@@ -0,0 +1,132 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from types import TracebackType
+
+import structlog
+
+from sdtoolplus.autogenerated_graphql_client import EventSendInput
+from sdtoolplus.config import SDToolPlusSettings
+from sdtoolplus.depends import GraphQLClient
+
+logger = structlog.stdlib.get_logger()
+
+
+class EventPublisher:
+    """
+    Send events to MO in bulk. The published events are collected in batches
+    of `batch_size` events, which are sent as aliased `event_send` mutations in
+    a single GraphQL request, and up to `concurrency` requests are in flight at
+    the same time. When all requests are in flight, `publish` waits for one of
+    them to complete (back-pressure), so the number of pending events is
+    bounded.
+
+    The publisher must be used as an async context manager. On exit, the
+    remaining events are sent and the publisher waits for all requests to
+    complete.
+
+    A failed request does not stop the publisher, but the error is raised by
+    the next call to `flush` (or on exit), i.e. all events published before a
+    successful `flush` have been sent to MO.
+
+    Args:
+        gql_client: the GraphQL client
+        batch_size: the maximum number of events to send per request
+        concurrency: the maximum number of concurrent requests
+    """
+
+    def __init__(
+        self, gql_client: GraphQLClient, batch_size: int, concurrency: int
+    ) -> None:
+        self.gql_client = gql_client
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+        # The number of events sent to MO
+        self.sent = 0
+        self._batch: list[EventSendInput] = []
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self._error: Exception | None = None
+
+    async def __aenter__(self) -> "EventPublisher":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            await self.flush()
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def publish(self, event: EventSendInput) -> None:
+        self._batch.append(event)
+        if len(self._batch) >= self.batch_size:
+            await self._send_batch()
+
+    async def flush(self) -> None:
+        """
+        Send the collected events and wait for all requests to complete.
+
+        Raises:
+            The error of the first request which failed since the last flush
+        """
+        if self._batch:
+            await self._send_batch()
+        await asyncio.gather(*self._tasks)
+
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    async def _send_batch(self) -> None:
+        batch, self._batch = self._batch, []
+        # The task is created right away (and waits for a free slot itself),
+        # such that a concurrent `flush` also waits for this batch
+        task = asyncio.create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        # Back-pressure
+        while len(self._tasks) > self.concurrency:
+            await asyncio.wait(set(self._tasks), return_when=asyncio.FIRST_COMPLETED)
+
+    async def _send(self, events: list[EventSendInput]) -> None:
+        async with self._semaphore:
+            await self._send_request(events)
+
+    async def _send_request(self, events: list[EventSendInput]) -> None:
+        variables = ", ".join(f"$input{i}: EventSendInput!" for i in range(len(events)))
+        fields = "\n".join(
+            f"e{i}: event_send(input: $input{i})" for i in range(len(events))
+        )
+        query = f"mutation SendEvents({variables}) {{\n{fields}\n}}"
+
+        try:
+            response = await self.gql_client.execute(
+                query=query,
+                variables={f"input{i}": event for i, event in enumerate(events)},
+            )
+            self.gql_client.get_data(response)
+            self.sent += len(events)
+            logger.debug("Sent events", events=len(events), sent=self.sent)
+        except Exception as error:
+            logger.error("Could not send events", events=len(events), error=error)
+            if self._error is None:
+                self._error = error
+
+
+def get_event_publisher(
+    gql_client: GraphQLClient, settings: SDToolPlusSettings
+) -> EventPublisher:
+    return EventPublisher(
+        gql_client,
+        batch_size=settings.mo_event_batch_size,
+        concurrency=settings.mo_event_concurrency,
+    )
@@ -2,20 +2,50 @@
 # SPDX-License-Identifier: MPL-2.0
 from datetime import datetime
 from datetime import timedelta
+from typing import Any
+from typing import Callable
+from typing import Coroutine
+from typing import TypeVar
 from uuid import UUID
 
 import structlog
+from async_lru import alru_cache
 from more_itertools import one
 
 from sdtoolplus.autogenerated_graphql_client import ClassFilter
 from sdtoolplus.autogenerated_graphql_client import FacetFilter
 from sdtoolplus.autogenerated_graphql_client import RAValidityInput
+from sdtoolplus.config import MO_CLASS_CACHE_TTL
 from sdtoolplus.config import TIMEZONE
 from sdtoolplus.depends import GraphQLClient
 from sdtoolplus.models import POSITIVE_INFINITY
 
 logger = structlog.stdlib.get_logger()
 
+T = TypeVar("T")
+
+# All the MO class lookups cached with the `mo_class_cache` decorator
+_mo_class_caches: list[Any] = []
+
+
+def mo_class_cache(
+    func: Callable[..., Coroutine[Any, Any, T]],
+) -> Callable[..., Coroutine[Any, Any, T]]:
+    """
+    Cache a MO class lookup for MO_CLASS_CACHE_TTL seconds. Classes rarely change
+    in MO, so there is no need to look them up again for every interval or
+    endpoint we process. The cache is invalidated on MO class events (see
+    `clear_mo_class_cache`). Exceptions are not cached.
+    """
+    cached: Any = alru_cache(maxsize=1024, ttl=MO_CLASS_CACHE_TTL)(func)
+    _mo_class_caches.append(cached)
+    return cached
+
+
+def clear_mo_class_cache() -> None:
+    for cache in _mo_class_caches:
+        cache.cache_clear()
+
 
 def mo_end_to_datetime(mo_end: datetime | None) -> datetime:
     """
@@ -74,6 +104,7 @@ def get_patch_validity(
     )
 
 
+@mo_class_cache
 async def get_class(
     gql_client: GraphQLClient,
     facet_user_key: str,
@@ -100,6 +131,7 @@ async def get_class(
     return current.uuid
 
 
+@mo_class_cache
 async def get_class_user_key(
     gql_client: GraphQLClient,
     class_uuid: UUID,
@@ -15,11 +15,18 @@ from sdtoolplus.autogenerated_graphql_client import EngagementFilter
 from sdtoolplus.autogenerated_graphql_client import EngagementTerminateInput
 from sdtoolplus.autogenerated_graphql_client import EngagementUpdateInput
 from sdtoolplus.autogenerated_graphql_client import FacetFilter
+from sdtoolplus.autogenerated_graphql_client import (
+    GetEngagementTimelineEngagementsObjects,
+)
+from sdtoolplus.autogenerated_graphql_client import (
+    GetEngagementTimelineEngagementsObjectsValidities,
+)
 from sdtoolplus.config import SDToolPlusSettings
 from sdtoolplus.depends import GraphQLClient
 from sdtoolplus.exceptions import MoreThanOneEngagementError
 from sdtoolplus.mo.timelines.common import get_class_user_key
 from sdtoolplus.mo.timelines.common import get_patch_validity
+from sdtoolplus.mo.timelines.common import mo_class_cache
 from sdtoolplus.mo.timelines.common import mo_end_to_timeline_end
 from sdtoolplus.mo.timelines.common import timeline_interval_to_mo_validity
 from sdtoolplus.models import Active
@@ -37,6 +44,7 @@ from sdtoolplus.models import combine_intervals
 logger = structlog.stdlib.get_logger()
 
 
+@mo_class_cache
 async def get_engagement_types(gql_client: GraphQLClient) -> dict[EngType, UUID]:
     """
     Get map from engagement type (Enum) to MO engagement type class UUID
@@ -64,10 +72,22 @@ async def get_engagement_types_to_process(
     engagement types from the ENGAGEMENT_TYPES_TO_PROCESS environment
     variable.
     """
+    return set(
+        await _get_engagement_type_uuids(
+            gql_client, tuple(settings.engagement_types_to_process)
+        )
+    )
+
+
+@mo_class_cache
+async def _get_engagement_type_uuids(
+    gql_client: GraphQLClient,
+    user_keys: tuple[str, ...],
+) -> frozenset[UUID]:
     r_eng_types = await gql_client.get_class(
         ClassFilter(
             facet=FacetFilter(user_keys=["engagement_type"]),
-            user_keys=settings.engagement_types_to_process,
+            user_keys=list(user_keys),
         )
     )
 
@@ -75,9 +95,10 @@ async def get_engagement_types_to_process(
         obj.current for obj in r_eng_types.objects if obj.current is not None
     )
 
-    return set(clazz.uuid for clazz in relevant_classes)
+    return frozenset(clazz.uuid for clazz in relevant_classes)
 
 
+@mo_class_cache
 async def get_job_function(
     gql_client: GraphQLClient, job_function_user_key: str
 ) -> UUID:
@@ -312,8 +333,6 @@ async def update_engagement(
         job_function_user_key=str(desired_eng_timeline.eng_key.entity_at(start).value),
     )
 
-    mo_validity = timeline_interval_to_mo_validity(start, end)
-
     eng = await gql_client.get_engagement_timeline(
         get_engagement_filter(
             person=person, user_key=user_key, from_date=start, to_date=end
@@ -324,34 +343,16 @@ async def update_engagement(
     if obj:
         # The engagement already exists in this validity period
         for validity in one(eng.objects).validities:
-            eng_name = desired_eng_timeline.eng_name.entity_at(start).value
-            payload = EngagementUpdateInput(
-                uuid=obj.uuid,
-                user_key=user_key,
-                primary=validity.primary_uuid,
-                validity=get_patch_validity(
-                    validity.validity.from_, validity.validity.to, mo_validity
-                ),
-                # The empty string will be converted to null in the LoRa DB. Update
-                # logic when https://redmine.magenta.dk/issues/65028 has been fixed.
-                extension_1=eng_name if eng_name is not None else "",
-                extension_2=validity.extension_2,
-                extension_3=validity.extension_3,
-                extension_4=desired_eng_timeline.eng_unit_id.entity_at(start).value,
-                extension_5=str(
-                    desired_eng_timeline.eng_sd_unit.entity_at(start).value
-                ),
-                extension_6=validity.extension_6,
-                extension_7=validity.extension_7,
-                extension_8=validity.extension_8,
-                extension_9=validity.extension_9,
-                extension_10=validity.extension_10,
+            payload = _get_update_payload(
+                eng_uuid=obj.uuid,
+                validity=validity,
                 person=person,
-                org_unit=desired_eng_timeline.eng_unit.entity_at(start).value,
-                engagement_type=eng_types[
-                    desired_eng_timeline.eng_type.entity_at(start).value  # type: ignore
-                ],
-                job_function=job_function_uuid,
+                user_key=user_key,
+                start=start,
+                end=end,
+                desired_eng_timeline=desired_eng_timeline,
+                eng_types=eng_types,
+                job_function_uuid=job_function_uuid,
             )
             logger.info(
                 "Update engagement in validity interval",
@@ -368,24 +369,102 @@ async def update_engagement(
             person=person, user_key=user_key, from_date=None, to_date=None
         )
     )
-    payload = EngagementUpdateInput(
-        uuid=one(eng.objects).uuid,
+    payload = _get_update_payload(
+        eng_uuid=one(eng.objects).uuid,
+        validity=None,
+        person=person,
         user_key=user_key,
-        validity=mo_validity,
-        # TODO: introduce extention_1 strategy
-        extension_1=desired_eng_timeline.eng_name.entity_at(start).value,
+        start=start,
+        end=end,
+        desired_eng_timeline=desired_eng_timeline,
+        eng_types=eng_types,
+        job_function_uuid=job_function_uuid,
+    )
+    logger.info(
+        "Update engagement in interval",
+        payload=payload.dict(),
+        mo_validity=payload.validity,
+    )
+    await gql_client.update_engagement(payload)
+    logger.info("Engagement updated", person=str(person), emp_id=user_key)
+
+
+def _get_update_payload(
+    eng_uuid: UUID,
+    validity: GetEngagementTimelineEngagementsObjectsValidities | None,
+    person: UUID,
+    user_key: str,
+    start: datetime,
+    end: datetime,
+    desired_eng_timeline: EngagementTimeline,
+    eng_types: dict[EngType, UUID],
+    job_function_uuid: UUID,
+) -> EngagementUpdateInput:
+    """
+    Get the payload for updating the engagement in the interval [start, end).
+
+    Args:
+        eng_uuid: the MO engagement UUID
+        validity: the existing MO engagement validity overlapping the interval, if
+          any. If given, the update is truncated to this validity and the MO
+          specific values are kept.
+        person: the person UUID
+        user_key: the engagement user key
+        start: the start of the interval
+        end: the end of the interval
+        desired_eng_timeline: the desired engagement timeline
+        eng_types: map from engagement types to MO engagement type class UUIDs
+        job_function_uuid: the MO job function class UUID
+
+    Returns:
+        The engagement update payload
+    """
+    mo_validity = timeline_interval_to_mo_validity(start, end)
+
+    if validity is None:
+        return EngagementUpdateInput(
+            uuid=eng_uuid,
+            user_key=user_key,
+            validity=mo_validity,
+            # TODO: introduce extention_1 strategy
+            extension_1=desired_eng_timeline.eng_name.entity_at(start).value,
+            extension_4=desired_eng_timeline.eng_unit_id.entity_at(start).value,
+            extension_5=str(desired_eng_timeline.eng_sd_unit.entity_at(start).value),
+            person=person,
+            org_unit=desired_eng_timeline.eng_unit.entity_at(start).value,
+            engagement_type=eng_types[
+                desired_eng_timeline.eng_type.entity_at(start).value  # type: ignore
+            ],
+            job_function=job_function_uuid,
+        )
+
+    eng_name = desired_eng_timeline.eng_name.entity_at(start).value
+    return EngagementUpdateInput(
+        uuid=eng_uuid,
+        user_key=user_key,
+        primary=validity.primary_uuid,
+        validity=get_patch_validity(
+            validity.validity.from_, validity.validity.to, mo_validity
+        ),
+        # The empty string will be converted to null in the LoRa DB. Update
+        # logic when https://redmine.magenta.dk/issues/65028 has been fixed.
+        extension_1=eng_name if eng_name is not None else "",
+        extension_2=validity.extension_2,
+        extension_3=validity.extension_3,
         extension_4=desired_eng_timeline.eng_unit_id.entity_at(start).value,
         extension_5=str(desired_eng_timeline.eng_sd_unit.entity_at(start).value),
+        extension_6=validity.extension_6,
+        extension_7=validity.extension_7,
+        extension_8=validity.extension_8,
+        extension_9=validity.extension_9,
+        extension_10=validity.extension_10,
         person=person,
         org_unit=desired_eng_timeline.eng_unit.entity_at(start).value,
-        engagement_type=eng_types[desired_eng_timeline.eng_type.entity_at(start).value],  # type: ignore
+        engagement_type=eng_types[
+            desired_eng_timeline.eng_type.entity_at(start).value  # type: ignore
+        ],
         job_function=job_function_uuid,
     )
-    logger.info(
-        "Update engagement in interval", payload=payload.dict(), mo_validity=mo_validity
-    )
-    await gql_client.update_engagement(payload)
-    logger.info("Engagement updated", person=str(person), emp_id=user_key)
 
 
 async def terminate_engagement(
@@ -403,8 +482,6 @@ async def terminate_engagement(
         end=end,
     )
 
-    mo_validity = timeline_interval_to_mo_validity(start, end)
-
     eng = await gql_client.get_engagement_timeline(
         get_engagement_filter(
             person=person, user_key=user_key, from_date=None, to_date=None
@@ -422,17 +499,182 @@ async def terminate_engagement(
         )
         return
 
+    payload = _get_terminate_payload(eng_uuid, start, end)
+    logger.info("Terminate engagement payload", payload=payload.dict())
+
+    await gql_client.terminate_engagement(payload)
+    logger.info("Engagement terminated", person=str(person), user_key=user_key)
+
+
+def _get_terminate_payload(
+    eng_uuid: UUID, start: datetime, end: datetime
+) -> EngagementTerminateInput:
+    mo_validity = timeline_interval_to_mo_validity(start, end)
     if mo_validity.to is not None:
-        payload = EngagementTerminateInput(
+        return EngagementTerminateInput(
             uuid=eng_uuid, from_=mo_validity.from_, to=mo_validity.to
         )
-    else:
-        payload = EngagementTerminateInput(
-            uuid=eng_uuid,
-            # Converting from "from" to "to" due to the wierd way terminations in MO work
-            to=mo_validity.from_ - timedelta(days=1),
+    return EngagementTerminateInput(
+        uuid=eng_uuid,
+        # Converting from "from" to "to" due to the wierd way terminations in MO work
+        to=mo_validity.from_ - timedelta(days=1),
+    )
+
+
+class EngagementMutationBatch:
+    """
+    Collect the MO mutations needed to sync the intervals of an engagement and
+    send them to MO as aliased mutations in a single GraphQL request (per
+    `batch_size` mutations). GraphQL executes the mutations of a request
+    serially, so they are applied in the order they were added.
+
+    The MO engagement is only fetched once, and the existing MO validities
+    overlapping each interval are found locally, instead of fetching the
+    engagement timeline before each mutation.
+    """
+
+    def __init__(
+        self,
+        gql_client: GraphQLClient,
+        person: UUID,
+        user_key: str,
+        batch_size: int,
+    ) -> None:
+        self.gql_client = gql_client
+        self.person = person
+        self.user_key = user_key
+        self.batch_size = batch_size
+        self._mutations: list[
+            tuple[str, str, EngagementUpdateInput | EngagementTerminateInput]
+        ] = []
+        self._engagement: GetEngagementTimelineEngagementsObjects | None = None
+        self._fetched = False
+
+    async def _get_engagement(self) -> GetEngagementTimelineEngagementsObjects | None:
+        if not self._fetched:
+            eng = await self.gql_client.get_engagement_timeline(
+                get_engagement_filter(
+                    person=self.person,
+                    user_key=self.user_key,
+                    from_date=None,
+                    to_date=None,
+                )
+            )
+            self._engagement = only(eng.objects, too_long=MoreThanOneEngagementError)
+            self._fetched = True
+        return self._engagement
+
+    async def _add(
+        self,
+        field: str,
+        input_type: str,
+        payload: EngagementUpdateInput | EngagementTerminateInput,
+    ) -> None:
+        self._mutations.append((field, input_type, payload))
+        if len(self._mutations) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Send the collected mutations to MO."""
+        if not self._mutations:
+            return
+        mutations, self._mutations = self._mutations, []
+
+        variables = ", ".join(
+            f"$input{i}: {input_type}!"
+            for i, (_, input_type, _) in enumerate(mutations)
         )
-    logger.info("Terminate engagement payload", payload=payload.dict())
+        fields = "\n".join(
+            f"m{i}: {field}(input: $input{i}) {{ uuid }}"
+            for i, (field, _, _) in enumerate(mutations)
+        )
+        query = f"mutation BatchEngagementMutations({variables}) {{\n{fields}\n}}"
 
-    await gql_client.terminate_engagement(payload)
-    logger.info("Engagement terminated", person=str(person), user_key=user_key)
+        logger.info(
+            "Sending batched engagement mutations",
+            person=str(self.person),
+            user_key=self.user_key,
+            mutations=len(mutations),
+        )
+        response = await self.gql_client.execute(
+            query=query,
+            variables={
+                f"input{i}": payload for i, (_, _, payload) in enumerate(mutations)
+            },
+        )
+        self.gql_client.get_data(response)
+
+    async def create_or_update(
+        self,
+        start: datetime,
+        end: datetime,
+        desired_eng_timeline: EngagementTimeline,
+        eng_types: dict[EngType, UUID],
+    ) -> None:
+        """
+        Batched counterpart of `create_engagement` and `update_engagement`.
+        Creations are sent immediately (after the already collected mutations),
+        since the UUID of the new engagement is needed for the later updates.
+        """
+        job_function_uuid = await get_job_function(
+            gql_client=self.gql_client,
+            job_function_user_key=str(
+                desired_eng_timeline.eng_key.entity_at(start).value
+            ),
+        )
+
+        engagement = await self._get_engagement()
+        if engagement is None:
+            await self.flush()
+            await create_engagement(
+                gql_client=self.gql_client,
+                person=self.person,
+                user_key=self.user_key,
+                start=start,
+                end=end,
+                desired_eng_timeline=desired_eng_timeline,
+                eng_types=eng_types,
+            )
+            # Re-fetch the engagement to get its UUID and validity
+            self._fetched = False
+            return
+
+        overlapping_validities: list[
+            GetEngagementTimelineEngagementsObjectsValidities | None
+        ] = [
+            validity
+            for validity in engagement.validities
+            if validity.validity.from_ < end
+            and mo_end_to_timeline_end(validity.validity.to) > start
+        ]
+        for validity in overlapping_validities or [None]:
+            payload = _get_update_payload(
+                eng_uuid=engagement.uuid,
+                validity=validity,
+                person=self.person,
+                user_key=self.user_key,
+                start=start,
+                end=end,
+                desired_eng_timeline=desired_eng_timeline,
+                eng_types=eng_types,
+                job_function_uuid=job_function_uuid,
+            )
+            logger.info("Update engagement payload", payload=payload.dict())
+            await self._add("engagement_update", "EngagementUpdateInput", payload)
+
+    async def terminate(self, start: datetime, end: datetime) -> None:
+        """Batched counterpart of `terminate_engagement`."""
+        engagement = await self._get_engagement()
+        if engagement is None:
+            # This can happen if the SD engagement active timeline only contains
+            # status 8 intervals
+            logger.warning(
+                "Cannot terminate engagement since it is not found in MO",
+                person=str(self.person),
+                user_key=self.user_key,
+            )
+            return
+
+        payload = _get_terminate_payload(engagement.uuid, start, end)
+        logger.info("Terminate engagement payload", payload=payload.dict())
+        await self._add("engagement_terminate", "EngagementTerminateInput", payload)
@@ -9,6 +9,7 @@ import structlog
 from more_itertools import one
 from more_itertools import only
 
+from sdtoolplus.autogenerated_graphql_client import ClassFilter
 from sdtoolplus.autogenerated_graphql_client import EmployeeFilter
 from sdtoolplus.autogenerated_graphql_client import GraphQLClientGraphQLMultiError
 from sdtoolplus.autogenerated_graphql_client import LeaveCreateInput
@@ -19,6 +20,7 @@ from sdtoolplus.depends import GraphQLClient
 from sdtoolplus.exceptions import MoreThanOneLeaveError
 from sdtoolplus.exceptions import NoValueError
 from sdtoolplus.mo.timelines.common import get_patch_validity
+from sdtoolplus.mo.timelines.common import mo_class_cache
 from sdtoolplus.mo.timelines.common import mo_end_to_timeline_end
 from sdtoolplus.mo.timelines.common import timeline_interval_to_mo_validity
 from sdtoolplus.models import Active
@@ -29,6 +31,21 @@ from sdtoolplus.models import combine_intervals
 logger = structlog.stdlib.get_logger()
 
 
+@mo_class_cache
+async def get_leave_type(gql_client: GraphQLClient) -> UUID:
+    """
+    Get the leave type class UUID (assuming for now that there is only one)
+    """
+    r_leave_type = await gql_client.get_class(ClassFilter(user_keys=["Orlov"]))
+    try:
+        return one(r_leave_type.objects).uuid
+    except ValueError as error:
+        logger.error(
+            "Not exactly on class found in MO", class_user_key="Orlov", error=error
+        )
+        raise error
+
+
 async def get_leave_timeline(
     gql_client: GraphQLClient,
     person: UUID,
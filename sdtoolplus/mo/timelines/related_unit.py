@@ -4,12 +4,14 @@ from datetime import datetime
 from itertools import pairwise
 from typing import Sequence
 
+from async_lru import alru_cache
 from more_itertools import collapse
 from more_itertools import first
 
 from sdtoolplus.autogenerated_graphql_client import GetRelatedUnitsRelatedUnitsObjects
 from sdtoolplus.autogenerated_graphql_client import OrganisationUnitFilter
 from sdtoolplus.autogenerated_graphql_client import RelatedUnitFilter
+from sdtoolplus.config import MO_RELATED_UNIT_CACHE_TTL
 from sdtoolplus.depends import GraphQLClient
 from sdtoolplus.exceptions import NoValueError
 from sdtoolplus.mo.timelines.common import datetime_to_mo_end
@@ -20,6 +22,7 @@ from sdtoolplus.models import EngagementUnit
 from sdtoolplus.models import HasValidities
 from sdtoolplus.models import Timeline
 from sdtoolplus.models import UnitParent
+from sdtoolplus.models import UnitTimeline
 
 
 def _get_mo_objects_endpoints(
@@ -78,15 +81,19 @@ async def _resolve_via_parents(
     start: datetime,
     end: datetime,
     unknown_unit_uuid: OrgUnitUUID,
+    cache: bool,
 ) -> list[EngagementUnit]:
     """
     Returns related units by walking up the org tree, accounting for the infinitely
     expanding universe of temporal parents.
     """
-    ou_timeline = await get_ou_timeline(
-        gql_client,
-        OrganisationUnitFilter(uuids=[unit_uuid], from_date=start, to_date=end),
-    )
+    if cache:
+        ou_timeline = await _get_cached_ou_timeline(gql_client, unit_uuid)
+    else:
+        ou_timeline = await get_ou_timeline(
+            gql_client,
+            OrganisationUnitFilter(uuids=[unit_uuid], from_date=start, to_date=end),
+        )
 
     if ou_timeline.parent == Timeline[UnitParent]():
         # We have no parents => use unknown.
@@ -123,6 +130,7 @@ async def _resolve_via_parents(
                 end_,
                 unknown_unit_uuid,
                 recursive_lookup=True,
+                cache=cache,
             )
         )
     return result
@@ -136,6 +144,7 @@ async def _resolve_interval(
     objects: list[GetRelatedUnitsRelatedUnitsObjects],
     unknown_unit_uuid: OrgUnitUUID,
     recursive_lookup: bool,
+    cache: bool,
 ) -> list[EngagementUnit]:
     """
     Resolve a single (start, end) chunk: prefer a direct related unit, otherwise
@@ -158,6 +167,7 @@ async def _resolve_interval(
         start=start,
         end=end,
         unknown_unit_uuid=unknown_unit_uuid,
+        cache=cache,
     )
 
 
@@ -168,26 +178,88 @@ async def related_units(
     end: datetime,
     unknown_unit_uuid: OrgUnitUUID,
     recursive_lookup: bool,
+    cache: bool = False,
 ) -> list[EngagementUnit]:
     """
     Returns the related units in the given interval (or the "Unknown" unit if no related
     unit can be found). Note that the input interval may be divided into smaller
     intervals.
+
+    If `cache` is set, the related units and the parent timeline of each unit
+    visited are fetched once over the full span and cached per unit for
+    MO_RELATED_UNIT_CACHE_TTL seconds, and then clipped to the interval in
+    memory. This way the engagements in the same unit (or in units with the
+    same parents) share the MO lookups regardless of their intervals. The cache
+    is invalidated on MO related unit and org unit events (see
+    `clear_related_unit_cache`).
     """
+    return await _related_units(
+        gql_client,
+        unit_uuid,
+        start,
+        end,
+        unknown_unit_uuid,
+        recursive_lookup,
+        cache=cache,
+    )
+
+
+@alru_cache(maxsize=4096, ttl=MO_RELATED_UNIT_CACHE_TTL)
+async def _get_cached_related_unit_objects(
+    gql_client: GraphQLClient,
+    unit_uuid: OrgUnitUUID,
+) -> list[GetRelatedUnitsRelatedUnitsObjects]:
     mo_rel_units = await gql_client.get_related_units(
         RelatedUnitFilter(
-            from_date=start,
-            # This to_date is counterintuitive for this OU relation look up,
-            # since the to_date is the day *after* the relation potentially
-            # ends, but MO requires these dates. Especially since we are not
-            # allowed to ask for an OU relation where from_date=to_date, which
-            # is the case for a unit_interval lasting only for a single day.
-            to_date=datetime_to_mo_end(end),
+            from_date=None,
+            to_date=None,
             org_unit=OrganisationUnitFilter(uuids=[unit_uuid]),
         )
     )
+    return mo_rel_units.objects
+
+
+@alru_cache(maxsize=4096, ttl=MO_RELATED_UNIT_CACHE_TTL)
+async def _get_cached_ou_timeline(
+    gql_client: GraphQLClient,
+    unit_uuid: OrgUnitUUID,
+) -> UnitTimeline:
+    return await get_ou_timeline(
+        gql_client,
+        OrganisationUnitFilter(uuids=[unit_uuid], from_date=None, to_date=None),
+    )
+
+
+def clear_related_unit_cache() -> None:
+    _get_cached_related_unit_objects.cache_clear()
+    _get_cached_ou_timeline.cache_clear()
 
-    objects = mo_rel_units.objects
+
+async def _related_units(
+    gql_client: GraphQLClient,
+    unit_uuid: OrgUnitUUID,
+    start: datetime,
+    end: datetime,
+    unknown_unit_uuid: OrgUnitUUID,
+    recursive_lookup: bool,
+    cache: bool,
+) -> list[EngagementUnit]:
+    if cache:
+        objects = await _get_cached_related_unit_objects(gql_client, unit_uuid)
+    else:
+        mo_rel_units = await gql_client.get_related_units(
+            RelatedUnitFilter(
+                from_date=start,
+                # This to_date is counterintuitive for this OU relation look up,
+                # since the to_date is the day *after* the relation potentially
+                # ends, but MO requires these dates. Especially since we are not
+                # allowed to ask for an OU relation where from_date=to_date, which
+                # is the case for a unit_interval lasting only for a single day.
+                to_date=datetime_to_mo_end(end),
+                org_unit=OrganisationUnitFilter(uuids=[unit_uuid]),
+            )
+        )
+        objects = mo_rel_units.objects
     endpoints = _get_mo_objects_endpoints(objects=objects, start=start, end=end)
 
     result: list[EngagementUnit] = []
@@ -201,6 +273,7 @@ async def related_units(
                 objects=objects,
                 unknown_unit_uuid=unknown_unit_uuid,
                 recursive_lookup=recursive_lookup,
+                cache=cache,
             )
         )
     return result
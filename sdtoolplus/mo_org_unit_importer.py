@@ -1,6 +1,10 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+from collections import defaultdict
+from collections import deque
 from functools import cache
+from typing import Iterable
+from typing import Iterator
 from typing import NewType
 from typing import Self
 from typing import TypeAlias
@@ -24,6 +28,8 @@ OrgUnitHierarchyUUID = NewType("OrgUnitHierarchyUUID", UUID)
 
 logger = structlog.stdlib.get_logger()
 
+ORG_UNITS_PAGE_SIZE = 500
+
 
 class AddressType(pydantic.BaseModel):
     uuid: AddressTypeUUID | None = None
@@ -141,8 +147,9 @@ class OrgUnitNode(anytree.AnyNode):
 
 
 class MOOrgTreeImport:
-    def __init__(self, session):
+    def __init__(self, session, page_size: int = ORG_UNITS_PAGE_SIZE):
         self.session = session
+        self.page_size = page_size
 
     @cache
     def get_org_uuid(self) -> OrgUUID:
@@ -159,51 +166,79 @@ class MOOrgTreeImport:
         )
         return parse_obj_as(OrgUUID, doc["org"]["uuid"])
 
-    @cache
-    def get_org_units(self, org_unit: OrgUnitUUID | None = None) -> list[OrgUnit]:
-        # TODO: fix this and use the auto-generated GraphQL client instead
-        logger.info("Getting OUs from MO...")
+    def iter_org_units(self, org_unit: OrgUnitUUID | None = None) -> Iterator[OrgUnit]:
+        """
+        Get the OUs from MO page by page (using cursor pagination), such that
+        the caller can process the units while they are being fetched, without
+        keeping all the raw responses in memory.
 
-        filter_str = (
-            "" if org_unit is None else f'(filter: {{uuids: ["{str(org_unit)}"]}})'
-        )
-        doc = self.session.execute(
-            gql(
-                f"""
-                query GetOrgUnits {{
-                    org_units{filter_str} {{
-                        objects {{
-                            current {{
+        Args:
+            org_unit: if provided, only this unit is fetched
+
+        Yields:
+            The OUs currently valid in MO
+        """
+        # TODO: fix this and use the auto-generated GraphQL client instead
+        logger.info("Getting OUs from MO...", page_size=self.page_size)
+
+        query = gql(
+            """
+            query GetOrgUnits($uuids: [UUID!], $limit: int, $cursor: Cursor) {
+                org_units(filter: {uuids: $uuids}, limit: $limit, cursor: $cursor) {
+                    objects {
+                        current {
+                            uuid
+                            parent_uuid
+                            user_key
+                            name
+                            org_unit_level_uuid
+                            org_unit_hierarchy
+                            addresses {
                                 uuid
-                                parent_uuid
-                                user_key
-                                name
-                                org_unit_level_uuid
-                                org_unit_hierarchy
-                                addresses {{
+                                value
+                                address_type {
+                                    user_key
                                     uuid
-                                    value
-                                    address_type {{
-                                        user_key
-                                        uuid
-                                    }}
-                                }}
-                            }}
-                        }}
-                    }}
-                }}
-                """
-            )
+                                }
+                            }
+                        }
+                    }
+                    page_info {
+                        next_cursor
+                    }
+                }
+            }
+            """
         )
-        org_units: list[dict] = [
-            n["current"]
-            for n in doc["org_units"]["objects"]
-            if n["current"] is not None
-        ]
 
-        logger.info("Got OUs from MO")
+        next_cursor = None
+        org_units_fetched = 0
+        while True:
+            doc = self.session.execute(
+                query,
+                variable_values={
+                    "uuids": None if org_unit is None else [str(org_unit)],
+                    "limit": self.page_size,
+                    "cursor": next_cursor,
+                },
+            )
+            page = [
+                n["current"]
+                for n in doc["org_units"]["objects"]
+                if n["current"] is not None
+            ]
+            org_units_fetched += len(page)
+            logger.debug("Got page of OUs from MO", total=org_units_fetched)
+            yield from parse_obj_as(list[OrgUnit], page)
+
+            next_cursor = doc["org_units"]["page_info"]["next_cursor"]
+            if next_cursor is None:
+                break
 
-        return parse_obj_as(list[OrgUnit], org_units)
+        logger.info("Got OUs from MO", total=org_units_fetched)
+
+    def get_org_units(self, org_unit: OrgUnitUUID | None = None) -> list[OrgUnit]:
+        return list(self.iter_org_units(org_unit))
 
     def as_single_tree(
         self,
@@ -237,7 +272,7 @@ class MOOrgTreeImport:
         logger.info("Build MO tree")
 
         if children is None:
-            children = self._build_trees(self.get_org_units())
+            children = self.build_trees(self.iter_org_units())
         root = OrgUnitNode(
             uuid=root_uuid,
             parent_uuid=None,
@@ -263,43 +298,32 @@ class MOOrgTreeImport:
 
         return root, children
 
-    def _build_trees(self, org_units: list[OrgUnit]) -> list[OrgUnitNode]:
-        # Convert list of `OrgUnit` objects to list of `OrgUnitNode` objects
+    def build_trees(self, org_units: Iterable[OrgUnit]) -> list[OrgUnitNode]:
+        # Convert the `OrgUnit` objects to `OrgUnitNode` objects (while they are
+        # streamed from MO, if `org_units` is an iterator)
         nodes = [OrgUnitNode.from_org_unit(org_unit) for org_unit in org_units]
 
-        # Mutate the list of `OrgUnitNodes` in order to reconstruct the tree structure
-        # given by the `uuid` and `parent_uuid` attributes.
-        #
-        # Based on: https://stackoverflow.com/a/72497630
+        # Reconstruct the tree structure given by the `uuid` and `parent_uuid`
+        # attributes from an index of the children of each parent, which is
+        # built in a single pass over the nodes.
+        children_by_parent: dict[OrgUnitUUID | None, list[OrgUnitNode]] = defaultdict(
+            list
+        )
+        for node in nodes:
+            children_by_parent[node.parent_uuid].append(node)
 
         root_org_uuid = self.get_org_uuid()
-
-        # Root nodes and their indexes
-        root_nodes = [node for node in nodes if node.parent_uuid == root_org_uuid]
-        root_idxs = [nodes.index(node) for node in root_nodes]
-
-        # Child nodes
-        parent_id_vals = {
-            node.parent_uuid for node in nodes if node.parent_uuid != root_org_uuid
-        }
-
-        while root_nodes:
-            focus_node = root_nodes[0]
-            if focus_node.uuid in parent_id_vals:
-                focus_node.children = []
-
-            focus_node_children = list(
-                filter(
-                    lambda node: node.parent_uuid == focus_node.uuid,
-                    nodes,
-                )
-            )
+        root_nodes = children_by_parent.get(root_org_uuid, [])
+
+        # Link the nodes breadth-first from the roots. Nodes whose parent is not
+        # reachable from the roots are left out of the trees.
+        queue = deque(root_nodes)
+        while queue:
+            focus_node = queue.popleft()
+            focus_node_children = children_by_parent.get(focus_node.uuid, [])
             focus_node.children = focus_node_children
-            for node in focus_node_children:
-                root_nodes.append(node)
-
-            root_nodes.remove(focus_node)
+            queue.extend(focus_node_children)
 
         # Return roots containing child nodes, each child node containing its child
         # nodes, and so on.
-        return [nodes[idx] for idx in root_idxs]
+        return list(root_nodes)
@@ -1,11 +1,13 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+from bisect import bisect_right
 from datetime import datetime
 from enum import Enum
 from itertools import chain
 from itertools import pairwise
 from typing import Any
 from typing import Generic
+from typing import Iterator
 from typing import Optional
 from typing import Protocol
 from typing import Self
@@ -19,10 +21,8 @@ from zoneinfo import ZoneInfo
 import structlog.stdlib
 from more_itertools import collapse
 from more_itertools import first
-from more_itertools import last
-from more_itertools import only
-from more_itertools import split_when
 from pydantic import BaseModel
+from pydantic import PrivateAttr
 from pydantic import root_validator
 from pydantic import validator
 from pydantic.generics import GenericModel
@@ -286,6 +286,72 @@ class ManagerResponsibility(Interval[Optional[list[UUID]]]):
     pass
 
 
+class IntervalSpan:
+    """
+    Compact, unvalidated representation of an interval used internally in the
+    timeline computations, where the pydantic interval models are too costly to
+    create and copy. The spans are turned into interval models with
+    `from_spans` when the computation is done.
+    """
+
+    __slots__ = ("start", "end", "value")
+
+    def __init__(self, start: datetime, end: datetime, value: Any) -> None:
+        self.start = start
+        self.end = end
+        self.value = value
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, IntervalSpan):
+            return NotImplemented
+        return (self.start, self.end, self.value) == (
+            other.start,
+            other.end,
+            other.value,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}("
+            f"start={self.start.strftime(DATETIME_FORMAT)}, "
+            f"end={self.end.strftime(DATETIME_FORMAT)}, "
+            f"value={str(self.value)})"
+        )
+
+
+def to_spans(intervals: Sequence[Interval]) -> list[IntervalSpan]:
+    return [IntervalSpan(i.start, i.end, i.value) for i in intervals]
+
+
+def from_spans(interval_type: type[T], spans: Sequence[IntervalSpan]) -> tuple[T, ...]:
+    """
+    Materialise spans as interval models. The spans are assumed to originate
+    from already validated intervals, so the validation is skipped.
+    """
+    return tuple(
+        interval_type.construct(start=span.start, end=span.end, value=span.value)
+        for span in spans
+    )
+
+
+def combine_spans(spans: Sequence[IntervalSpan]) -> list[IntervalSpan]:
+    """
+    Combine adjacent spans with same values (see `combine_intervals`).
+    """
+    combined: list[IntervalSpan] = []
+    for span in spans:
+        previous = combined[-1] if combined else None
+        if (
+            previous is not None
+            and previous.end >= span.start
+            and previous.value == span.value
+        ):
+            combined[-1] = IntervalSpan(previous.start, span.end, span.value)
+        else:
+            combined.append(span)
+    return combined
+
+
 def combine_intervals(intervals: tuple[T, ...]) -> tuple[T, ...]:
     """
     Combine adjacent interval entities with same values.
@@ -300,17 +366,20 @@ def combine_intervals(intervals: tuple[T, ...]) -> tuple[T, ...]:
     Returns:
         Tuple of combined interval entities.
     """
-    interval_groups = split_when(
-        intervals, lambda i1, i2: i1.end < i2.start or i1.value != i2.value
-    )
-    return tuple(
-        first(group).copy(update={"end": last(group).end}) for group in interval_groups
-    )
+    if not intervals:
+        return tuple()
+    return from_spans(type(first(intervals)), combine_spans(to_spans(intervals)))
 
 
 class Timeline(GenericModel, Generic[T], frozen=True):
     intervals: tuple[T, ...] = tuple()
 
+    # Sorted interval start times used for bisect lookups in entity_at. Since
+    # the timeline is frozen, the index is built once on first lookup. The
+    # intervals it was built from are stored alongside it, as pydantic copies
+    # private attributes in `.copy(update={"intervals": ...})`.
+    _starts: tuple[tuple[T, ...], list[datetime]] | None = PrivateAttr(default=None)
+
     @validator("intervals")
     def entities_must_be_same_type(cls, v):
         if len(v) == 0:
@@ -349,12 +418,16 @@ class Timeline(GenericModel, Generic[T], frozen=True):
         return v
 
     def entity_at(self, timestamp: datetime) -> T:
-        entity = only(e for e in self.intervals if e.start <= timestamp < e.end)
-        if entity is None:
-            raise NoValueError(
-                f"No value found at {timestamp.strftime(DATETIME_FORMAT)}"
-            )
-        return entity
+        if self._starts is None or self._starts[0] is not self.intervals:
+            self._starts = (self.intervals, [i.start for i in self.intervals])
+        # The intervals are sorted and non-overlapping, so the only candidate is
+        # the last interval starting at or before the timestamp
+        index = bisect_right(self._starts[1], timestamp) - 1
+        if index >= 0:
+            entity = self.intervals[index]
+            if timestamp < entity.end:
+                return entity
+        raise NoValueError(f"No value found at {timestamp.strftime(DATETIME_FORMAT)}")
 
     def get_interval_endpoints(self) -> set[datetime]:
         return set(collapse((i.start, i.end) for i in self.intervals))
@@ -369,6 +442,41 @@ class Timeline(GenericModel, Generic[T], frozen=True):
         return not all(i1.end == i2.start for i1, i2 in pairwise(self.intervals))
 
 
+class TimelineSegment(BaseModel, frozen=True):
+    """
+    A segment [start, end) in which the field values of two timelines differ.
+
+    The values are given as dicts from the timeline field names to the field
+    values in the segment. Fields without a value in the segment are left out.
+    """
+
+    start: datetime
+    end: datetime
+    values: dict[str, Any]
+    other_values: dict[str, Any]
+
+
+def _sweep_values(
+    timelines: dict[str, Timeline], endpoints: list[datetime]
+) -> Iterator[dict[str, Any]]:
+    """
+    Yield the field values of the timelines in each of the segments between the
+    (sorted) endpoints. Each field timeline is only walked once.
+    """
+    cursors = {name: 0 for name in timelines}
+    for start in endpoints[:-1]:
+        values = {}
+        for name, timeline in timelines.items():
+            intervals = timeline.intervals
+            i = cursors[name]
+            while i < len(intervals) and intervals[i].end <= start:
+                i += 1
+            cursors[name] = i
+            if i < len(intervals) and intervals[i].start <= start:
+                values[name] = intervals[i].value
+        yield values
+
+
 class BaseTimeline(BaseModel, frozen=True):
     def has_required_mo_values(self, timestamp: datetime) -> bool:
         """
@@ -402,6 +510,32 @@ class BaseTimeline(BaseModel, frozen=True):
         ]
         return set(collapse((i.start, i.end) for i in chain(*intervals)))
 
+    def diff(self, other: Self) -> Iterator[TimelineSegment]:
+        """
+        Compare this timeline with another timeline of the same type in a single
+        sweep over the union of the interval endpoints of both timelines.
+
+        Args:
+            other: the timeline to compare with
+
+        Yields:
+            The segments, in chronological order, where the field values of the
+            two timelines differ.
+        """
+        endpoints = sorted(
+            self.get_interval_endpoints().union(other.get_interval_endpoints())
+        )
+        for start, end, values, other_values in zip(
+            endpoints,
+            endpoints[1:],
+            _sweep_values(dict(iter(self)), endpoints),
+            _sweep_values(dict(iter(other)), endpoints),
+        ):
+            if values != other_values:
+                yield TimelineSegment(
+                    start=start, end=end, values=values, other_values=other_values
+                )
+
 
 class UnitTimeline(BaseTimeline):
     active: Timeline[Active] = Timeline[Active]()
@@ -0,0 +1,161 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from types import TracebackType
+
+import httpx
+import structlog
+from sqlalchemy import Engine
+
+from .db.rundb import delete_apply_ny_logic_failure
+from .db.rundb import persist_apply_ny_logic_failure
+from .mo_org_unit_importer import OrgUnitUUID
+
+logger = structlog.stdlib.get_logger()
+
+
+class ApplyNYLogicDispatcher:
+    """
+    Call the apply-NY-logic endpoint of the SD integration in the background.
+
+    Units are submitted to a queue, which is processed by `concurrency`
+    workers, such that the caller (e.g. the TreeDiffExecutor loop) is not
+    blocked while the NY logic is applied. Failed calls are retried with
+    exponential backoff and the units for which all attempts fail are recorded
+    in the database (if an engine is given), such that the calls can be
+    replayed later (see `App.retry_apply_ny_logic_failures`).
+
+    The dispatcher must be used as an async context manager. On exit, it waits
+    until all submitted units have been processed. If the body raises, the
+    units which have not been processed (including the units for which a call
+    is in flight) are recorded as failed instead, since the caller may already
+    consider them done (e.g. in the run checkpoint).
+
+    Args:
+        client: the HTTPX client for the SD integration
+        institution_identifier: the SD institution identifier
+        engine: the database engine used for recording the failed calls
+        concurrency: the number of calls to make concurrently
+        retries: the number of times to retry a failed call
+        retry_backoff: the delay (in seconds) before the first retry. The delay
+          is doubled for each subsequent retry.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        institution_identifier: str,
+        engine: Engine | None,
+        concurrency: int,
+        retries: int,
+        retry_backoff: float,
+    ) -> None:
+        self.client = client
+        self.institution_identifier = institution_identifier
+        self.engine = engine
+        self.concurrency = concurrency
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+        self.failed: list[OrgUnitUUID] = []
+        self._queue: asyncio.Queue[OrgUnitUUID] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        # The units currently processed by the workers
+        self._in_flight: set[OrgUnitUUID] = set()
+
+    async def __aenter__(self) -> "ApplyNYLogicDispatcher":
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        try:
+            if exc_type is None:
+                await self._queue.join()
+        finally:
+            unprocessed = list(self._in_flight)
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            while not self._queue.empty():
+                unprocessed.append(self._queue.get_nowait())
+            for org_unit_uuid in unprocessed:
+                await self._record_failure(
+                    org_unit_uuid, "Aborted before the NY logic was applied"
+                )
+
+        if self.failed:
+            logger.error(
+                "Apply-NY-logic calls failed!!",
+                org_units=[str(org_unit_uuid) for org_unit_uuid in self.failed],
+            )
+
+    def submit(self, org_unit_uuid: OrgUnitUUID) -> None:
+        self._queue.put_nowait(org_unit_uuid)
+
+    async def _worker(self) -> None:
+        while True:
+            org_unit_uuid = await self._queue.get()
+            self._in_flight.add(org_unit_uuid)
+            try:
+                await self._apply(org_unit_uuid)
+            except Exception:
+                logger.exception(
+                    "Could not apply NY logic", org_unit_uuid=str(org_unit_uuid)
+                )
+            finally:
+                self._in_flight.discard(org_unit_uuid)
+                self._queue.task_done()
+
+    async def _apply(self, org_unit_uuid: OrgUnitUUID) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                await self._call_apply_ny_logic(org_unit_uuid)
+            except httpx.HTTPError as error:
+                if attempt == self.retries:
+                    await self._record_failure(org_unit_uuid, str(error))
+                    return
+                delay = self.retry_backoff * 2**attempt
+                logger.warning(
+                    "Apply-NY-logic call failed. Retrying",
+                    org_unit_uuid=str(org_unit_uuid),
+                    attempt=attempt + 1,
+                    delay=delay,
+                    error=str(error),
+                )
+                await asyncio.sleep(delay)
+            else:
+                if self.engine is not None:
+                    await delete_apply_ny_logic_failure(
+                        self.engine, self.institution_identifier, org_unit_uuid
+                    )
+                return
+
+    async def _call_apply_ny_logic(self, org_unit_uuid: OrgUnitUUID) -> None:
+        logger.info("Apply NY logic", org_unit_uuid=str(org_unit_uuid))
+
+        url: str = f"/trigger/apply-ny-logic/{org_unit_uuid}"
+        response: httpx.Response = await self.client.post(
+            url, params={"institution_identifier": self.institution_identifier}
+        )
+        response.raise_for_status()
+
+        logger.info("NY logic applied successfully", org_unit_uuid=str(org_unit_uuid))
+
+    async def _record_failure(self, org_unit_uuid: OrgUnitUUID, error: str) -> None:
+        logger.error(
+            "Apply-NY-logic call failed!!",
+            org_unit_uuid=str(org_unit_uuid),
+            error=error,
+        )
+        self.failed.append(org_unit_uuid)
+        if self.engine is not None:
+            await persist_apply_ny_logic_failure(
+                self.engine, self.institution_identifier, org_unit_uuid, error
+            )
@@ -1,13 +1,11 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-import asyncio
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 
 import structlog.stdlib
 from fastramqpi.context import Context
 from more_itertools import last
-from sdclient.client import SDClient
 from sdclient.requests import GetInstitutionRequest
 from sdclient.responses import GetInstitutionResponse
 
@@ -26,6 +24,7 @@ from sdtoolplus.models import UnitLevel
 from sdtoolplus.models import UnitName
 from sdtoolplus.models import UnitParent
 from sdtoolplus.models import UnitTimeline
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sync.org_unit import sync_ou_intervals
 
 logger = structlog.stdlib.get_logger()
@@ -33,7 +32,7 @@ logger = structlog.stdlib.get_logger()
 
 @asynccontextmanager
 async def ensure_sd_institution_units_and_unknown_unit(
-    settings: SDToolPlusSettings, sd_client: SDClient, context: Context
+    settings: SDToolPlusSettings, sd_client: AsyncSDClient, context: Context
 ) -> AsyncIterator[None]:
     logger.info("Ensuring SD institution units and unknown unit...")
 
@@ -52,8 +51,7 @@ async def ensure_sd_institution_units_and_unknown_unit(
 
         *path, mo_unit_uuid = subtree_path
 
-        institution: GetInstitutionResponse = await asyncio.to_thread(
-            sd_client.get_institution,
+        institution: GetInstitutionResponse = await sd_client.get_institution(
             GetInstitutionRequest(
                 RegionIdentifier=settings.sd_region_identifier,
                 InstitutionIdentifier=institution_identifier,
@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Hashable
+from typing import TypeVar
+
+import structlog
+
+logger = structlog.stdlib.get_logger()
+
+T = TypeVar("T")
+
+
+class SDResponseCache:
+    """
+    In-process TTL/LRU cache for SD responses.
+
+    Concurrent lookups of the same key are coalesced into a single SD call
+    ("single-flight"), i.e. if many events for units in the same department
+    arrive at the same time, only one of them calls SD and the others wait for
+    its response. Failed calls are not cached.
+
+    Args:
+        ttl: number of seconds a response is cached. 0 disables the cache.
+        maxsize: the maximum number of cached responses. The least recently
+          used responses are evicted first.
+    """
+
+    def __init__(self, ttl: float, maxsize: int) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[float, asyncio.Future]] = (
+            OrderedDict()
+        )
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> T:
+        if self.ttl <= 0:
+            return await fetch()
+
+        now = monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(key)
+            logger.debug("SD cache hit", key=key)
+            return await asyncio.shield(entry[1])
+
+        future: asyncio.Future = asyncio.ensure_future(fetch())
+        entry = (now + self.ttl, future)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            raise
+
+    def invalidate(self, predicate: Callable[[Any], bool]) -> None:
+        """Remove all cached responses whose key satisfies the predicate."""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def cached_values(self) -> list[Any]:
+        """The cached responses (excluding the pending and failed lookups)."""
+        return [
+            future.result()
+            for _, future in self._entries.values()
+            if future.done() and not future.cancelled() and future.exception() is None
+        ]
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,429 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+from datetime import date
+from types import TracebackType
+from typing import Any
+from uuid import UUID
+
+import httpx
+import structlog
+import xmltodict
+from httpx import HTTPError
+from httpx import StreamError
+from more_itertools import one
+from pydantic import ValidationError
+from pydantic import parse_obj_as
+from sdclient.client import REGEX_DEPARTMENT_NOT_FOUND
+from sdclient.client import REGEX_OBJECT_NOT_FOUND
+from sdclient.exceptions import SDCallError
+from sdclient.exceptions import SDDepartmentNotFound
+from sdclient.exceptions import SDEmploymentNotFound
+from sdclient.exceptions import SDParentNotFound
+from sdclient.exceptions import SDParseResponseError
+from sdclient.exceptions import SDPersonNotFound
+from sdclient.exceptions import SDRootElementNotFound
+from sdclient.requests import GetDepartmentParentRequest
+from sdclient.requests import GetDepartmentRequest
+from sdclient.requests import GetEmploymentChangedAtDateRequest
+from sdclient.requests import GetEmploymentChangedRequest
+from sdclient.requests import GetEmploymentRequest
+from sdclient.requests import GetInstitutionRequest
+from sdclient.requests import GetOrganizationRequest
+from sdclient.requests import GetPersonChangedAtDateRequest
+from sdclient.requests import GetPersonRequest
+from sdclient.requests import GetProfessionRequest
+from sdclient.requests import SDRequest
+from sdclient.responses import DepartmentParentHistoryObj
+from sdclient.responses import DepartmentReference
+from sdclient.responses import GetDepartmentParentResponse
+from sdclient.responses import GetDepartmentResponse
+from sdclient.responses import GetEmploymentChangedAtDateResponse
+from sdclient.responses import GetEmploymentChangedResponse
+from sdclient.responses import GetEmploymentResponse
+from sdclient.responses import GetInstitutionResponse
+from sdclient.responses import GetOrganizationResponse
+from sdclient.responses import GetPersonChangedAtDateResponse
+from sdclient.responses import GetPersonResponse
+from sdclient.responses import GetProfessionResponse
+
+from sdtoolplus.config import SDToolPlusSettings
+from sdtoolplus.sd.cache import SDResponseCache
+from sdtoolplus.sd.ratelimit import SDRateLimiter
+
+SD_BASE_URL = "https://service.sd.dk"
+
+EMPLOYMENT_FORCE_LIST = (
+    "Person",
+    "Employment",
+    "EmploymentStatus",
+    "EmploymentDepartment",
+    "Profession",
+    "WorkingTime",
+)
+PERSON_FORCE_LIST = (
+    "Person",
+    "Employment",
+    "TelephoneNumberIdentifier",
+    "EmailAddressIdentifier",
+)
+
+logger = structlog.stdlib.get_logger()
+
+
+class AsyncSDClient:
+    """
+    Asynchronous counterpart of `sdclient.client.SDClient`. It has the same methods
+    (returning the same response models and raising the same exceptions), but all
+    SD calls share a single keep-alive connection pool instead of opening a new
+    connection (and TLS handshake) per call in a worker thread. The number of
+    concurrent SD calls is bounded by the size of the connection pool.
+
+    Department and department parent history lookups are cached for
+    `cache_ttl` seconds (see `SDResponseCache`), since the same departments are
+    looked up over and over when processing the units and engagements below
+    them.
+
+    The rate of the SD calls can be limited to `max_requests_per_second` (see
+    `SDRateLimiter`).
+
+    If `parent_map_ttl` is set, the department parent histories are looked up
+    in a map of all the departments of the institution, which is built from a
+    single GetOrganization call and rebuilt every `parent_map_ttl` seconds (see
+    `get_department_parent_map`).
+    """
+
+    def __init__(
+        self,
+        sd_username: str,
+        sd_password: str,
+        timeout: int = 120,
+        url_subpath_xml_endpoints: str = "",
+        url_subpath_json_endpoints: str = "",
+        max_connections: int = 10,
+        max_keepalive_connections: int = 10,
+        cache_ttl: float = 0,
+        cache_maxsize: int = 1024,
+        max_requests_per_second: float = 0,
+        parent_map_ttl: float = 0,
+    ):
+        self.url_subpath_xml_endpoints = url_subpath_xml_endpoints
+        self.url_subpath_json_endpoints = url_subpath_json_endpoints
+        self.client = httpx.AsyncClient(
+            base_url=SD_BASE_URL,
+            auth=(sd_username, sd_password),
+            # Wait for a free connection in the pool rather than failing when
+            # all connections are in use
+            timeout=httpx.Timeout(timeout, pool=None),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+        self.cache = SDResponseCache(ttl=cache_ttl, maxsize=cache_maxsize)
+        self.rate_limiter = SDRateLimiter(max_requests_per_second)
+        # The department parent maps (per institution)
+        self.parent_map_cache = SDResponseCache(ttl=parent_map_ttl, maxsize=64)
+
+    async def __aenter__(self) -> "AsyncSDClient":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _call_sd(
+        self, query_params: SDRequest, xml_force_list: tuple[str, ...] = tuple()
+    ) -> Any:
+        """
+        Call SD XML endpoint and convert the response to an OrderedDict, which
+        can be parsed into the SD response models. This mirrors the behaviour
+        of `sdclient.client.SDClient._call_sd`.
+
+        Args:
+            query_params: The HTTP query parameters to set in the request
+            xml_force_list: A tuple of elements in the returned OrderedDict
+                which MUST be lists.
+
+        Returns:
+            The root element of the XML response from SD as an OrderedDict
+        """
+        endpoint_name = query_params.get_name()
+
+        await self.rate_limiter.acquire()
+        try:
+            response = await self.client.get(
+                f"{self.url_subpath_xml_endpoints}/sdws/{endpoint_name}",
+                params=query_params.to_query_params(),
+            )
+            response.raise_for_status()
+        except (HTTPError, StreamError) as err:
+            raise SDCallError("There was a problem calling SD") from err
+
+        # When the SD API is closed, we still get a HTTP 200, so we will have to
+        # settle for checking this string
+        if "The webservice has failed" in response.text:
+            raise SDCallError("There was a problem calling SD")
+
+        try:
+            xml_to_ordered_dict = xmltodict.parse(
+                response.text, force_list=xml_force_list, xml_attribs=False
+            )
+        except Exception as err:
+            raise SDParseResponseError(
+                "XML response from SD could not be parsed"
+            ) from err
+
+        sd_api_error_msg: str | None = (
+            xml_to_ordered_dict.get("Envelope", dict())
+            .get("Body", dict())
+            .get("Fault", dict())
+            .get("detail", dict())
+            .get("string")
+        )
+        if sd_api_error_msg is not None:
+            if REGEX_OBJECT_NOT_FOUND.match(sd_api_error_msg):
+                if endpoint_name in (
+                    "GetEmployment20111201",
+                    "GetEmploymentChanged20111201",
+                ):
+                    raise SDEmploymentNotFound(
+                        f"SD employment not found: {str(query_params)}"
+                    )
+                if endpoint_name in (
+                    "GetPerson20111201",
+                    "GetPersonChangedAtDate20111201",
+                ):
+                    raise SDPersonNotFound(f"SD person not found: {str(query_params)}")
+            if REGEX_DEPARTMENT_NOT_FOUND.match(sd_api_error_msg):
+                if endpoint_name == "GetDepartment20111201":
+                    raise SDDepartmentNotFound(
+                        f"SD department not found: {str(query_params)}"
+                    )
+
+        root_elem = xml_to_ordered_dict.get(endpoint_name)
+        if root_elem is None:
+            logger.error("Could not find XML root element", response=response.text)
+            raise SDRootElementNotFound(
+                "Could not find XML root element",
+                error=dict(xml_to_ordered_dict),
+            )
+
+        return root_elem
+
+    def invalidate_department(self, org_unit_uuid: UUID) -> None:
+        """Remove all cached responses concerning the given SD department."""
+
+        def concerns_unit(key: Any) -> bool:
+            if isinstance(key, GetDepartmentRequest):
+                return key.DepartmentUUIDIdentifier in (None, org_unit_uuid)
+            return key == ("department-parent-history", org_unit_uuid)
+
+        self.cache.invalidate(concerns_unit)
+        # The department is looked up with the parent history endpoint until
+        # the parent map is rebuilt
+        for parent_map in self.parent_map_cache.cached_values():
+            parent_map.pop(org_unit_uuid, None)
+
+    async def get_department(
+        self, query_params: GetDepartmentRequest
+    ) -> GetDepartmentResponse:
+        async def fetch() -> GetDepartmentResponse:
+            root_elem = await self._call_sd(
+                query_params, xml_force_list=("Department",)
+            )
+            return GetDepartmentResponse.parse_obj(root_elem)
+
+        # The request is frozen and contains the institution, the unit and all
+        # request flags, so it can be used directly as the cache key
+        return await self.cache.get(query_params, fetch)
+
+    async def get_person(self, query_params: GetPersonRequest) -> GetPersonResponse:
+        root_elem = await self._call_sd(query_params, xml_force_list=PERSON_FORCE_LIST)
+        return GetPersonResponse.parse_obj(root_elem)
+
+    async def get_employment(
+        self, query_params: GetEmploymentRequest
+    ) -> GetEmploymentResponse:
+        root_elem = await self._call_sd(
+            query_params, xml_force_list=("Person", "Employment")
+        )
+        return GetEmploymentResponse.parse_obj(root_elem)
+
+    async def get_employment_changed(
+        self, query_params: GetEmploymentChangedRequest
+    ) -> GetEmploymentChangedResponse:
+        root_elem = await self._call_sd(
+            query_params, xml_force_list=EMPLOYMENT_FORCE_LIST
+        )
+        return GetEmploymentChangedResponse.parse_obj(root_elem)
+
+    async def get_employment_changed_at_date(
+        self, query_params: GetEmploymentChangedAtDateRequest
+    ) -> GetEmploymentChangedAtDateResponse:
+        root_elem = await self._call_sd(
+            query_params, xml_force_list=EMPLOYMENT_FORCE_LIST
+        )
+        return GetEmploymentChangedAtDateResponse.parse_obj(root_elem)
+
+    async def get_person_changed_at_date(
+        self, query_params: GetPersonChangedAtDateRequest
+    ) -> GetPersonChangedAtDateResponse:
+        root_elem = await self._call_sd(query_params, xml_force_list=PERSON_FORCE_LIST)
+        return GetPersonChangedAtDateResponse.parse_obj(root_elem)
+
+    async def get_organization(
+        self, query_params: GetOrganizationRequest
+    ) -> GetOrganizationResponse:
+        root_elem = await self._call_sd(
+            query_params, xml_force_list=("DepartmentReference", "Organization")
+        )
+        return GetOrganizationResponse.parse_obj(root_elem)
+
+    async def get_department_parent(
+        self, query_params: GetDepartmentParentRequest
+    ) -> GetDepartmentParentResponse | None:
+        root_elem = await self._call_sd(query_params)
+        try:
+            return GetDepartmentParentResponse.parse_obj(root_elem)
+        except ValidationError:
+            return None
+
+    async def get_department_parent_history(
+        self, org_unit_uuid: UUID, institution_identifier: str | None = None
+    ) -> list[DepartmentParentHistoryObj]:
+        """
+        Get the parent history of the given department. If the institution is
+        given and the parent map is enabled, the history is looked up in the
+        parent map of the institution. Departments not found in the map are
+        looked up with the SD parent history endpoint.
+        """
+        if institution_identifier is not None and self.parent_map_cache.ttl > 0:
+            parent_map = await self.get_department_parent_map(institution_identifier)
+            parents = parent_map.get(org_unit_uuid)
+            if parents is not None:
+                return parents
+
+        return await self.cache.get(
+            ("department-parent-history", org_unit_uuid),
+            lambda: self._get_department_parent_history(org_unit_uuid),
+        )
+
+    async def get_department_parent_map(
+        self, institution_identifier: str
+    ) -> dict[UUID, list[DepartmentParentHistoryObj]]:
+        """
+        Get a map from each department of the institution to its parent history
+        (see `get_department_parent_map`). The map is cached for
+        `parent_map_ttl` seconds.
+        """
+
+        async def fetch() -> dict[UUID, list[DepartmentParentHistoryObj]]:
+            logger.info(
+                "Building SD department parent map",
+                institution_identifier=institution_identifier,
+            )
+            sd_org = await self.get_organization(
+                GetOrganizationRequest(
+                    InstitutionIdentifier=institution_identifier,
+                    ActivationDate=date.min,
+                    DeactivationDate=date.max,
+                    UUIDIndicator=True,
+                )
+            )
+            return get_department_parent_map(sd_org)
+
+        return await self.parent_map_cache.get(institution_identifier, fetch)
+
+    async def _get_department_parent_history(
+        self, org_unit_uuid: UUID
+    ) -> list[DepartmentParentHistoryObj]:
+        await self.rate_limiter.acquire()
+        try:
+            response = await self.client.get(
+                f"{self.url_subpath_json_endpoints}/api-gateway/organization/public/api/v1/organizations/uuids/{str(org_unit_uuid)}/department-parent-history",
+            )
+            if response.status_code == 404:
+                raise SDParentNotFound("Parent history not found!")
+            response.raise_for_status()
+        except (HTTPError, StreamError) as err:
+            raise SDCallError("There was a problem calling SD") from err
+
+        return parse_obj_as(list[DepartmentParentHistoryObj], response.json())
+
+    async def get_profession(
+        self, query_params: GetProfessionRequest
+    ) -> GetProfessionResponse:
+        root_elem = await self._call_sd(query_params, xml_force_list=("Profession",))
+        return GetProfessionResponse.parse_obj(root_elem)
+
+    async def get_institution(
+        self, query_params: GetInstitutionRequest
+    ) -> GetInstitutionResponse:
+        root_elem = await self._call_sd(query_params)
+        return GetInstitutionResponse.parse_obj(root_elem)
+
+
+def get_department_parent_map(
+    sd_org: GetOrganizationResponse,
+) -> dict[UUID, list[DepartmentParentHistoryObj]]:
+    """
+    Get a map from each department in the GetOrganization response to its
+    parent history, i.e. the parent of the department in each of the periods
+    (`Organization`s) of the response. Departments directly below the
+    institution have no parent in the period.
+
+    Args:
+        sd_org: the response from the SD endpoint GetOrganization
+
+    Returns:
+        Mapping from an SD department UUID to its parent history
+    """
+    parent_map: dict[UUID, list[DepartmentParentHistoryObj]] = {}
+
+    for organization in sd_org.Organization:
+        seen: set[UUID] = set()
+
+        def add_unit(dep_ref: DepartmentReference) -> None:
+            dep_uuid = dep_ref.DepartmentUUIDIdentifier
+            if dep_uuid is None or dep_uuid in seen:
+                return
+            seen.add(dep_uuid)
+            if not dep_ref.DepartmentReference:
+                return
+            parent_dep_ref = one(dep_ref.DepartmentReference)
+            if parent_dep_ref.DepartmentUUIDIdentifier is not None:
+                parent_map.setdefault(dep_uuid, []).append(
+                    DepartmentParentHistoryObj(
+                        startDate=organization.ActivationDate,
+                        endDate=organization.DeactivationDate,
+                        parentUuid=parent_dep_ref.DepartmentUUIDIdentifier,
+                    )
+                )
+            add_unit(parent_dep_ref)
+
+        for dep_ref in organization.DepartmentReference:
+            add_unit(dep_ref)
+
+    return parent_map
+
+
+def get_sd_client(settings: SDToolPlusSettings) -> AsyncSDClient:
+    return AsyncSDClient(
+        sd_username=settings.sd_username,
+        sd_password=settings.sd_password.get_secret_value(),
+        url_subpath_xml_endpoints=settings.sd_url_subpath_xml_endpoints,
+        url_subpath_json_endpoints=settings.sd_url_subpath_json_endpoints,
+        max_connections=settings.sd_max_connections,
+        max_keepalive_connections=settings.sd_max_keepalive_connections,
+        cache_ttl=settings.sd_cache_ttl,
+        cache_maxsize=settings.sd_cache_maxsize,
+        max_requests_per_second=settings.sd_max_requests_per_second,
+        parent_map_ttl=settings.sd_department_parent_map_ttl,
+    )
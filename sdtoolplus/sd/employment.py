@@ -1,7 +1,16 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+from datetime import datetime
 from enum import Enum
 
+import structlog
+from sdclient.requests import GetEmploymentChangedAtDateRequest
+
+from sdtoolplus.config import TIMEZONE
+from sdtoolplus.sd.client import AsyncSDClient
+
+logger = structlog.stdlib.get_logger()
+
 
 class EmploymentStatusCode(Enum):
     # See docs at
@@ -27,3 +36,53 @@ class EmploymentStatusCode(Enum):
 
     def is_leave(self) -> bool:
         return self == EmploymentStatusCode.LEAVE
+
+
+async def get_changed_employments(
+    sd_client: AsyncSDClient,
+    institution_identifier: str,
+    since: datetime,
+    until: datetime,
+) -> set[tuple[str, str]]:
+    """
+    Get the SD employments changed in the given institution in the time
+    interval [since, until), i.e. the employments with changes registered in SD
+    in this interval (regardless of the effective dates of the changes).
+
+    Args:
+        sd_client: the SD client
+        institution_identifier: the SD institution identifier
+        since: the start of the interval (naive values are assumed to be in
+            local time)
+        until: the end of the interval (naive values are assumed to be in
+            local time)
+
+    Returns:
+        Set of (CPR, EmploymentIdentifier) tuples for the changed employments
+    """
+    logger.info(
+        "Get changed SD employments",
+        institution_identifier=institution_identifier,
+        since=since,
+        until=until,
+    )
+    # SD expects the dates and times in local time
+    if since.tzinfo is not None:
+        since = since.astimezone(TIMEZONE)
+    if until.tzinfo is not None:
+        until = until.astimezone(TIMEZONE)
+    r_employments = await sd_client.get_employment_changed_at_date(
+        GetEmploymentChangedAtDateRequest(
+            InstitutionIdentifier=institution_identifier,
+            ActivationDate=since.date(),
+            ActivationTime=since.time(),
+            DeactivationDate=until.date(),
+            DeactivationTime=until.time(),
+            FutureInformationIndicator=True,
+        )
+    )
+    return {
+        (person.PersonCivilRegistrationIdentifier, employment.EmploymentIdentifier)
+        for person in r_employments.Person
+        for employment in person.Employment
+    }
@@ -1,11 +1,9 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-import asyncio
 from datetime import date
 from uuid import UUID
 
 import structlog
-from sdclient.client import SDClient
 from sdclient.exceptions import SDCallError
 from sdclient.requests import GetDepartmentRequest
 from sdclient.requests import GetOrganizationRequest
@@ -21,6 +19,7 @@ from sdtoolplus.config import SD_RETRY_WAIT_TIME
 from sdtoolplus.mo_class import MOOrgUnitLevelMap
 from sdtoolplus.mo_org_unit_importer import OrgUnitNode
 from sdtoolplus.sd.addresses import get_addresses
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sd.tree import build_extra_tree
 from sdtoolplus.sd.tree import build_tree
 from sdtoolplus.sd.tree import get_sd_validity
@@ -35,7 +34,7 @@ logger = structlog.stdlib.get_logger()
     reraise=True,
 )
 async def get_sd_organization(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     institution_identifier: str,
     activation_date: date,
     deactivation_date: date,
@@ -47,7 +46,7 @@ async def get_sd_organization(
         DeactivationDate=deactivation_date,
         UUIDIndicator=True,
     )
-    return await asyncio.to_thread(sd_client.get_organization, req)
+    return await sd_client.get_organization(req)
 
 
 @retry(
@@ -57,7 +56,7 @@ async def get_sd_organization(
     reraise=True,
 )
 async def get_sd_departments(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     institution_identifier: str,
     activation_date: date,
     deactivation_date: date,
@@ -74,11 +73,11 @@ async def get_sd_departments(
         ProductionUnitIndicator=fetch_pnumber,
         UUIDIndicator=True,
     )
-    return await asyncio.to_thread(sd_client.get_department, req)
+    return await sd_client.get_department(req)
 
 
 async def get_sd_tree(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     institution_identifier: str,
     mo_org_unit_level_map: MOOrgUnitLevelMap,
     sd_root_uuid: UUID | None = None,
@@ -115,7 +114,7 @@ async def get_sd_tree(
 
 
 async def get_sd_units(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     institution_identifier: str,
 ) -> list[OrgUnitNode]:
     # TODO: add docstring
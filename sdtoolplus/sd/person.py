@@ -1,12 +1,10 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-import asyncio
 from datetime import date
 
 import structlog.stdlib
 from more_itertools import nth
 from more_itertools import only
-from sdclient.client import SDClient
 from sdclient.exceptions import SDPersonNotFound
 from sdclient.exceptions import SDRootElementNotFound
 from sdclient.requests import GetEmploymentChangedRequest
@@ -21,6 +19,7 @@ from sdtoolplus.models import Engagement
 from sdtoolplus.models import EngagementEmails
 from sdtoolplus.models import EngagementPhoneNumbers
 from sdtoolplus.models import Person
+from sdtoolplus.sd.client import AsyncSDClient
 
 logger = structlog.stdlib.get_logger()
 
@@ -105,7 +104,7 @@ def _get_employment_emails(
 
 # Persons in SD has no timeline and can only be queried at a specific date
 async def get_sd_person(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     institution_identifier: str,
     cpr: str,
     effective_date: date,
@@ -114,8 +113,7 @@ async def get_sd_person(
     include_passive_persons: bool = True,
 ) -> Person | None:
     try:
-        sd_response = await asyncio.to_thread(
-            sd_client.get_person,
+        sd_response = await sd_client.get_person(
             GetPersonRequest(
                 InstitutionIdentifier=institution_identifier,
                 PersonCivilRegistrationIdentifier=cpr,
@@ -190,7 +188,7 @@ async def get_sd_person(
 
 
 async def get_all_sd_persons(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     institution_identifier: str,
     effective_date: date,
     sync_active_persons: bool,
@@ -199,8 +197,7 @@ async def get_all_sd_persons(
     postal_address: bool = False,
 ) -> list[Person]:
     # TODO: handle SD call errors
-    sd_response = await asyncio.to_thread(
-        sd_client.get_person,
+    sd_response = await sd_client.get_person(
         GetPersonRequest(
             InstitutionIdentifier=institution_identifier,
             PersonCivilRegistrationIdentifier=None,
@@ -228,10 +225,9 @@ async def get_all_sd_persons(
 
 
 async def get_sd_person_engagements(
-    sd_client: SDClient, institution_identifier: str, cpr: str
+    sd_client: AsyncSDClient, institution_identifier: str, cpr: str
 ) -> GetEmploymentChangedResponse:
-    return await asyncio.to_thread(
-        sd_client.get_employment_changed,
+    return await sd_client.get_employment_changed(
         GetEmploymentChangedRequest(
             InstitutionIdentifier=institution_identifier,
             PersonCivilRegistrationIdentifier=cpr,
@@ -0,0 +1,36 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from time import monotonic
+
+
+class SDRateLimiter:
+    """
+    Limit the rate of the SD calls by spacing them evenly, i.e. callers of
+    `acquire` are delayed such that at most `max_requests_per_second` calls are
+    started per second. Unlike the size of the connection pool, this also
+    bounds the load on SD when the SD calls are fast.
+
+    Args:
+        max_requests_per_second: the maximum number of calls per second. 0
+          disables the rate limit.
+    """
+
+    def __init__(self, max_requests_per_second: float) -> None:
+        self.interval = (
+            1 / max_requests_per_second if max_requests_per_second > 0 else 0
+        )
+        self._next_slot = 0.0
+
+    async def acquire(self) -> None:
+        if self.interval == 0:
+            return
+
+        # Reserve the next free slot before sleeping, such that concurrent
+        # callers get consecutive slots
+        now = monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
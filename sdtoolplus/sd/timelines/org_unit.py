@@ -1,6 +1,5 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-import asyncio
 from datetime import date
 from itertools import pairwise
 
@@ -8,7 +7,6 @@ import structlog
 from more_itertools import collapse
 from more_itertools import first
 from more_itertools import only
-from sdclient.client import SDClient
 from sdclient.exceptions import SDDepartmentNotFound
 from sdclient.exceptions import SDParentNotFound
 from sdclient.exceptions import SDRootElementNotFound
@@ -28,6 +26,7 @@ from sdtoolplus.models import UnitPNumber
 from sdtoolplus.models import UnitPostalAddress
 from sdtoolplus.models import UnitTimeline
 from sdtoolplus.models import combine_intervals
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sd.timelines.common import sd_end_to_timeline_end
 from sdtoolplus.sd.timelines.common import sd_start_to_timeline_start
 
@@ -90,13 +89,12 @@ def condense_multiple_parents_to_unknown_unit(
 
 
 async def get_department(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     institution_identifier: str,
     unit_uuid: OrgUnitUUID,
 ) -> GetDepartmentResponse | None:
     try:
-        department = await asyncio.to_thread(
-            sd_client.get_department,
+        department = await sd_client.get_department(
             GetDepartmentRequest(
                 InstitutionIdentifier=institution_identifier,
                 DepartmentUUIDIdentifier=unit_uuid,
@@ -130,7 +128,7 @@ async def get_department(
 
 async def get_department_timeline(
     department: GetDepartmentResponse | None,
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     inst_id: str,
     unit_uuid: OrgUnitUUID,
     settings: SDToolPlusSettings,
@@ -141,9 +139,7 @@ async def get_department_timeline(
         return UnitTimeline()
 
     try:
-        parents = await asyncio.to_thread(
-            sd_client.get_department_parent_history, unit_uuid
-        )
+        parents = await sd_client.get_department_parent_history(unit_uuid)
     except SDParentNotFound as error:
         logger.warning("Error getting department parent(s) from SD", error=error)
         return UnitTimeline()
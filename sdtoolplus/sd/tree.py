@@ -1,6 +1,5 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-import asyncio
 import zoneinfo
 from datetime import date
 from datetime import datetime
@@ -9,7 +8,6 @@ from uuid import UUID
 from anytree import find  # type: ignore
 from more_itertools import one
 from ramodels.mo import Validity
-from sdclient.client import SDClient
 from sdclient.exceptions import SDCallError
 from sdclient.exceptions import SDRootElementNotFound
 from sdclient.requests import GetDepartmentParentRequest
@@ -32,6 +30,7 @@ from sdtoolplus.mo_org_unit_importer import Address
 from sdtoolplus.mo_org_unit_importer import OrgUnitNode
 from sdtoolplus.mo_org_unit_importer import OrgUnitUUID
 from sdtoolplus.sd.addresses import get_addresses
+from sdtoolplus.sd.client import AsyncSDClient
 
 ASSUMED_SD_TIMEZONE = zoneinfo.ZoneInfo("Europe/Copenhagen")
 
@@ -237,6 +236,43 @@ def _get_extra_nodes(
     return get_departments_unit_uuids.difference(existing_nodes_uuids)  # type: ignore
 
 
+def get_sd_parent_map(
+    sd_org: GetOrganizationResponse,
+) -> dict[OrgUnitUUID, OrgUnitUUID | None]:
+    """
+    Get a mapping from each unit in the GetOrganization response to its parent
+    unit. Units directly below the institution are mapped to None.
+
+    Args:
+        sd_org: the response from the SD endpoint GetOrganization
+
+    Returns:
+        Mapping from an SD department UUID to the UUID of its parent department
+    """
+
+    parents: dict[OrgUnitUUID, OrgUnitUUID | None] = {}
+
+    def add_unit(dep_ref: DepartmentReference) -> None:
+        dep_uuid = dep_ref.DepartmentUUIDIdentifier
+        if dep_uuid in parents:
+            return
+        parent_dep_ref = (
+            one(dep_ref.DepartmentReference) if dep_ref.DepartmentReference else None
+        )
+        parents[dep_uuid] = (  # type: ignore
+            parent_dep_ref.DepartmentUUIDIdentifier
+            if parent_dep_ref is not None
+            else None
+        )
+        if parent_dep_ref is not None:
+            add_unit(parent_dep_ref)
+
+    for dep_ref in one(sd_org.Organization).DepartmentReference:
+        add_unit(dep_ref)
+
+    return parents
+
+
 @retry(
     retry=retry_if_exception_type(SDCallError),
     wait=wait_fixed(SD_RETRY_WAIT_TIME),
@@ -244,11 +280,10 @@ def _get_extra_nodes(
     reraise=True,
 )
 async def _get_department_parent(
-    sd_client: SDClient, unit_uuid: OrgUnitUUID
+    sd_client: AsyncSDClient, unit_uuid: OrgUnitUUID
 ) -> GetDepartmentParentResponse | None:
     try:
-        return await asyncio.to_thread(
-            sd_client.get_department_parent,
+        return await sd_client.get_department_parent(
             GetDepartmentParentRequest(
                 EffectiveDate=datetime.now().date(),
                 DepartmentUUIDIdentifier=unit_uuid,
@@ -259,7 +294,7 @@ async def _get_department_parent(
 
 
 async def _get_parent_node(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     unit_uuid: OrgUnitUUID,
     root_node: OrgUnitNode,
     sd_departments_map: dict[OrgUnitUUID, Department],
@@ -362,7 +397,7 @@ def build_tree(
 
 
 async def build_extra_tree(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     root_node: OrgUnitNode,
     sd_org: GetOrganizationResponse,
     sd_departments: GetDepartmentResponse,
@@ -0,0 +1,217 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from collections.abc import Callable
+from functools import partial
+from time import monotonic
+
+import structlog
+from aio_pika.abc import AbstractChannel
+from aio_pika.abc import AbstractIncomingMessage
+from more_itertools import unique_everseen
+
+from .autogenerated_graphql_client import EventSendInput
+from .config import SDAMQPSettings
+from .depends import GraphQLClient
+from .mo.event_publisher import EventPublisher
+from .models import PersonAndEmploymentGraphQLEvent
+
+logger = structlog.stdlib.get_logger()
+
+
+def deduplicate_events(events: list[EventSendInput]) -> list[EventSendInput]:
+    return list(
+        unique_everseen(
+            events,
+            key=lambda event: (event.namespace, event.routing_key, event.subject),
+        )
+    )
+
+
+def coalesce_person_and_employment_events(
+    events: list[EventSendInput],
+) -> list[EventSendInput]:
+    """
+    Coalesce the person-and-employment events (see
+    `PersonAndEmploymentGraphQLEvent`), i.e. remove the duplicate events and
+    the person events for persons who also have employment events, since the
+    sync of an employment also syncs the person.
+    """
+    subjects = [
+        PersonAndEmploymentGraphQLEvent.parse_raw(event.subject) for event in events
+    ]
+    persons_with_employment_events = {
+        (subject.institution_identifier, subject.cpr)
+        for subject in subjects
+        if subject.employment_identifier is not None
+    }
+    return deduplicate_events(
+        [
+            event
+            for event, subject in zip(events, subjects)
+            if subject.employment_identifier is not None
+            or (subject.institution_identifier, subject.cpr)
+            not in persons_with_employment_events
+        ]
+    )
+
+
+class SDAMQPBatchConsumer:
+    """
+    Consume the messages of one or more SD AMQP queues in batches.
+
+    The messages are converted to MO events and collected for up to `window`
+    seconds (or until `batch_max_size` messages have been collected). The
+    events of a batch are coalesced (by default, identical events are only
+    sent once) and sent to MO in a single GraphQL request, after which all the
+    messages of the batch are acknowledged together. If the events cannot be
+    sent, the messages are requeued right away (such that a later batch cannot
+    acknowledge them), and the next batch is not sent until `retry_delay`
+    seconds have passed. The following (and the requeued) messages are still
+    collected in the meantime.
+
+    The prefetch count of the channel is adapted to the time it takes to send
+    a batch to MO (see `SDAMQPSettings`), such that many messages are fetched
+    during a burst as long as MO keeps up.
+
+    The consumer must have a channel of its own, since the messages are
+    acknowledged with `multiple=True` and the prefetch count is set for the
+    channel.
+
+    Args:
+        name: the name of the consumer (used for logging)
+        channel: the channel of the queues
+        queues: map from the names of the queues to functions converting their
+          messages to MO events
+        graphql_client: the GraphQL client
+        settings: the SD AMQP settings
+        window: the number of seconds to collect messages for
+        coalesce: function coalescing the events of a batch
+    """
+
+    def __init__(
+        self,
+        name: str,
+        channel: AbstractChannel,
+        queues: dict[str, Callable[[AbstractIncomingMessage], EventSendInput]],
+        graphql_client: GraphQLClient,
+        settings: SDAMQPSettings,
+        window: float,
+        coalesce: Callable[
+            [list[EventSendInput]], list[EventSendInput]
+        ] = deduplicate_events,
+    ) -> None:
+        self.name = name
+        self.channel = channel
+        self.queues = queues
+        self.graphql_client = graphql_client
+        self.settings = settings
+        self.window = window
+        self.coalesce = coalesce
+
+        self.prefetch_count = settings.prefetch_min
+        self._batch: list[tuple[AbstractIncomingMessage, EventSendInput]] = []
+        self._lock = asyncio.Lock()
+        # The timer flushing the current batch after the window
+        self._timer: asyncio.Task | None = None
+        # No batch is sent before this time (see `monotonic`) after a failed send
+        self._retry_at = 0.0
+
+    async def start(self) -> None:
+        await self.channel.set_qos(prefetch_count=self.prefetch_count)
+        for name, convert in self.queues.items():
+            queue = await self.channel.get_queue(name)
+            await queue.consume(partial(self.on_message, convert), timeout=5)
+
+    async def close(self) -> None:
+        # The messages of the pending batch are not acknowledged, so they are
+        # redelivered by the broker
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+
+    async def on_message(
+        self,
+        convert: Callable[[AbstractIncomingMessage], EventSendInput],
+        message: AbstractIncomingMessage,
+    ) -> None:
+        log = logger.bind(consumer=self.name, message=message)
+        log.info("Processing SD AMQP message", body=message.body)
+        try:
+            event = convert(message)
+        except Exception:
+            # The message will never be processed, so there is no point in
+            # requeuing it
+            log.exception("Could not convert SD AMQP message")
+            await message.reject(requeue=False)
+            return
+
+        self._batch.append((message, event))
+        if (
+            len(self._batch) >= self.settings.batch_max_size
+            and monotonic() >= self._retry_at
+        ):
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window)
+        # Wait for the retry delay after a failed send
+        while (delay := self._retry_at - monotonic()) > 0:
+            await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            batch, self._batch = self._batch, []
+            # The batch of the timer is flushed now, so the timer must not
+            # flush the next batch early
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+            if not batch:
+                return
+            # The messages are acknowledged (or requeued) up to and including
+            # the last message of the batch
+            last_message = batch[-1][0]
+
+            events = self.coalesce([event for _, event in batch])
+            log = logger.bind(
+                consumer=self.name, messages=len(batch), events=len(events)
+            )
+
+            started = monotonic()
+            try:
+                async with EventPublisher(
+                    self.graphql_client, batch_size=len(events), concurrency=1
+                ) as publisher:
+                    for event in events:
+                        await publisher.publish(event)
+            except Exception:
+                log.exception("Could not send SD AMQP events")
+                await last_message.nack(multiple=True, requeue=True)
+                self._retry_at = monotonic() + self.settings.retry_delay
+                return
+            latency = monotonic() - started
+
+            await last_message.ack(multiple=True)
+            log.info("Sent SD AMQP events", latency=latency)
+
+            await self._adapt_prefetch_count(latency)
+
+    async def _adapt_prefetch_count(self, latency: float) -> None:
+        if latency < self.settings.target_latency:
+            prefetch_count = min(self.prefetch_count * 2, self.settings.prefetch_max)
+        else:
+            prefetch_count = max(self.prefetch_count // 2, self.settings.prefetch_min)
+
+        if prefetch_count != self.prefetch_count:
+            logger.info(
+                "Adapting SD AMQP prefetch count",
+                consumer=self.name,
+                prefetch_count=prefetch_count,
+                latency=latency,
+            )
+            self.prefetch_count = prefetch_count
+            await self.channel.set_qos(prefetch_count=prefetch_count)
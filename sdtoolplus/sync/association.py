@@ -1,6 +1,5 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-from itertools import pairwise
 from uuid import UUID
 
 import structlog
@@ -54,19 +53,13 @@ async def _sync_association_intervals(
         user_key=user_key,
     )
 
-    sd_interval_endpoints = sd_association_timeline.get_interval_endpoints()
-    mo_interval_endpoints = mo_association_timeline.get_interval_endpoints()
+    segments = list(sd_association_timeline.diff(mo_association_timeline))
+    logger.info("List of changed segments", segments=segments)
 
-    endpoints = sorted(sd_interval_endpoints.union(mo_interval_endpoints))
-    logger.info("List of endpoints", endpoints=endpoints)
-
-    for start, end in pairwise(endpoints):
+    for segment in segments:
+        start, end = segment.start, segment.end
         logger.info("Processing endpoint pair", start=start, end=end)
 
-        if sd_association_timeline.equal_at(start, mo_association_timeline):
-            logger.info("SD and MO equal")
-            continue
-
         try:
             is_active = sd_association_timeline.association_active.entity_at(
                 start
@@ -1,8 +1,10 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
 import asyncio
+import hashlib
 from datetime import date
 from datetime import datetime
+from itertools import chain
 from itertools import pairwise
 from typing import TypeVar
 from typing import assert_never
@@ -11,24 +13,28 @@ from uuid import UUID
 
 import structlog
 from fastramqpi.ramqp.depends import handle_exclusively_decorator
-from more_itertools import collapse
+from more_itertools import first
 from more_itertools import only
-from sdclient.client import SDClient
+from pydantic import BaseModel
 from sdclient.exceptions import SDEmploymentNotFound
 from sdclient.exceptions import SDParentNotFound
 from sdclient.exceptions import SDRootElementNotFound
 from sdclient.requests import GetEmploymentChangedRequest
+from sqlalchemy import Engine
 
 from sdtoolplus.autogenerated_graphql_client import OrganisationUnitFilter
 from sdtoolplus.config import TIMEZONE
 from sdtoolplus.config import Mode
 from sdtoolplus.config import SDToolPlusSettings
+from sdtoolplus.db.rundb import get_engagement_fingerprint
+from sdtoolplus.db.rundb import persist_engagement_fingerprint
 from sdtoolplus.depends import GraphQLClient
 from sdtoolplus.exceptions import DepartmentParentsNotFoundError
 from sdtoolplus.exceptions import DepartmentValidityExceedsParentsValiditiesError
 from sdtoolplus.exceptions import HolesInDepartmentParentsTimelineError
 from sdtoolplus.exceptions import NoValueError
 from sdtoolplus.exceptions import PersonNotFoundError
+from sdtoolplus.mo.timelines.engagement import EngagementMutationBatch
 from sdtoolplus.mo.timelines.engagement import create_engagement
 from sdtoolplus.mo.timelines.engagement import get_engagement_filter
 from sdtoolplus.mo.timelines.engagement import get_engagement_timeline
@@ -47,11 +53,16 @@ from sdtoolplus.models import EngagementTimeline
 from sdtoolplus.models import EngagementUnit
 from sdtoolplus.models import EngagementUnitId
 from sdtoolplus.models import Interval
+from sdtoolplus.models import IntervalSpan
 from sdtoolplus.models import LeaveTimeline
 from sdtoolplus.models import ManagerTimeline
 from sdtoolplus.models import Timeline
 from sdtoolplus.models import UnitParent
 from sdtoolplus.models import combine_intervals
+from sdtoolplus.models import combine_spans
+from sdtoolplus.models import from_spans
+from sdtoolplus.models import to_spans
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sd.timelines.common import sd_end_to_timeline_end
 from sdtoolplus.sd.timelines.common import sd_start_to_timeline_start
 from sdtoolplus.sd.timelines.employment import get_employment_timeline
@@ -88,30 +99,29 @@ def _remove_ranges(
     Returns:
         A copy of the timeline with the ranges removed.
     """
-    # Build the sorted set of all relevant endpoints: the timeline's own interval
-    # endpoints together with the endpoints of the ranges to remove.
-    endpoints = sorted(
-        timeline.get_interval_endpoints().union(
-            collapse((removal.start, removal.end) for removal in removal_ranges)
-        )
+    if not timeline.intervals:
+        return timeline
+
+    # The clipping is done on spans (and not on the pydantic intervals) since
+    # this is called for every field of every engagement timeline
+    removals = sorted((removal.start, removal.end) for removal in removal_ranges)
+    new_spans: list[IntervalSpan] = []
+    for span in to_spans(timeline.intervals):
+        start = span.start
+        for removal_start, removal_end in removals:
+            if removal_end <= start or removal_start >= span.end:
+                continue
+            if start < removal_start:
+                new_spans.append(IntervalSpan(start, removal_start, span.value))
+            start = max(start, removal_end)
+        if start < span.end:
+            new_spans.append(IntervalSpan(start, span.end, span.value))
+
+    interval_type = type(first(timeline.intervals))
+    return timeline.copy(
+        update={"intervals": from_spans(interval_type, combine_spans(new_spans))}
     )
 
-    new_intervals: list[_Interval] = []
-    for start, end in pairwise(endpoints):
-        # Skip sub-intervals that fall within a range to remove
-        if any(removal.start <= start < removal.end for removal in removal_ranges):
-            continue
-        # Skip sub-intervals not covered by the timeline (holes)
-        try:
-            entity = timeline.entity_at(start)
-        except NoValueError:
-            continue
-        new_intervals.append(
-            cast(_Interval, entity.copy(update={"start": start, "end": end}))
-        )
-
-    return timeline.copy(update={"intervals": combine_intervals(tuple(new_intervals))})
-
 
 async def _sync_eng_intervals(
     gql_client: GraphQLClient,
@@ -140,25 +150,28 @@ async def _sync_eng_intervals(
     # Get the engagement types
     eng_types = await get_engagement_types(gql_client)
 
-    desired_interval_endpoints = desired_eng_timeline.get_interval_endpoints()
-    mo_interval_endpoints = mo_eng_timeline.get_interval_endpoints()
-
     # There are occasionally bad data in the past resulting errors, which in turn
     # leads to missing a processing of current and future data (where the latter
     # are typically more important). We therefore process the timeline in reverse to
     # increase the probability of processing the most important data first.
-    endpoints = sorted(
-        desired_interval_endpoints.union(mo_interval_endpoints), reverse=True
+    segments = list(desired_eng_timeline.diff(mo_eng_timeline))
+    logger.info("List of changed segments", segments=segments)
+
+    batch = (
+        EngagementMutationBatch(
+            gql_client=gql_client,
+            person=person,
+            user_key=user_key,
+            batch_size=settings.mo_engagement_mutation_batch_size,
+        )
+        if settings.mo_engagement_mutation_batch_size > 0
+        else None
     )
-    logger.info("List of endpoints", endpoints=endpoints)
 
-    for end, start in pairwise(endpoints):
+    for segment in reversed(segments):
+        start, end = segment.start, segment.end
         logger.info("Processing endpoint pair", start=start, end=end)
 
-        if desired_eng_timeline.equal_at(start, mo_eng_timeline):
-            logger.info("SD and MO equal")
-            continue
-
         try:
             is_active = desired_eng_timeline.eng_active.entity_at(start).value
         except NoValueError:
@@ -173,6 +186,9 @@ async def _sync_eng_intervals(
                 person=person,
                 user_key=user_key,
             )
+            if batch is not None:
+                await batch.terminate(start, end)
+                continue
             await terminate_engagement(
                 gql_client=gql_client,
                 person=person,
@@ -186,6 +202,15 @@ async def _sync_eng_intervals(
             logger.error("Cannot create/update engagement due to missing timeline data")
             continue
 
+        if batch is not None:
+            await batch.create_or_update(
+                start=start,
+                end=end,
+                desired_eng_timeline=desired_eng_timeline,
+                eng_types=eng_types,
+            )
+            continue
+
         mo_eng = await gql_client.get_engagement_timeline(
             get_engagement_filter(
                 person=person, user_key=user_key, from_date=None, to_date=None
@@ -212,6 +237,9 @@ async def _sync_eng_intervals(
                 eng_types=eng_types,
             )
 
+    if batch is not None:
+        await batch.flush()
+
     logger.info(
         "Finished syncing engagement in MO",
         person=str(person),
@@ -220,7 +248,8 @@ async def _sync_eng_intervals(
 
 
 async def engagement_ou_strategy_elevate_to_ny_level(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
+    institution_identifier: str,
     sd_eng_timeline: EngagementTimeline,
 ) -> EngagementTimeline:
     """
@@ -237,8 +266,8 @@ async def engagement_ou_strategy_elevate_to_ny_level(
     """
     logger.info("Applying OU elevate-to-NY-level strategy")
 
-    # Find the OU parent timelines for each SD employment department (using sync HTTP
-    # calls to spare the SD API)
+    # Find the OU parent timelines for each SD employment department (in the
+    # department parent map of the institution if enabled)
     eng_unit_uuids: set[OrgUnitUUID] = set(
         eng_unit.value  # type: ignore
         for eng_unit in sd_eng_timeline.eng_unit.intervals
@@ -246,9 +275,8 @@ async def engagement_ou_strategy_elevate_to_ny_level(
     ou_parent_timelines: dict[OrgUnitUUID, Timeline[UnitParent]] = dict()
     for eng_unit_uuid in eng_unit_uuids:
         try:
-            parents = await asyncio.to_thread(
-                sd_client.get_department_parent_history,
-                eng_unit_uuid,
+            parents = await sd_client.get_department_parent_history(
+                eng_unit_uuid, institution_identifier
             )
         except SDParentNotFound as error:
             logger.error(
@@ -556,6 +584,7 @@ async def engagement_ou_strategy_region(
                     end=unit_interval.end,
                     unknown_unit_uuid=settings.unknown_unit,
                     recursive_lookup=recursive_ou_relation_lookup,
+                    cache=settings.cache_mo_related_units,
                 )
             )
     logger.debug(
@@ -636,9 +665,10 @@ async def engagement_ou_strategy_terminate_in_past_where_unit_unknown(
 
 
 async def engagement_ou_strategy(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     gql_client: GraphQLClient,
     settings: SDToolPlusSettings,
+    institution_identifier: str,
     person: UUID,
     user_key: str,
     sd_eng_timeline: EngagementTimeline,
@@ -662,7 +692,7 @@ async def engagement_ou_strategy(
                 )
             if settings.apply_ny_logic:
                 return await engagement_ou_strategy_elevate_to_ny_level(
-                    sd_client, sd_eng_timeline
+                    sd_client, institution_identifier, sd_eng_timeline
                 )
             return sd_eng_timeline
         case Mode.REGION:
@@ -809,9 +839,16 @@ async def fix_too_narrow_ou_validities(
     return desired_timeline
 
 
+def _fingerprint(*timelines: BaseModel) -> str:
+    return hashlib.sha256(
+        "\n".join(timeline.json() for timeline in timelines).encode("utf-8")
+    ).hexdigest()
+
+
 @handle_exclusively_decorator(
     key=lambda sd_client,
     gql_client,
+    engine,
     institution_identifier,
     cpr,
     employment_identifier,
@@ -822,8 +859,9 @@ async def fix_too_narrow_ou_validities(
     )
 )
 async def sync_engagement(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     gql_client: GraphQLClient,
+    engine: Engine,
     institution_identifier: str,
     cpr: str,
     employment_identifier: str,
@@ -833,9 +871,18 @@ async def sync_engagement(
     Sync the entire engagement and leave timelines for the given CPR and
     SD EmploymentIdentifier (corresponding to the MO engagement user_key).
 
+    If `settings.skip_unchanged_engagements` is set, the sync is skipped when
+    the SD timelines match the fingerprint persisted by the last successful
+    sync of the engagement, and the MO timelines match the fingerprint of the
+    MO timelines read back after it. Since the desired timelines depend on the
+    unit tree as well, the fingerprint is removed on org unit events for the
+    SD departments and MO units of the engagement (see
+    `delete_engagement_fingerprints`).
+
     Args:
         sd_client: The SD client
         gql_client: The GraphQL client
+        engine: The database engine used for the engagement fingerprints
         institution_identifier: The SD institution identifier
         cpr: The person CPR number
         employment_identifier: The SD EmploymentIdentifier
@@ -858,8 +905,7 @@ async def sync_engagement(
         return
 
     try:
-        r_employment = await asyncio.to_thread(
-            sd_client.get_employment_changed,
+        r_employment = await sd_client.get_employment_changed(
             GetEmploymentChangedRequest(
                 InstitutionIdentifier=institution_identifier,
                 PersonCivilRegistrationIdentifier=cpr,
@@ -932,11 +978,36 @@ async def sync_engagement(
         person=person.uuid,
         user_key=user_key,
     )
+    mo_leave_timeline = await get_mo_leave_timeline(
+        gql_client=gql_client,
+        person=person.uuid,
+        user_key=user_key,
+    )
+
+    sd_fingerprint = _fingerprint(sd_eng_timeline, sd_leave_timeline)
+    if settings.skip_unchanged_engagements:
+        fingerprint = await get_engagement_fingerprint(
+            engine, institution_identifier, cpr, employment_identifier
+        )
+        if (
+            fingerprint is not None
+            and fingerprint.sd_fingerprint == sd_fingerprint
+            and fingerprint.mo_fingerprint
+            == _fingerprint(mo_eng_timeline, mo_leave_timeline)
+        ):
+            logger.info(
+                "SD and MO timelines unchanged. Skipping engagement",
+                institution_identifier=institution_identifier,
+                cpr=cpr,
+                emp_id=employment_identifier,
+            )
+            return
 
     desired_eng_timeline = await engagement_ou_strategy(
         sd_client=sd_client,
         gql_client=gql_client,
         settings=settings,
+        institution_identifier=institution_identifier,
         person=person.uuid,
         user_key=user_key,
         sd_eng_timeline=sd_eng_timeline,
@@ -963,16 +1034,6 @@ async def sync_engagement(
         unknown_unit=settings.unknown_unit,
     )
 
-    mo_leave_timeline = await get_mo_leave_timeline(
-        gql_client=gql_client,
-        person=person.uuid,
-        user_key=prefix_eng_user_key(
-            settings.prefix_engagement_user_keys,
-            employment_identifier,
-            institution_identifier,
-        ),
-    )
-
     await _sync_eng_intervals(
         gql_client=gql_client,
         person=person.uuid,
@@ -1003,11 +1064,44 @@ async def sync_engagement(
         desired_eng_timeline=desired_eng_timeline,
     )
 
+    if settings.skip_unchanged_engagements:
+        # Read the timelines back from MO rather than fingerprinting the desired
+        # timelines, since MO only returns the validities where the engagement
+        # exists (e.g. not the SD intervals after the engagement has ended), so
+        # the next sync can compare the MO timelines it reads with these
+        mo_eng_timeline = await get_engagement_timeline(
+            gql_client=gql_client,
+            person=person.uuid,
+            user_key=user_key,
+        )
+        mo_leave_timeline = await get_mo_leave_timeline(
+            gql_client=gql_client,
+            person=person.uuid,
+            user_key=user_key,
+        )
+        await persist_engagement_fingerprint(
+            engine,
+            institution_identifier,
+            cpr,
+            employment_identifier,
+            sd_fingerprint=sd_fingerprint,
+            mo_fingerprint=_fingerprint(mo_eng_timeline, mo_leave_timeline),
+            # The SD departments and the MO units the engagement is placed in
+            org_unit_uuids={
+                interval.value  # type: ignore
+                for interval in chain(
+                    sd_eng_timeline.eng_unit.intervals,
+                    mo_eng_timeline.eng_unit.intervals,
+                )
+            },
+        )
+
 
 @handle_exclusively_decorator(
     key=lambda settings,
     sd_client,
     gql_client,
+    engine,
     institution_identifier,
     cpr,
     employment_identifier: (
@@ -1018,8 +1112,9 @@ async def sync_engagement(
 )
 async def sync_person_and_engagement(
     settings: SDToolPlusSettings,
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     gql_client: GraphQLClient,
+    engine: Engine,
     institution_identifier: str,
     cpr: str,
     employment_identifier: str | None,
@@ -1055,6 +1150,7 @@ async def sync_person_and_engagement(
         await sync_engagement(
             sd_client=sd_client,
             gql_client=gql_client,
+            engine=engine,
             institution_identifier=institution_identifier,
             cpr=cpr,
             employment_identifier=employment_identifier,
@@ -1,13 +1,10 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-from itertools import pairwise
 from uuid import UUID
 
 import structlog
-from more_itertools import one
 from more_itertools import only
 
-from sdtoolplus.autogenerated_graphql_client import ClassFilter
 from sdtoolplus.autogenerated_graphql_client import EmployeeFilter
 from sdtoolplus.autogenerated_graphql_client import LeaveFilter
 from sdtoolplus.config import SDToolPlusSettings
@@ -16,6 +13,7 @@ from sdtoolplus.exceptions import MoreThanOneEngagementError
 from sdtoolplus.exceptions import NoValueError
 from sdtoolplus.mo.timelines.engagement import get_engagement_filter
 from sdtoolplus.mo.timelines.leave import create_leave
+from sdtoolplus.mo.timelines.leave import get_leave_type
 from sdtoolplus.mo.timelines.leave import terminate_leave
 from sdtoolplus.mo.timelines.leave import update_leave
 from sdtoolplus.models import LeaveTimeline
@@ -45,15 +43,7 @@ async def _sync_leave_intervals(
         user_key=user_key,
     )
 
-    # Get the leave type (assuming for now that there is only one)
-    r_leave_type = await gql_client.get_class(ClassFilter(user_keys=["Orlov"]))
-    try:
-        leave_type = one(r_leave_type.objects).uuid
-    except ValueError as error:
-        logger.error(
-            "Not exactly on class found in MO", class_user_key="Orlov", error=error
-        )
-        raise error
+    leave_type = await get_leave_type(gql_client)
 
     # Get the corresponding engagement
     mo_eng = await gql_client.get_engagement_timeline(
@@ -67,19 +57,13 @@ async def _sync_leave_intervals(
         return
     eng_uuid = eng_obj.uuid
 
-    sd_interval_endpoints = sd_leave_timeline.get_interval_endpoints()
-    mo_interval_endpoints = mo_leave_timeline.get_interval_endpoints()
-
-    endpoints = sorted(sd_interval_endpoints.union(mo_interval_endpoints))
-    logger.info("List of endpoints", endpoints=endpoints)
+    segments = list(sd_leave_timeline.diff(mo_leave_timeline))
+    logger.info("List of changed segments", segments=segments)
 
-    for start, end in pairwise(endpoints):
+    for segment in segments:
+        start, end = segment.start, segment.end
         logger.info("Processing endpoint pair", start=start, end=end)
 
-        if sd_leave_timeline.equal_at(start, mo_leave_timeline):
-            logger.info("SD and MO equal")
-            continue
-
         try:
             is_active = sd_leave_timeline.leave_active.entity_at(start).value
         except NoValueError:
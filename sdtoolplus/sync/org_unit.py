@@ -1,11 +1,11 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
 from itertools import pairwise
 
 import structlog
 from fastramqpi.ramqp.depends import handle_exclusively_decorator
 from more_itertools import last
-from sdclient.client import SDClient
 from sdclient.responses import GetDepartmentResponse
 
 from sdtoolplus.autogenerated_graphql_client import OrganisationUnitFilter
@@ -38,6 +38,7 @@ from sdtoolplus.models import UnitPNumber
 from sdtoolplus.models import UnitPostalAddress
 from sdtoolplus.models import UnitTimeline
 from sdtoolplus.models import combine_intervals
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sd.timelines.address import sd_postal_address_strategy
 from sdtoolplus.sd.timelines.org_unit import get_department
 from sdtoolplus.sd.timelines.org_unit import get_department_timeline
@@ -138,19 +139,13 @@ async def sync_ou_intervals(
         priority=priority,
     )
 
-    sd_interval_endpoints = desired_unit_timeline.get_interval_endpoints()
-    mo_interval_endpoints = mo_unit_timeline.get_interval_endpoints()
+    segments = list(desired_unit_timeline.diff(mo_unit_timeline))
+    logger.info("List of changed segments", segments=segments)
 
-    endpoints = sorted(sd_interval_endpoints.union(mo_interval_endpoints))
-    logger.info("List of endpoints", endpoints=endpoints)
-
-    for start, end in pairwise(endpoints):
+    for segment in segments:
+        start, end = segment.start, segment.end
         logger.info("Processing endpoint pair", start=start, end=end)
 
-        if desired_unit_timeline.equal_at(start, mo_unit_timeline):
-            logger.info("SD and MO equal")
-            continue
-
         try:
             is_active = desired_unit_timeline.active.entity_at(start).value
         except NoValueError:
@@ -321,7 +316,7 @@ async def _sync_ou_phone_number(
     priority: org_unit
 )
 async def sync_ou(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     gql_client: GraphQLClient,
     institution_identifier: str,
     org_unit: OrgUnitUUID,
@@ -413,3 +408,70 @@ async def sync_ou(
 
     logger.info("Finished syncing OU addresses", org_unit=str(org_unit))
     logger.info("Finished syncing OU and its addresses!", org_unit=str(org_unit))
+
+
+async def sync_ous(
+    sd_client: AsyncSDClient,
+    gql_client: GraphQLClient,
+    institution_identifier: str,
+    org_units: dict[OrgUnitUUID, int],
+    parents: dict[OrgUnitUUID, OrgUnitUUID | None],
+    settings: SDToolPlusSettings,
+    max_concurrency: int,
+) -> set[OrgUnitUUID]:
+    """
+    Sync the given units concurrently while respecting the parent-child
+    dependencies between them, i.e. a unit is not synced before its nearest
+    ancestor (among the given units) has been processed. Units in different
+    branches of the tree are thus synced in parallel and a child only waits for
+    its own ancestor chain.
+
+    Args:
+        sd_client: the SD client
+        gql_client: the GraphQL client
+        institution_identifier: the SD institution identifier
+        org_units: mapping from the units to sync to their event priority, which
+          is used if the unit (or its parent/children) must be requeued
+        parents: mapping from a unit to its parent unit (see `get_sd_parent_map`)
+        settings: the SDToolPlus settings
+        max_concurrency: the maximum number of units to sync at the same time
+
+    Returns:
+        The units which could not be synced
+    """
+    processed = {org_unit: asyncio.Event() for org_unit in org_units}
+    semaphore = asyncio.Semaphore(max_concurrency)
+    failed: set[OrgUnitUUID] = set()
+
+    def nearest_ancestor(org_unit: OrgUnitUUID) -> OrgUnitUUID | None:
+        ancestor = parents.get(org_unit)
+        while ancestor is not None and ancestor not in processed:
+            ancestor = parents.get(ancestor)
+        return ancestor
+
+    async def _sync(org_unit: OrgUnitUUID, priority: int) -> None:
+        try:
+            ancestor = nearest_ancestor(org_unit)
+            if ancestor is not None:
+                await processed[ancestor].wait()
+            async with semaphore:
+                await sync_ou(
+                    sd_client=sd_client,
+                    gql_client=gql_client,
+                    institution_identifier=institution_identifier,
+                    org_unit=org_unit,
+                    settings=settings,
+                    priority=priority,
+                )
+        except Exception:
+            logger.exception("Could not sync OU", org_unit=str(org_unit))
+            failed.add(org_unit)
+        finally:
+            processed[org_unit].set()
+
+    await asyncio.gather(
+        *(_sync(org_unit, priority) for org_unit, priority in org_units.items())
+    )
+
+    logger.info("Finished syncing OUs", units=len(org_units), failed=len(failed))
+    return failed
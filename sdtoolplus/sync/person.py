@@ -11,7 +11,6 @@ from more_itertools import first
 from more_itertools import one
 from more_itertools import only
 from more_itertools import partition
-from sdclient.client import SDClient
 
 from sdtoolplus.autogenerated_graphql_client import AddressFilter
 from sdtoolplus.autogenerated_graphql_client import ClassFilter
@@ -34,6 +33,7 @@ from sdtoolplus.mo.timelines.engagement import get_engagement_filter
 from sdtoolplus.models import EngagementEmails
 from sdtoolplus.models import EngagementPhoneNumbers
 from sdtoolplus.models import Person
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sd.person import get_sd_person
 from sdtoolplus.sync.common import prefix_eng_user_key
 from sdtoolplus.sync.common import split_engagement_user_key
@@ -532,7 +532,7 @@ async def _sync_person(
     key=lambda sd_client, gql_client, institution_identifier, cpr: cpr
 )
 async def sync_person(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     gql_client: GraphQLClient,
     institution_identifier: str,
     cpr: str,
@@ -611,7 +611,7 @@ async def sync_person(
     )
 )
 async def sync_person_addresses(
-    sd_client: SDClient,
+    sd_client: AsyncSDClient,
     gql_client: GraphQLClient,
     settings: SDToolPlusSettings,
     institution_identifier: str,
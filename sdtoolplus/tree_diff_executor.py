@@ -3,6 +3,9 @@
 import abc
 import asyncio
 import datetime
+from collections import defaultdict
+from collections.abc import Iterable
+from itertools import groupby
 from typing import Any
 from typing import AsyncIterator
 
@@ -15,13 +18,19 @@ from gql.dsl import DSLType
 from gql.dsl import dsl_gql
 from gql.transport.exceptions import TransportQueryError
 from graphql import DocumentNode
+from more_itertools import first
 from ramodels.mo import Validity
-from sdclient.client import SDClient
 from sdclient.date_utils import sd_date_to_mo_date_str
 from sdclient.requests import GetDepartmentRequest
 
+from .autogenerated_graphql_client import GraphQLClientGraphQLMultiError
+from .autogenerated_graphql_client import OrganisationUnitCreateInput
+from .autogenerated_graphql_client import OrganisationUnitUpdateInput
+from .autogenerated_graphql_client import RAValidityInput
+from .checkpoint import CheckpointedTreeDiff
 from .config import TIMEZONE
 from .config import SDToolPlusSettings
+from .depends import GraphQLClient as AsyncGraphQLClient
 from .diff_org_trees import OrgTreeDiff
 from .filters import filter_by_uuid
 from .filters import remove_by_name
@@ -30,6 +39,8 @@ from .mo_class import MOClass
 from .mo_org_unit_importer import OrgUnitNode
 from .mo_org_unit_importer import OrgUnitUUID
 from .mo_org_unit_importer import OrgUUID
+from .sd.client import AsyncSDClient
+from .sd.client import get_sd_client
 
 V_DATE_OUTSIDE_ORG_UNIT_RANGE = "ErrorCodes.V_DATE_OUTSIDE_ORG_UNIT_RANGE"
 
@@ -111,6 +122,26 @@ class UpdateOrgUnitMutation(Mutation):
         result: dict = self._session.execute(self.gql)
         return OrgUnitUUID(result["org_unit_update"]["uuid"])
 
+    async def execute_async(self, gql_client: AsyncGraphQLClient) -> OrgUnitUUID:
+        mutation_input = self.dsl_mutation_input
+        logger.info("Updating org unit...", input=mutation_input)
+        # The validity dates are plain dates (see above), which the input model
+        # does not accept
+        validity = {
+            key: datetime.datetime.combine(
+                datetime.date.fromisoformat(value), datetime.time(), tzinfo=TIMEZONE
+            )
+            if value is not None
+            else None
+            for key, value in mutation_input["validity"].items()
+        }
+        result = await gql_client.update_org_unit(
+            OrganisationUnitUpdateInput.parse_obj(
+                {**mutation_input, "validity": validity}
+            )
+        )
+        return result.uuid
+
 
 class AddOrgUnitMutation(Mutation):
     def __init__(
@@ -154,29 +185,28 @@ class AddOrgUnitMutation(Mutation):
         result: dict = self._session.execute(self.gql)
         return OrgUnitUUID(result["org_unit_create"]["uuid"])
 
+    async def execute_async(self, gql_client: AsyncGraphQLClient) -> OrgUnitUUID:
+        logger.info("Creating org unit...", input=self.dsl_mutation_input)
+        result = await gql_client.create_org_unit(
+            OrganisationUnitCreateInput.parse_obj(self.dsl_mutation_input)
+        )
+        return result.uuid
+
 
 AnyMutation = AddOrgUnitMutation | UpdateOrgUnitMutation
 
 
-async def _fix_parent_unit_validity(
-    mo_client: PersistentGraphQLClient,
-    sd_client: SDClient,
+async def _get_parent_unit_validity(
+    sd_client: AsyncSDClient,
     settings: SDToolPlusSettings,
     current_inst_id: str,
     org_unit_node: OrgUnitNode,
-) -> None:
-    if org_unit_node.parent is None:
-        logger.warning("Parent is None. No-op")
-        return
-
-    logger.info(
-        "Fixing validity for parent unit",
-        unit=str(org_unit_node.uuid),
-        parent=str(org_unit_node.parent.uuid),
-    )
-
-    r_get_department = await asyncio.to_thread(
-        sd_client.get_department,
+) -> tuple[datetime.date, datetime.date]:
+    """
+    Get the validity (start and end date) the parent of the unit must have in
+    MO in order to cover the validity of the unit.
+    """
+    r_get_department = await sd_client.get_department(
         GetDepartmentRequest(
             InstitutionIdentifier=current_inst_id,
             DepartmentUUIDIdentifier=org_unit_node.parent.uuid,
@@ -205,6 +235,29 @@ async def _fix_parent_unit_validity(
         start_date=start_date,
         end_date=end_date,
     )
+    return start_date, end_date
+
+
+async def _fix_parent_unit_validity(
+    mo_client: PersistentGraphQLClient,
+    sd_client: AsyncSDClient,
+    settings: SDToolPlusSettings,
+    current_inst_id: str,
+    org_unit_node: OrgUnitNode,
+) -> None:
+    if org_unit_node.parent is None:
+        logger.warning("Parent is None. No-op")
+        return
+
+    logger.info(
+        "Fixing validity for parent unit",
+        unit=str(org_unit_node.uuid),
+        parent=str(org_unit_node.parent.uuid),
+    )
+
+    start_date, end_date = await _get_parent_unit_validity(
+        sd_client, settings, current_inst_id, org_unit_node
+    )
 
     try:
         mo_client.execute(
@@ -245,6 +298,58 @@ async def _fix_parent_unit_validity(
             raise error
 
 
+async def _fix_parent_unit_validity_async(
+    gql_client: AsyncGraphQLClient,
+    sd_client: AsyncSDClient,
+    settings: SDToolPlusSettings,
+    current_inst_id: str,
+    org_unit_node: OrgUnitNode,
+) -> None:
+    """
+    Same as `_fix_parent_unit_validity`, but the parent is updated with the
+    async GraphQL client.
+    """
+    if org_unit_node.parent is None:
+        logger.warning("Parent is None. No-op")
+        return
+
+    logger.info(
+        "Fixing validity for parent unit",
+        unit=str(org_unit_node.uuid),
+        parent=str(org_unit_node.parent.uuid),
+    )
+
+    start_date, end_date = await _get_parent_unit_validity(
+        sd_client, settings, current_inst_id, org_unit_node
+    )
+
+    try:
+        await gql_client.update_org_unit(
+            OrganisationUnitUpdateInput(
+                uuid=org_unit_node.parent.uuid,
+                validity=RAValidityInput(
+                    from_=datetime.datetime.combine(
+                        start_date, datetime.time(), tzinfo=TIMEZONE
+                    ),
+                    to=datetime.datetime.combine(
+                        end_date, datetime.time(), tzinfo=TIMEZONE
+                    )
+                    # SD uses 9999-12-31 for "infinity"
+                    if sd_date_to_mo_date_str(end_date) is not None
+                    else None,
+                ),
+            )
+        )
+    except GraphQLClientGraphQLMultiError as error:
+        # See the TODO in _fix_parent_unit_validity
+        if V_DATE_OUTSIDE_ORG_UNIT_RANGE in str(error):
+            await _fix_parent_unit_validity_async(
+                gql_client, sd_client, settings, current_inst_id, org_unit_node.parent
+            )
+        else:
+            raise error
+
+
 def _truncate_start_date(
     org_unit_node: OrgUnitNode, min_start_date: datetime.datetime
 ) -> None:
@@ -263,28 +368,65 @@ def _truncate_start_date(
     )
 
 
+def _group_by_depth(units: Iterable[OrgUnitNode]) -> list[list[OrgUnitNode]]:
+    """
+    Group the units by their depth in the tree. The groups are sorted by depth
+    and the units within a group keep their original order.
+
+    Args:
+        units: the units to group
+
+    Returns:
+        The units grouped by depth, starting with the units closest to the root
+    """
+    by_depth = sorted(units, key=lambda unit: unit.depth)
+    return [list(level) for _, level in groupby(by_depth, key=lambda u: u.depth)]
+
+
+def _raise_first_error(results: Iterable[object]) -> None:
+    """
+    Raise the first exception (if any) among the results of an
+    `asyncio.gather(..., return_exceptions=True)` call.
+
+    Args:
+        results: the results of the gather call
+    """
+    error = first(
+        (result for result in results if isinstance(result, BaseException)),
+        default=None,
+    )
+    if error is not None:
+        raise error
+
+
 class TreeDiffExecutor:
     def __init__(
         self,
         session: PersistentGraphQLClient,
         settings: SDToolPlusSettings,
         current_inst_id: str,
-        tree_diff: OrgTreeDiff,
+        tree_diff: OrgTreeDiff | CheckpointedTreeDiff,
         mo_org_unit_type: MOClass,
         mo_org_uuid: OrgUUID,
+        gql_client: AsyncGraphQLClient | None = None,
+        sd_client: AsyncSDClient | None = None,
     ):
         self._session = session
+        self._gql_client = gql_client
+        self._sd_client = (
+            sd_client if sd_client is not None else get_sd_client(settings)
+        )
+        # Serialises the fixes of the parent validities per parent (see
+        # _add_unit_async)
+        self._parent_fix_locks: defaultdict[OrgUnitUUID, asyncio.Lock] = defaultdict(
+            asyncio.Lock
+        )
         self.settings = settings
         self.current_inst_id = current_inst_id
         self._tree_diff = tree_diff
         self.mo_org_unit_type = mo_org_unit_type
         self.mo_org_uuid = mo_org_uuid
 
-        self.sd_client = SDClient(
-            self.settings.sd_username,
-            self.settings.sd_password.get_secret_value(),
-        )
-
         logger.info(
             "Regexs for units to remove by name",
             regexs=self.settings.regex_unit_names_to_remove,
@@ -304,7 +446,7 @@ class TreeDiffExecutor:
             if V_DATE_OUTSIDE_ORG_UNIT_RANGE in str(error):
                 await _fix_parent_unit_validity(
                     self._session,
-                    self.sd_client,
+                    self._sd_client,
                     self.settings,
                     self.current_inst_id,
                     unit,
@@ -314,15 +456,76 @@ class TreeDiffExecutor:
             result = add_mutation.execute()
         return result
 
+    async def _add_unit_async(
+        self, add_mutation: AddOrgUnitMutation, unit: OrgUnitNode
+    ) -> OrgUnitUUID:
+        """
+        Same as `_add_unit`, but the unit is created with the async GraphQL
+        client. The fixes of the validity of a parent are serialised, such that
+        siblings created concurrently do not update the same parent at the
+        same time.
+        """
+        assert self._gql_client is not None
+        try:
+            return await add_mutation.execute_async(self._gql_client)
+        except GraphQLClientGraphQLMultiError as error:
+            if not (
+                self.settings.extend_parent_validities
+                and V_DATE_OUTSIDE_ORG_UNIT_RANGE in str(error)
+            ):
+                raise error
+        logger.warning(
+            "Date outside org unit range",
+            unit_uuid=str(unit.uuid),
+            parent_uuid=str(unit.parent.uuid),
+        )
+        async with self._parent_fix_locks[unit.parent.uuid]:
+            # A sibling may have fixed the parent validity while we were waiting
+            try:
+                return await add_mutation.execute_async(self._gql_client)
+            except GraphQLClientGraphQLMultiError as error:
+                if V_DATE_OUTSIDE_ORG_UNIT_RANGE not in str(error):
+                    raise error
+            await _fix_parent_unit_validity_async(
+                self._gql_client,
+                self._sd_client,
+                self.settings,
+                self.current_inst_id,
+                unit,
+            )
+            return await add_mutation.execute_async(self._gql_client)
+
+    def get_units_to_add(self, org_unit: OrgUnitUUID | None) -> list[OrgUnitNode]:
+        units_to_add = filter_by_uuid(org_unit, self._tree_diff.get_units_to_add())
+        return list(
+            remove_by_name(self.settings.regex_unit_names_to_remove, units_to_add)
+        )
+
+    def get_units_to_update(self, org_unit: OrgUnitUUID | None) -> list[OrgUnitNode]:
+        units_to_update = filter_by_uuid(
+            org_unit, self._tree_diff.get_units_to_update()
+        )
+        if self.settings.apply_name_filter_on_update:
+            units_to_update = remove_by_name(
+                self.settings.regex_unit_names_to_remove, units_to_update
+            )
+        return list(units_to_update)
+
     async def execute(
         self, org_unit: OrgUnitUUID | None = None, dry_run: bool = False
     ) -> AsyncIterator[tuple[OrgUnitNode, AnyMutation, OrgUnitUUID]]:
+        if (
+            self._gql_client is not None
+            and self.settings.tree_diff_executor_concurrency > 1
+        ):
+            async for unit, mutation, result in self._execute_by_level(
+                org_unit, dry_run
+            ):
+                yield unit, mutation, result
+            return
+
         # Add new units first
-        units_to_add = filter_by_uuid(org_unit, self._tree_diff.get_units_to_add())
-        units_to_add = remove_by_name(
-            self.settings.regex_unit_names_to_remove, units_to_add
-        )
-        for unit in units_to_add:
+        for unit in self.get_units_to_add(org_unit):
             logger.info(
                 "Add unit",
                 unit=str(unit.uuid),
@@ -350,14 +553,7 @@ class TreeDiffExecutor:
             yield unit, add_mutation, result
 
         # ... and then update modified units (name or parent changed)
-        units_to_update = filter_by_uuid(
-            org_unit, self._tree_diff.get_units_to_update()
-        )
-        if self.settings.apply_name_filter_on_update:
-            units_to_update = remove_by_name(
-                self.settings.regex_unit_names_to_remove, units_to_update
-            )
-        for unit in units_to_update:
+        for unit in self.get_units_to_update(org_unit):
             logger.info("Update unit", unit=str(unit.uuid), name=unit.name)
             update_mutation = UpdateOrgUnitMutation(
                 self._session, unit, self.mo_org_uuid
@@ -367,3 +563,80 @@ class TreeDiffExecutor:
             else:
                 result = unit.uuid
             yield unit, update_mutation, result
+
+    async def _execute_by_level(
+        self, org_unit: OrgUnitUUID | None, dry_run: bool
+    ) -> AsyncIterator[tuple[OrgUnitNode, AnyMutation, OrgUnitUUID]]:
+        """
+        Concurrent version of `execute`. The units to add and the units to
+        update are grouped by their depth in the tree and the levels are
+        processed one at a time (starting from the root), such that a parent is
+        always created before its children. The mutations of the units within
+        a level are sent to MO concurrently (at most
+        `tree_diff_executor_concurrency` at a time) with the async GraphQL
+        client.
+
+        The results are yielded level by level and in the original order
+        within each level, i.e. the order is deterministic. If any mutation of
+        a level fails, the successful mutations of the level are still yielded
+        before the first error is raised (and the remaining levels are not
+        processed).
+        """
+        assert self._gql_client is not None
+        semaphore = asyncio.Semaphore(self.settings.tree_diff_executor_concurrency)
+
+        async def add(mutation: AddOrgUnitMutation) -> OrgUnitUUID:
+            unit = mutation.org_unit_node
+            if dry_run:
+                return unit.uuid
+            async with semaphore:
+                return await self._add_unit_async(mutation, unit)
+
+        async def update(mutation: UpdateOrgUnitMutation) -> OrgUnitUUID:
+            if dry_run:
+                return mutation.org_unit_node.uuid
+            assert self._gql_client is not None
+            async with semaphore:
+                return await mutation.execute_async(self._gql_client)
+
+        # Add new units first
+        for level in _group_by_depth(self.get_units_to_add(org_unit)):
+            add_mutations = []
+            for unit in level:
+                logger.info(
+                    "Add unit",
+                    unit=str(unit.uuid),
+                    name=unit.name,
+                    parent=str(unit.parent.uuid),
+                )
+                _truncate_start_date(unit, self.settings.min_mo_datetime)
+                add_mutations.append(
+                    AddOrgUnitMutation(
+                        self._session, unit, self.mo_org_unit_type, self.mo_org_uuid
+                    )
+                )
+            add_results = await asyncio.gather(
+                *(add(m) for m in add_mutations), return_exceptions=True
+            )
+            for unit, add_mutation, result in zip(level, add_mutations, add_results):
+                if not isinstance(result, BaseException):
+                    yield unit, add_mutation, result
+            _raise_first_error(add_results)
+
+        # ... and then update modified units (name or parent changed)
+        for level in _group_by_depth(self.get_units_to_update(org_unit)):
+            update_mutations = []
+            for unit in level:
+                logger.info("Update unit", unit=str(unit.uuid), name=unit.name)
+                update_mutations.append(
+                    UpdateOrgUnitMutation(self._session, unit, self.mo_org_uuid)
+                )
+            update_results = await asyncio.gather(
+                *(update(m) for m in update_mutations), return_exceptions=True
+            )
+            for unit, update_mutation, result in zip(
+                level, update_mutations, update_results
+            ):
+                if not isinstance(result, BaseException):
+                    yield unit, update_mutation, result
+            _raise_first_error(update_results)
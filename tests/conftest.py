@@ -20,8 +20,12 @@ from sdclient.responses import DepartmentParent
 from sdclient.responses import GetDepartmentParentResponse
 from sdclient.responses import GetDepartmentResponse
 from sdclient.responses import GetOrganizationResponse
+from sqlalchemy import Engine
+from sqlalchemy import StaticPool
+from sqlalchemy import create_engine
 
 from sdtoolplus.config import SDToolPlusSettings
+from sdtoolplus.db.models import Base
 from sdtoolplus.diff_org_trees import OrgTreeDiff
 from sdtoolplus.mo_class import MOClass
 from sdtoolplus.mo_class import MOOrgUnitLevelMap
@@ -129,7 +133,8 @@ class _MockGraphQLSession:
             "org_units": {
                 "objects": [
                     {"current": elem} for elem in self.tree_as_flat_list_of_dicts
-                ]
+                ],
+                "page_info": {"next_cursor": None},
             }
         }
 
@@ -729,7 +734,7 @@ def mock_mo_org_tree_import_subtree_case(
     )
 
     mo_org_tree_import = MOOrgTreeImport(mock_graphql_session)
-    mo_org_tree_import._build_trees = lambda org_units: [mo_root_sub]  # type: ignore
+    mo_org_tree_import.build_trees = lambda org_units: [mo_root_sub]  # type: ignore
 
     return mo_org_tree_import
 
@@ -1066,3 +1071,16 @@ def random_org_unit_node(sd_expected_validity) -> OrgUnitNode:
         org_unit_level_uuid=uuid.uuid4(),
         validity=sd_expected_validity,
     )
+
+
+@pytest.fixture
+def sqlite_engine() -> Engine:
+    # The RunDB operations run in worker threads, so all threads must share the
+    # same connection to the in-memory database
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    return engine
@@ -15,14 +15,11 @@ from more_itertools import one
 from pytest import MonkeyPatch
 from sdclient.responses import GetDepartmentResponse
 from sdclient.responses import GetOrganizationResponse
-from sqlalchemy import Engine
-from sqlalchemy import create_engine
 
 from sdtoolplus.autogenerated_graphql_client import ClassFilter
 from sdtoolplus.autogenerated_graphql_client import FacetFilter
 from sdtoolplus.autogenerated_graphql_client import GraphQLClient
 from sdtoolplus.autogenerated_graphql_client import TestingCreateOrgUnitOrgUnitCreate
-from sdtoolplus.db.models import Base
 from sdtoolplus.main import create_app
 from sdtoolplus.mo_org_unit_importer import OrgUnitLevelUUID
 from sdtoolplus.mo_org_unit_importer import OrgUnitTypeUUID
@@ -49,13 +46,6 @@ async def graphql_client(mo_client: AsyncClient) -> AsyncIterator[GraphQLClient]
         yield client
 
 
-@pytest.fixture
-def sqlite_engine() -> Engine:
-    engine = create_engine("sqlite:///:memory:")
-    Base.metadata.create_all(engine)
-    return engine
-
-
 @pytest.fixture
 async def org_unit_type(graphql_client: GraphQLClient) -> uuid.UUID:
     r_org_unit_types = await graphql_client.get_class(
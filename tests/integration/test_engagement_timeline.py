@@ -4,6 +4,7 @@ import json
 from datetime import date
 from datetime import datetime
 from datetime import timedelta
+from unittest.mock import patch
 from uuid import UUID
 from uuid import uuid4
 from zoneinfo import ZoneInfo
@@ -51,6 +52,7 @@ from sdtoolplus.models import EngagementUnit
 from sdtoolplus.models import EngagementUnitId
 from sdtoolplus.models import EngType
 from sdtoolplus.models import Timeline
+from sdtoolplus.sync.engagement import engagement_ou_strategy
 from sdtoolplus.types import CPRNumber
 from tests.integration.conftest import UNKNOWN_UNIT
 
@@ -957,6 +959,166 @@ async def test_eng_timeline_create_new_engagement(
     assert interval_4.engagement_type_uuid == eng_types[EngType.MONTHLY_FULL_TIME]
 
 
+@pytest.mark.integration_test
+@pytest.mark.envvar(
+    {
+        "APPLY_NY_LOGIC": "false",
+        "UNKNOWN_UNIT": str(UNKNOWN_UNIT),
+        "SKIP_UNCHANGED_ENGAGEMENTS": "true",
+    }
+)
+async def test_eng_timeline_skip_unchanged_ended_engagement(
+    test_client: AsyncClient,
+    graphql_client: GraphQLClient,
+    base_tree_builder: TestingCreateOrgUnitOrgUnitCreate,
+    job_function_9000: UUID,
+    respx_mock: MockRouter,
+):
+    """
+    We are testing this scenario:
+
+    Time  --------t1-----------------------t5--------------------------------------->
+
+    SD (name)     |------------------------ name1 -----------------------------------
+    SD (key)      |------------------------ 9000 ------------------------------------
+    SD (unit)     |------------------------ dep1 ------------------------------------
+    SD (active)   |------------1------------|----------------8-----------------------
+
+    MO (active)   |------------1------------|
+
+    The SD timelines cover the period after the engagement has ended, whereas MO
+    only has the active period, so the second sync must compare with the MO
+    timelines read back after the first sync in order to skip the engagement.
+    """
+    # Arrange
+    tz = ZoneInfo("Europe/Copenhagen")
+
+    t1 = datetime(2001, 1, 1, tzinfo=tz)
+    t5 = datetime(2005, 1, 1, tzinfo=tz)
+
+    dep1_uuid = UUID("10000000-0000-0000-0000-000000000000")
+
+    person_uuid = uuid4()
+    cpr = "0101011234"
+    emp_id = "12345"
+
+    await graphql_client.create_person(
+        EmployeeCreateInput(
+            uuid=person_uuid,
+            cpr_number=CPRNumber(cpr),
+            given_name="Chuck",
+            surname="Norris",
+        )
+    )
+
+    sd_resp = f"""<?xml version="1.0" encoding="UTF-8"?>
+        <GetEmploymentChanged20111201 creationDateTime="2025-03-10T13:50:06">
+          <RequestStructure>
+            <InstitutionIdentifier>II</InstitutionIdentifier>
+            <PersonCivilRegistrationIdentifier>0101011234</PersonCivilRegistrationIdentifier>
+            <ActivationDate>2001-01-01</ActivationDate>
+            <DeactivationDate>9999-12-31</DeactivationDate>
+            <DepartmentIndicator>true</DepartmentIndicator>
+            <EmploymentStatusIndicator>true</EmploymentStatusIndicator>
+            <ProfessionIndicator>true</ProfessionIndicator>
+            <SalaryAgreementIndicator>false</SalaryAgreementIndicator>
+            <SalaryCodeGroupIndicator>false</SalaryCodeGroupIndicator>
+            <WorkingTimeIndicator>false</WorkingTimeIndicator>
+            <UUIDIndicator>true</UUIDIndicator>
+          </RequestStructure>
+          <Person>
+            <PersonCivilRegistrationIdentifier>0101011234</PersonCivilRegistrationIdentifier>
+            <Employment>
+              <EmploymentIdentifier>{emp_id}</EmploymentIdentifier>
+              <EmploymentDate>2001-01-01</EmploymentDate>
+              <AnniversaryDate>2001-01-01</AnniversaryDate>
+              <EmploymentDepartment>
+                <ActivationDate>2001-01-01</ActivationDate>
+                <DeactivationDate>9999-12-31</DeactivationDate>
+                <DepartmentIdentifier>dep1</DepartmentIdentifier>
+                <DepartmentUUIDIdentifier>{str(dep1_uuid)}</DepartmentUUIDIdentifier>
+              </EmploymentDepartment>
+              <Profession>
+                <ActivationDate>2001-01-01</ActivationDate>
+                <DeactivationDate>9999-12-31</DeactivationDate>
+                <JobPositionIdentifier>9000</JobPositionIdentifier>
+                <EmploymentName>name1</EmploymentName>
+                <AppointmentCode>0</AppointmentCode>
+              </Profession>
+              <EmploymentStatus>
+                <ActivationDate>2001-01-01</ActivationDate>
+                <DeactivationDate>2004-12-31</DeactivationDate>
+                <EmploymentStatusCode>1</EmploymentStatusCode>
+              </EmploymentStatus>
+              <EmploymentStatus>
+                <ActivationDate>2005-01-01</ActivationDate>
+                <DeactivationDate>9999-12-31</DeactivationDate>
+                <EmploymentStatusCode>8</EmploymentStatusCode>
+              </EmploymentStatus>
+              <WorkingTime>
+                <ActivationDate>2001-01-01</ActivationDate>
+                <DeactivationDate>9999-12-31</DeactivationDate>
+                <OccupationRate>1.0000</OccupationRate>
+                <SalaryRate>1.0000</SalaryRate>
+                <SalariedIndicator>true</SalariedIndicator>
+                <FullTimeIndicator>true</FullTimeIndicator>
+              </WorkingTime>
+            </Employment>
+          </Person>
+        </GetEmploymentChanged20111201>
+    """
+
+    respx_mock.get(GET_PERSON_URL).respond(
+        content_type="text/xml;charset=UTF-8",
+        content=GET_PERSON_SD_RESP,
+    )
+    respx_mock.get(
+        "https://service.sd.dk/sdws/GetEmploymentChanged20111201?InstitutionIdentifier=II&PersonCivilRegistrationIdentifier=0101011234&EmploymentIdentifier=12345&ActivationDate=01.01.0001&DeactivationDate=31.12.9999&DepartmentIndicator=True&EmploymentStatusIndicator=True&ProfessionIndicator=True&SalaryAgreementIndicator=False&SalaryCodeGroupIndicator=False&WorkingTimeIndicator=True&UUIDIndicator=True"
+    ).respond(
+        content_type="text/xml;charset=UTF-8",
+        content=sd_resp,
+    )
+
+    async def sync() -> None:
+        r = await test_client.post(
+            "/events/sd/person-and-employment",
+            json={
+                "subject": json.dumps(
+                    {
+                        "institution_identifier": "II",
+                        "cpr": cpr,
+                        "employment_identifier": emp_id,
+                    }
+                ),
+                "priority": 9000,
+            },
+        )
+        assert r.status_code == 200
+
+    # Act
+    with patch(
+        "sdtoolplus.sync.engagement.engagement_ou_strategy",
+        wraps=engagement_ou_strategy,
+    ) as mock_engagement_ou_strategy:
+        await sync()
+        await sync()
+
+    # Assert
+    # The OU strategy is only applied by the first sync
+    mock_engagement_ou_strategy.assert_awaited_once()
+
+    updated_eng = await graphql_client.get_engagement_timeline(
+        get_engagement_filter(
+            person=person_uuid, user_key=emp_id, from_date=None, to_date=None
+        )
+    )
+    validity = one(one(updated_eng.objects).validities)
+    assert validity.validity.from_ == t1
+    assert mo_end_to_timeline_end(validity.validity.to) == t5
+    assert validity.org_unit_uuid == dep1_uuid
+    assert validity.job_function_uuid == job_function_9000
+
+
 @pytest.mark.integration_test
 @pytest.mark.envvar(
     {
@@ -31,7 +31,7 @@ from sdtoolplus.autogenerated_graphql_client import OrganisationUnitFilter
 from sdtoolplus.autogenerated_graphql_client import RAValidityInput
 from sdtoolplus.autogenerated_graphql_client import TestingCreateOrgUnitOrgUnitCreate
 from sdtoolplus.depends import GraphQLClient
-from sdtoolplus.events import process_sd_amqp_employment_event
+from sdtoolplus.events import employment_amqp_event_to_graphql_event
 from sdtoolplus.events import sd_api_open
 from sdtoolplus.mo.timelines.common import get_class
 from sdtoolplus.mo.timelines.common import mo_end_to_timeline_end
@@ -655,7 +655,7 @@ async def test_retry_after_when_sd_api_is_closed(
         ),
     ],
 )
-async def test_process_sd_amqp_employment_event(
+def test_employment_amqp_event_to_graphql_event(
     event_type: str,
     expected: EventSendInput,
 ) -> None:
@@ -675,13 +675,11 @@ async def test_process_sd_amqp_employment_event(
     message = MagicMock()
     message.body = message_bytes
 
-    mock_gql_client = AsyncMock()
-
     # Act
-    await process_sd_amqp_employment_event(message, mock_gql_client)
+    event = employment_amqp_event_to_graphql_event(message)
 
     # Assert
-    mock_gql_client.send_event.assert_awaited_once_with(input=expected)
+    assert event == expected
 
 
 @pytest.mark.envvar(
@@ -221,7 +221,10 @@ class TestFastAPIApp:
             True,
             True,
             False,
-            [{"namespace": "mo", "routing_key": "engagement"}],
+            [
+                {"namespace": "mo", "routing_key": "engagement"},
+                {"namespace": "mo", "routing_key": "class"},
+            ],
         ),
         (
             True,
@@ -251,6 +254,7 @@ class TestFastAPIApp:
                 {"namespace": "mo", "routing_key": "org_unit"},
                 {"namespace": "mo", "routing_key": "person"},
                 {"namespace": "mo", "routing_key": "engagement"},
+                {"namespace": "mo", "routing_key": "class"},
             ],
         ),
     ],
@@ -295,3 +299,30 @@ def test__configure_listeners(
     ]
 
     assert listeners_dicts == expected
+
+
+def test__configure_listeners_parallelism(
+    sdtoolplus_settings: SDToolPlusSettings,
+) -> None:
+    # Arrange
+    settings = sdtoolplus_settings.dict()
+    settings.update(
+        {
+            "event_based_sync": True,
+            "sd_person_engagement_events_parallelism": 5,
+            "mo_engagement_events_parallelism": 3,
+        }
+    )
+
+    # Act
+    listeners = _configure_listeners(SDToolPlusSettings.parse_obj(settings))
+
+    # Assert
+    parallelism = {
+        (listener.namespace, listener.routing_key): listener.parallelism
+        for listener in listeners
+    }
+    assert parallelism[("sd", "person-and-employment")] == 5
+    assert parallelism[("mo", "engagement")] == 3
+    assert parallelism[("sd", "org")] == 1
+    assert parallelism[("mo", "org_unit")] == 1
@@ -0,0 +1,93 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+
+from sdtoolplus.autogenerated_graphql_client import EventSendInput
+from sdtoolplus.mo.event_publisher import EventPublisher
+
+
+def _get_event(i: int) -> EventSendInput:
+    return EventSendInput(namespace="sd", routing_key="org", subject=str(i))
+
+
+async def test_event_publisher_sends_batches() -> None:
+    # Arrange
+    gql_client = MagicMock(execute=AsyncMock())
+    events = [_get_event(i) for i in range(250)]
+
+    # Act
+    async with EventPublisher(gql_client, batch_size=100, concurrency=2) as publisher:
+        for event in events:
+            await publisher.publish(event)
+
+    # Assert
+    assert publisher.sent == 250
+    calls = gql_client.execute.await_args_list
+    assert [len(call.kwargs["variables"]) for call in calls] == [100, 100, 50]
+    assert calls[2].kwargs["query"] == (
+        "mutation SendEvents("
+        + ", ".join(f"$input{i}: EventSendInput!" for i in range(50))
+        + ") {\n"
+        + "\n".join(f"e{i}: event_send(input: $input{i})" for i in range(50))
+        + "\n}"
+    )
+    sent_events = [
+        event for call in calls for event in call.kwargs["variables"].values()
+    ]
+    assert sent_events == events
+
+
+async def test_event_publisher_back_pressure() -> None:
+    # Arrange
+    release = asyncio.Event()
+    in_flight = 0
+    max_in_flight = 0
+
+    async def execute(query, variables):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await release.wait()
+        in_flight -= 1
+
+    gql_client = MagicMock(execute=execute)
+    publisher = EventPublisher(gql_client, batch_size=1, concurrency=2)
+
+    # Act
+    await publisher.publish(_get_event(0))
+    await publisher.publish(_get_event(1))
+    blocked = asyncio.create_task(publisher.publish(_get_event(2)))
+    await asyncio.sleep(0)
+
+    # Assert: the third publish waits until a request completes
+    assert not blocked.done()
+
+    release.set()
+    await blocked
+    await publisher.flush()
+    assert publisher.sent == 3
+    assert max_in_flight == 2
+
+
+async def test_event_publisher_raises_error_on_flush() -> None:
+    # Arrange
+    gql_client = MagicMock(
+        execute=AsyncMock(side_effect=[ValueError("MO is down"), MagicMock()])
+    )
+    publisher = EventPublisher(gql_client, batch_size=1, concurrency=1)
+
+    # Act
+    await publisher.publish(_get_event(0))
+    with pytest.raises(ValueError):
+        await publisher.flush()
+
+    # The publisher can still be used after a failed request
+    await publisher.publish(_get_event(1))
+    await publisher.flush()
+
+    # Assert
+    assert publisher.sent == 1
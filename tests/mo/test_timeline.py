@@ -1,17 +1,39 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
 from datetime import datetime
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+from uuid import uuid4
 from zoneinfo import ZoneInfo
 
 import pytest
 from pydantic import parse_obj_as
 
+from sdtoolplus.autogenerated_graphql_client import GetClassClasses
+from sdtoolplus.autogenerated_graphql_client import GetEngagementTimelineEngagements
+from sdtoolplus.autogenerated_graphql_client import GetRelatedUnitsRelatedUnits
 from sdtoolplus.autogenerated_graphql_client import GetRelatedUnitsRelatedUnitsObjects
 from sdtoolplus.autogenerated_graphql_client import RAValidityInput
+from sdtoolplus.mo.timelines.common import clear_mo_class_cache
+from sdtoolplus.mo.timelines.common import get_class
 from sdtoolplus.mo.timelines.common import get_patch_validity
+from sdtoolplus.mo.timelines.engagement import EngagementMutationBatch
 from sdtoolplus.mo.timelines.related_unit import _get_mo_objects_endpoints
 from sdtoolplus.mo.timelines.related_unit import _get_related_unit_at
+from sdtoolplus.mo.timelines.related_unit import clear_related_unit_cache
+from sdtoolplus.mo.timelines.related_unit import related_units
 from sdtoolplus.mo_org_unit_importer import OrgUnitUUID
+from sdtoolplus.models import Active
+from sdtoolplus.models import EngagementKey
+from sdtoolplus.models import EngagementName
+from sdtoolplus.models import EngagementSDUnit
+from sdtoolplus.models import EngagementTimeline
+from sdtoolplus.models import EngagementType
+from sdtoolplus.models import EngagementUnit
+from sdtoolplus.models import EngagementUnitId
+from sdtoolplus.models import EngType
+from sdtoolplus.models import Timeline
 
 TZ = ZoneInfo("Europe/Copenhagen")
 
@@ -208,3 +230,187 @@ def test__get_related_unit_at(
 
     # Arrange
     assert related_unit == expected_related_unit
+
+
+async def test_get_class_is_cached_until_cleared():
+    # Arrange
+    class_uuid = uuid4()
+    mock_gql_client = AsyncMock()
+    mock_gql_client.get_class.return_value = parse_obj_as(
+        GetClassClasses,
+        {
+            "objects": [
+                {
+                    "uuid": str(class_uuid),
+                    "current": {
+                        "uuid": str(class_uuid),
+                        "user_key": "Enhed",
+                        "name": "Enhed",
+                        "scope": None,
+                        "parent": None,
+                        "validity": {"from": "2001-01-01T00:00:00+01:00", "to": None},
+                    },
+                }
+            ]
+        },
+    )
+
+    # Act
+    uuid1 = await get_class(mock_gql_client, "org_unit_type", "Enhed")
+    uuid2 = await get_class(mock_gql_client, "org_unit_type", "Enhed")
+    clear_mo_class_cache()
+    uuid3 = await get_class(mock_gql_client, "org_unit_type", "Enhed")
+
+    # Assert
+    assert uuid1 == uuid2 == uuid3 == class_uuid
+    assert mock_gql_client.get_class.await_count == 2
+
+
+async def test_related_units_is_cached_until_cleared():
+    # Arrange
+    t3 = datetime(2003, 1, 1, tzinfo=TZ)
+    t3_5 = datetime(2003, 7, 1, tzinfo=TZ)
+    t5 = datetime(2005, 1, 1, tzinfo=TZ)
+    unit_uuid = OrgUnitUUID("30000000-0000-0000-0000-000000000000")
+    unknown_unit_uuid = uuid4()
+    mock_gql_client = AsyncMock()
+    mock_gql_client.get_related_units.return_value = parse_obj_as(
+        GetRelatedUnitsRelatedUnits, {"objects": RELATED_OBJECTS_RAW}
+    )
+
+    async def get_related_units(start: datetime) -> list[EngagementUnit]:
+        return await related_units(
+            mock_gql_client,
+            unit_uuid,
+            start,
+            t5,
+            unknown_unit_uuid,
+            recursive_lookup=True,
+            cache=True,
+        )
+
+    # Act
+    units1 = await get_related_units(t3)
+    units2 = await get_related_units(t3_5)
+    clear_related_unit_cache()
+    units3 = await get_related_units(t3)
+
+    # Assert
+    ccc_uuid = OrgUnitUUID("cccccccc-2a66-429e-8893-cccccccccccc")
+    t4 = datetime(2004, 1, 1, tzinfo=TZ)
+    assert (
+        units1
+        == units3
+        == [
+            EngagementUnit(start=t3, end=t4, value=ccc_uuid),
+            EngagementUnit(start=t4, end=t5, value=ccc_uuid),
+        ]
+    )
+    assert units2 == [
+        EngagementUnit(start=t3_5, end=t4, value=ccc_uuid),
+        EngagementUnit(start=t4, end=t5, value=ccc_uuid),
+    ]
+    # The related units of the unit are fetched once over the full span and
+    # shared between the intervals until the cache is cleared
+    assert mock_gql_client.get_related_units.await_count == 2
+
+
+@patch("sdtoolplus.mo.timelines.engagement.get_job_function")
+async def test_engagement_mutation_batch(mock_get_job_function: AsyncMock) -> None:
+    # Arrange
+    t1 = datetime(2001, 1, 1, tzinfo=TZ)
+    t2 = datetime(2002, 1, 1, tzinfo=TZ)
+    t3 = datetime(2003, 1, 1, tzinfo=TZ)
+    t4 = datetime(2004, 1, 1, tzinfo=TZ)
+    person = uuid4()
+    eng_uuid = uuid4()
+    unit = uuid4()
+
+    mock_get_job_function.return_value = uuid4()
+    gql_client = AsyncMock()
+    gql_client.get_data = MagicMock()
+    gql_client.get_engagement_timeline.return_value = parse_obj_as(
+        GetEngagementTimelineEngagements,
+        {
+            "objects": [
+                {
+                    "uuid": str(eng_uuid),
+                    "validities": [
+                        {
+                            "user_key": "12345",
+                            "primary_uuid": None,
+                            "validity": {"from": t1.isoformat(), "to": None},
+                            "extension_1": "name",
+                            "extension_2": "ext2",
+                            "extension_3": None,
+                            "extension_4": None,
+                            "extension_5": None,
+                            "extension_6": None,
+                            "extension_7": None,
+                            "extension_8": None,
+                            "extension_9": None,
+                            "extension_10": None,
+                            "employee_uuid": str(person),
+                            "org_unit_uuid": str(unit),
+                            "engagement_type_uuid": str(uuid4()),
+                            "job_function_uuid": str(uuid4()),
+                        }
+                    ],
+                }
+            ]
+        },
+    )
+
+    desired_eng_timeline = EngagementTimeline(
+        eng_active=Timeline[Active](intervals=(Active(start=t1, end=t4, value=True),)),
+        eng_key=Timeline[EngagementKey](
+            intervals=(EngagementKey(start=t1, end=t4, value="1"),)
+        ),
+        eng_name=Timeline[EngagementName](
+            intervals=(EngagementName(start=t1, end=t4, value="new name"),)
+        ),
+        eng_unit=Timeline[EngagementUnit](
+            intervals=(EngagementUnit(start=t1, end=t4, value=unit),)
+        ),
+        eng_sd_unit=Timeline[EngagementSDUnit](
+            intervals=(EngagementSDUnit(start=t1, end=t4, value=unit),)
+        ),
+        eng_unit_id=Timeline[EngagementUnitId](
+            intervals=(EngagementUnitId(start=t1, end=t4, value="ABCD"),)
+        ),
+        eng_type=Timeline[EngagementType](
+            intervals=(
+                EngagementType(start=t1, end=t4, value=EngType.MONTHLY_FULL_TIME),
+            )
+        ),
+    )
+    eng_types = {eng_type: uuid4() for eng_type in EngType}
+
+    batch = EngagementMutationBatch(
+        gql_client=gql_client, person=person, user_key="12345", batch_size=10
+    )
+
+    # Act
+    await batch.terminate(t3, t4)
+    await batch.create_or_update(t2, t3, desired_eng_timeline, eng_types)
+    await batch.create_or_update(t1, t2, desired_eng_timeline, eng_types)
+    await batch.flush()
+
+    # Assert
+    gql_client.get_engagement_timeline.assert_awaited_once()
+    gql_client.execute.assert_awaited_once()
+    query = gql_client.execute.call_args.kwargs["query"]
+    variables = gql_client.execute.call_args.kwargs["variables"]
+    assert query.index("m0: engagement_terminate(input: $input0)") < query.index(
+        "m1: engagement_update(input: $input1)"
+    )
+    assert "m2: engagement_update(input: $input2)" in query
+    assert variables["input0"].uuid == eng_uuid
+    assert variables["input1"].validity == RAValidityInput(
+        from_=t2, to=datetime(2002, 12, 31, tzinfo=TZ)
+    )
+    assert variables["input1"].extension_1 == "new name"
+    assert variables["input1"].extension_2 == "ext2"
+    assert variables["input2"].validity == RAValidityInput(
+        from_=t1, to=datetime(2001, 12, 31, tzinfo=TZ)
+    )
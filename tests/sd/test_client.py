@@ -0,0 +1,331 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from datetime import date
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+from uuid import UUID
+from uuid import uuid4
+
+import pytest
+from respx import MockRouter
+from sdclient.exceptions import SDCallError
+from sdclient.exceptions import SDParentNotFound
+from sdclient.requests import GetDepartmentRequest
+from sdclient.responses import DepartmentParentHistoryObj
+from sdclient.responses import GetOrganizationResponse
+
+from sdtoolplus.sd.cache import SDResponseCache
+from sdtoolplus.sd.client import AsyncSDClient
+from sdtoolplus.sd.client import get_department_parent_map
+from sdtoolplus.sd.ratelimit import SDRateLimiter
+
+DEPARTMENT_REQUEST = GetDepartmentRequest(
+    InstitutionIdentifier="II",
+    ActivationDate=date(2001, 1, 1),
+    DeactivationDate=date(2001, 1, 1),
+    DepartmentNameIndicator=True,
+    UUIDIndicator=True,
+)
+
+
+async def test_get_department(respx_mock: MockRouter) -> None:
+    # Arrange
+    dep_uuid = uuid4()
+    route = respx_mock.get(
+        "https://service.sd.dk/sdws/GetDepartment20111201?InstitutionIdentifier=II&ActivationDate=01.01.2001&DeactivationDate=01.01.2001&ContactInformationIndicator=False&DepartmentNameIndicator=True&PostalAddressIndicator=False&UUIDIndicator=True"
+    ).respond(
+        content_type="text/xml;charset=UTF-8",
+        content=f"""<?xml version="1.0" encoding="UTF-8"?>
+            <GetDepartment20111201 creationDateTime="2025-02-18T10:41:08">
+                <RegionIdentifier>RI</RegionIdentifier>
+                <InstitutionIdentifier>II</InstitutionIdentifier>
+                <Department>
+                    <ActivationDate>2001-01-01</ActivationDate>
+                    <DeactivationDate>9999-12-31</DeactivationDate>
+                    <DepartmentIdentifier>ABCD</DepartmentIdentifier>
+                    <DepartmentUUIDIdentifier>{dep_uuid}</DepartmentUUIDIdentifier>
+                    <DepartmentLevelIdentifier>NY0-niveau</DepartmentLevelIdentifier>
+                    <DepartmentName>name1</DepartmentName>
+                </Department>
+            </GetDepartment20111201>
+        """,
+    )
+
+    # Act
+    async with AsyncSDClient("user", "secret") as sd_client:
+        response = await sd_client.get_department(DEPARTMENT_REQUEST)
+        await sd_client.get_department(DEPARTMENT_REQUEST)
+
+    # Assert
+    assert route.call_count == 2
+    assert len(response.Department) == 1
+    assert response.Department[0].DepartmentUUIDIdentifier == dep_uuid
+    assert response.Department[0].DepartmentName == "name1"
+
+
+@pytest.mark.parametrize(
+    "status_code, content",
+    [
+        (500, ""),
+        (200, "<html>The webservice has failed</html>"),
+    ],
+)
+async def test_call_sd_raises_sd_call_error(
+    respx_mock: MockRouter, status_code: int, content: str
+) -> None:
+    # Arrange
+    respx_mock.get(url__startswith="https://service.sd.dk/sdws/").respond(
+        status_code=status_code, content=content
+    )
+
+    # Act + Assert
+    async with AsyncSDClient("user", "secret") as sd_client:
+        with pytest.raises(SDCallError):
+            await sd_client.get_department(DEPARTMENT_REQUEST)
+
+
+async def test_get_department_parent_history_not_found(respx_mock: MockRouter) -> None:
+    # Arrange
+    dep_uuid = uuid4()
+    respx_mock.get(
+        f"https://service.sd.dk/api-gateway/organization/public/api/v1/organizations/uuids/{str(dep_uuid)}/department-parent-history"
+    ).respond(status_code=404)
+
+    # Act + Assert
+    async with AsyncSDClient("user", "secret") as sd_client:
+        with pytest.raises(SDParentNotFound):
+            await sd_client.get_department_parent_history(dep_uuid)
+
+
+async def test_sd_response_cache_coalesces_concurrent_requests() -> None:
+    # Arrange
+    cache = SDResponseCache(ttl=60, maxsize=10)
+    fetch = AsyncMock(return_value="response")
+
+    async def slow_fetch() -> str:
+        await asyncio.sleep(0.01)
+        return await fetch()
+
+    # Act
+    responses = await asyncio.gather(*(cache.get("key", slow_fetch) for _ in range(5)))
+    await cache.get("key", slow_fetch)
+
+    # Assert
+    assert responses == ["response"] * 5
+    fetch.assert_awaited_once()
+
+
+async def test_sd_response_cache_does_not_cache_errors() -> None:
+    # Arrange
+    cache = SDResponseCache(ttl=60, maxsize=10)
+    fetch = AsyncMock(side_effect=[SDCallError("error"), "response"])
+
+    # Act + Assert
+    with pytest.raises(SDCallError):
+        await cache.get("key", fetch)
+    assert await cache.get("key", fetch) == "response"
+    assert fetch.await_count == 2
+
+
+async def test_sd_response_cache_evicts_least_recently_used() -> None:
+    # Arrange
+    cache = SDResponseCache(ttl=60, maxsize=2)
+    fetch = AsyncMock(return_value="response")
+
+    # Act
+    await cache.get("key1", fetch)
+    await cache.get("key2", fetch)
+    await cache.get("key1", fetch)
+    await cache.get("key3", fetch)  # Evicts key2
+    await cache.get("key1", fetch)
+    await cache.get("key2", fetch)
+
+    # Assert
+    assert fetch.await_count == 4
+
+
+async def test_sd_response_cache_expires() -> None:
+    # Arrange
+    cache = SDResponseCache(ttl=60, maxsize=10)
+    fetch = AsyncMock(return_value="response")
+
+    # Act
+    with patch("sdtoolplus.sd.cache.monotonic", return_value=0):
+        await cache.get("key", fetch)
+    with patch("sdtoolplus.sd.cache.monotonic", return_value=59):
+        await cache.get("key", fetch)
+    with patch("sdtoolplus.sd.cache.monotonic", return_value=61):
+        await cache.get("key", fetch)
+
+    # Assert
+    assert fetch.await_count == 2
+
+
+async def test_get_department_parent_history_is_cached_until_invalidated(
+    respx_mock: MockRouter,
+) -> None:
+    # Arrange
+    dep_uuid = uuid4()
+    route = respx_mock.get(
+        f"https://service.sd.dk/api-gateway/organization/public/api/v1/organizations/uuids/{str(dep_uuid)}/department-parent-history"
+    ).respond(json=[])
+
+    # Act
+    async with AsyncSDClient("user", "secret", cache_ttl=60) as sd_client:
+        await sd_client.get_department_parent_history(dep_uuid)
+        await sd_client.get_department_parent_history(dep_uuid)
+        sd_client.invalidate_department(uuid4())
+        await sd_client.get_department_parent_history(dep_uuid)
+        sd_client.invalidate_department(dep_uuid)
+        await sd_client.get_department_parent_history(dep_uuid)
+
+    # Assert
+    assert route.call_count == 2
+
+
+def _get_organization(
+    afd: UUID, ny1: UUID, ny2: UUID, root: UUID
+) -> GetOrganizationResponse:
+    """
+    SD organization where afd is moved from ny1 to ny2 on 2002-01-01, and ny1
+    and ny2 are both below root, which is directly below the institution.
+    """
+
+    def dep_ref(uuid: UUID, level: str, parent: dict | None) -> dict:
+        return {
+            "DepartmentIdentifier": str(uuid)[:4],
+            "DepartmentUUIDIdentifier": str(uuid),
+            "DepartmentLevelIdentifier": level,
+            "DepartmentReference": [parent] if parent is not None else [],
+        }
+
+    root_ref = dep_ref(root, "NY1-niveau", None)
+    return GetOrganizationResponse.parse_obj(
+        {
+            "RegionIdentifier": "RI",
+            "InstitutionIdentifier": "II",
+            "DepartmentStructureName": "Org",
+            "OrganizationStructure": {},
+            "Organization": [
+                {
+                    "ActivationDate": "2001-01-01",
+                    "DeactivationDate": "2001-12-31",
+                    "DepartmentReference": [
+                        dep_ref(
+                            afd,
+                            "Afdelings-niveau",
+                            dep_ref(ny1, "NY0-niveau", root_ref),
+                        ),
+                    ],
+                },
+                {
+                    "ActivationDate": "2002-01-01",
+                    "DeactivationDate": "9999-12-31",
+                    "DepartmentReference": [
+                        dep_ref(
+                            afd,
+                            "Afdelings-niveau",
+                            dep_ref(ny2, "NY0-niveau", root_ref),
+                        ),
+                    ],
+                },
+            ],
+        }
+    )
+
+
+def test_get_department_parent_map() -> None:
+    # Arrange
+    afd, ny1, ny2, root = uuid4(), uuid4(), uuid4(), uuid4()
+
+    # Act
+    parent_map = get_department_parent_map(_get_organization(afd, ny1, ny2, root))
+
+    # Assert
+    assert parent_map == {
+        afd: [
+            DepartmentParentHistoryObj(
+                startDate=date(2001, 1, 1),
+                endDate=date(2001, 12, 31),
+                parentUuid=ny1,
+            ),
+            DepartmentParentHistoryObj(
+                startDate=date(2002, 1, 1),
+                endDate=date(9999, 12, 31),
+                parentUuid=ny2,
+            ),
+        ],
+        ny1: [
+            DepartmentParentHistoryObj(
+                startDate=date(2001, 1, 1),
+                endDate=date(2001, 12, 31),
+                parentUuid=root,
+            ),
+        ],
+        ny2: [
+            DepartmentParentHistoryObj(
+                startDate=date(2002, 1, 1),
+                endDate=date(9999, 12, 31),
+                parentUuid=root,
+            ),
+        ],
+    }
+
+
+async def test_get_department_parent_history_uses_parent_map(
+    respx_mock: MockRouter,
+) -> None:
+    # Arrange
+    afd, ny1, ny2, root = uuid4(), uuid4(), uuid4(), uuid4()
+    route = respx_mock.get(
+        url__regex=r".*/department-parent-history$",
+    ).respond(json=[])
+
+    # Act
+    async with AsyncSDClient("user", "secret", parent_map_ttl=60) as sd_client:
+        with patch.object(
+            sd_client,
+            "get_organization",
+            AsyncMock(return_value=_get_organization(afd, ny1, ny2, root)),
+        ) as mock_get_organization:
+            parents1 = await sd_client.get_department_parent_history(afd, "II")
+            parents2 = await sd_client.get_department_parent_history(ny1, "II")
+            # The unit is directly below the institution, so it is not in the map
+            await sd_client.get_department_parent_history(root, "II")
+            sd_client.invalidate_department(afd)
+            await sd_client.get_department_parent_history(afd, "II")
+
+    # Assert
+    mock_get_organization.assert_awaited_once()
+    assert [parent.parentUuid for parent in parents1] == [ny1, ny2]
+    assert [parent.parentUuid for parent in parents2] == [root]
+    assert route.call_count == 2
+
+
+@patch("sdtoolplus.sd.ratelimit.asyncio.sleep", new_callable=AsyncMock)
+async def test_sd_rate_limiter_spaces_calls(mock_sleep: AsyncMock) -> None:
+    # Arrange
+    rate_limiter = SDRateLimiter(max_requests_per_second=4)
+
+    # Act
+    with patch("sdtoolplus.sd.ratelimit.monotonic", return_value=10):
+        await asyncio.gather(*(rate_limiter.acquire() for _ in range(3)))
+    with patch("sdtoolplus.sd.ratelimit.monotonic", return_value=20):
+        await rate_limiter.acquire()
+
+    # Assert: the concurrent calls get consecutive slots 0.25 seconds apart
+    assert [call.args for call in mock_sleep.await_args_list] == [(0.25,), (0.5,)]
+
+
+@patch("sdtoolplus.sd.ratelimit.asyncio.sleep", new_callable=AsyncMock)
+async def test_sd_rate_limiter_disabled(mock_sleep: AsyncMock) -> None:
+    # Arrange
+    rate_limiter = SDRateLimiter(max_requests_per_second=0)
+
+    # Act
+    for _ in range(10):
+        await rate_limiter.acquire()
+
+    # Assert
+    mock_sleep.assert_not_awaited()
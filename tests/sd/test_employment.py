@@ -1,6 +1,17 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timezone
+from unittest.mock import AsyncMock
+
+from sdclient.requests import GetEmploymentChangedAtDateRequest
+from sdclient.responses import GetEmploymentChangedAtDateResponse
+
+from sdtoolplus.config import TIMEZONE
 from sdtoolplus.sd.employment import EmploymentStatusCode
+from sdtoolplus.sd.employment import get_changed_employments
 
 
 def test_employment_status_code_is_active():
@@ -23,3 +34,76 @@ def test_employment_status_code_is_leave():
     assert not EmploymentStatusCode.RESIGNED.is_leave()
     assert not EmploymentStatusCode.RETIRED.is_leave()
     assert not EmploymentStatusCode.DELETED.is_leave()
+
+
+async def test_get_changed_employments():
+    # Arrange
+    since = datetime(2025, 1, 1, 8, 30, tzinfo=TIMEZONE)
+    until = datetime(2025, 1, 2, 9, 45, tzinfo=TIMEZONE)
+
+    mock_sd_client = AsyncMock()
+    mock_sd_client.get_employment_changed_at_date.return_value = (
+        GetEmploymentChangedAtDateResponse.parse_obj(
+            {
+                "Person": [
+                    {
+                        "PersonCivilRegistrationIdentifier": "0101011234",
+                        "Employment": [
+                            {"EmploymentIdentifier": "12345"},
+                            {"EmploymentIdentifier": "23456"},
+                        ],
+                    },
+                    {
+                        "PersonCivilRegistrationIdentifier": "0202022345",
+                        "Employment": [{"EmploymentIdentifier": "34567"}],
+                    },
+                ]
+            }
+        )
+    )
+
+    # Act
+    changed = await get_changed_employments(mock_sd_client, "II", since, until)
+
+    # Assert
+    assert changed == {
+        ("0101011234", "12345"),
+        ("0101011234", "23456"),
+        ("0202022345", "34567"),
+    }
+    mock_sd_client.get_employment_changed_at_date.assert_awaited_once_with(
+        GetEmploymentChangedAtDateRequest(
+            InstitutionIdentifier="II",
+            ActivationDate=date(2025, 1, 1),
+            ActivationTime=time(8, 30),
+            DeactivationDate=date(2025, 1, 2),
+            DeactivationTime=time(9, 45),
+            FutureInformationIndicator=True,
+        )
+    )
+
+
+async def test_get_changed_employments_converts_to_local_time():
+    # Arrange
+    since = datetime(2025, 1, 1, 23, 30, tzinfo=timezone.utc)
+    until = datetime(2025, 6, 2, 9, 45, tzinfo=timezone.utc)
+
+    mock_sd_client = AsyncMock()
+    mock_sd_client.get_employment_changed_at_date.return_value = (
+        GetEmploymentChangedAtDateResponse.parse_obj({"Person": []})
+    )
+
+    # Act
+    await get_changed_employments(mock_sd_client, "II", since, until)
+
+    # Assert
+    mock_sd_client.get_employment_changed_at_date.assert_awaited_once_with(
+        GetEmploymentChangedAtDateRequest(
+            InstitutionIdentifier="II",
+            ActivationDate=date(2025, 1, 2),
+            ActivationTime=time(0, 30),
+            DeactivationDate=date(2025, 6, 2),
+            DeactivationTime=time(11, 45),
+            FutureInformationIndicator=True,
+        )
+    )
@@ -1,7 +1,7 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
 from datetime import date
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
 
 import pytest
 from sdclient.exceptions import SDCallError
@@ -26,7 +26,7 @@ async def test_get_sd_departments_calls_client_with_correct_params(
     fetch_pnumber: bool,
 ) -> None:
     # Arrange
-    mock_sd_client = MagicMock()
+    mock_sd_client = AsyncMock()
     activation_date = date(2000, 1, 1)
     deactivation_date = date(2001, 1, 1)
 
@@ -58,8 +58,8 @@ async def test_get_sd_organization_retry_mechanism(
     mock_sd_get_organization_response: GetOrganizationResponse,
 ) -> None:
     # Arrange
-    mock_sd_client = MagicMock()
-    mock_sd_client.get_organization = MagicMock(
+    mock_sd_client = AsyncMock()
+    mock_sd_client.get_organization = AsyncMock(
         side_effect=[
             SDCallError("msg"),
             mock_sd_get_organization_response,
@@ -77,8 +77,8 @@ async def test_get_sd_departments_retry_mechanism(
     mock_sd_get_department_response: GetDepartmentResponse,
 ) -> None:
     # Arrange
-    mock_sd_client = MagicMock()
-    mock_sd_client.get_department = MagicMock(
+    mock_sd_client = AsyncMock()
+    mock_sd_client.get_department = AsyncMock(
         side_effect=[
             SDCallError("msg"),
             mock_sd_get_department_response,
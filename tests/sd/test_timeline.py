@@ -3,14 +3,13 @@
 from datetime import date
 from datetime import datetime
 from datetime import timedelta
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
 from uuid import UUID
 from uuid import uuid4
 from zoneinfo import ZoneInfo
 
 import pytest
 from respx import MockRouter
-from sdclient.client import SDClient
 from sdclient.exceptions import SDParentNotFound
 from sdclient.responses import DepartmentParentHistoryObj
 from time_machine import travel
@@ -29,6 +28,7 @@ from sdtoolplus.models import EngagementUnit
 from sdtoolplus.models import EngagementUnitId
 from sdtoolplus.models import EngType
 from sdtoolplus.models import Timeline
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sync.engagement import engagement_ou_strategy_elevate_to_ny_level
 from sdtoolplus.sync.engagement import (
     engagement_ou_strategy_terminate_in_past_where_unit_unknown,
@@ -162,11 +162,13 @@ async def test_engagement_ou_strategy_elevate_to_ny_level(respx_mock: MockRouter
         ],
     )
 
-    sd_client = SDClient(sd_username="user", sd_password="secret")
+    sd_client = AsyncSDClient(sd_username="user", sd_password="secret")
 
     # Act
     desired_eng_timeline = await engagement_ou_strategy_elevate_to_ny_level(
-        sd_client=sd_client, sd_eng_timeline=sd_eng_timeline
+        sd_client=sd_client,
+        institution_identifier="II",
+        sd_eng_timeline=sd_eng_timeline,
     )
 
     # Assert
@@ -218,7 +220,7 @@ async def test_engagement_ou_strategy_elevate_to_ny_level_raise_exception_for_ho
 
     sd_eng_timeline = EngagementTimeline(eng_unit=eng_unit_timeline)
 
-    mock_sd_client = MagicMock(spec=SDClient)
+    mock_sd_client = AsyncMock(spec=AsyncSDClient)
     mock_sd_client.get_department_parent_history.return_value = [
         DepartmentParentHistoryObj(
             startDate=t1.date(),
@@ -236,7 +238,9 @@ async def test_engagement_ou_strategy_elevate_to_ny_level_raise_exception_for_ho
     # Act + Assert
     with pytest.raises(HolesInDepartmentParentsTimelineError):
         await engagement_ou_strategy_elevate_to_ny_level(
-            sd_client=mock_sd_client, sd_eng_timeline=sd_eng_timeline
+            sd_client=mock_sd_client,
+            institution_identifier="II",
+            sd_eng_timeline=sd_eng_timeline,
         )
 
 
@@ -265,13 +269,15 @@ async def test_engagement_ou_strategy_elevate_to_ny_level_parents_not_found():
 
     sd_eng_timeline = EngagementTimeline(eng_unit=eng_unit_timeline)
 
-    mock_sd_client = MagicMock(spec=SDClient)
+    mock_sd_client = AsyncMock(spec=AsyncSDClient)
     mock_sd_client.get_department_parent_history.side_effect = SDParentNotFound()
 
     # Act + Assert
     with pytest.raises(DepartmentParentsNotFoundError):
         await engagement_ou_strategy_elevate_to_ny_level(
-            sd_client=mock_sd_client, sd_eng_timeline=sd_eng_timeline
+            sd_client=mock_sd_client,
+            institution_identifier="II",
+            sd_eng_timeline=sd_eng_timeline,
         )
 
 
@@ -302,7 +308,7 @@ async def test_engagement_ou_strategy_elevate_to_ny_level_department_exceeds_par
 
     sd_eng_timeline = EngagementTimeline(eng_unit=eng_unit_timeline)
 
-    mock_sd_client = MagicMock(spec=SDClient)
+    mock_sd_client = AsyncMock(spec=AsyncSDClient)
     mock_sd_client.get_department_parent_history.return_value = [
         DepartmentParentHistoryObj(
             startDate=t2.date(),
@@ -314,7 +320,9 @@ async def test_engagement_ou_strategy_elevate_to_ny_level_department_exceeds_par
     # Act + Assert
     with pytest.raises(DepartmentValidityExceedsParentsValiditiesError):
         await engagement_ou_strategy_elevate_to_ny_level(
-            sd_client=mock_sd_client, sd_eng_timeline=sd_eng_timeline
+            sd_client=mock_sd_client,
+            institution_identifier="II",
+            sd_eng_timeline=sd_eng_timeline,
         )
 
 
@@ -1,13 +1,13 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
 from datetime import date
+from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 from unittest.mock import patch
 from uuid import UUID
 from uuid import uuid4
 
 from ramodels.mo import Validity
-from sdclient.client import SDClient
 from sdclient.responses import Department
 from sdclient.responses import DepartmentParent
 from sdclient.responses import GetDepartmentParentResponse
@@ -19,10 +19,12 @@ from sdtoolplus.mo_org_unit_importer import Address
 from sdtoolplus.mo_org_unit_importer import AddressType
 from sdtoolplus.mo_org_unit_importer import OrgUnitNode
 from sdtoolplus.models import AddressTypeUserKey
+from sdtoolplus.sd.client import AsyncSDClient
 from sdtoolplus.sd.tree import _get_extra_nodes
 from sdtoolplus.sd.tree import _get_parent_node
 from sdtoolplus.sd.tree import build_extra_tree
 from sdtoolplus.sd.tree import build_tree
+from sdtoolplus.sd.tree import get_sd_parent_map
 from sdtoolplus.sd.tree import get_sd_validity
 from tests.conftest import SharedIdentifier
 from tests.conftest import mock_get_department_parent
@@ -286,6 +288,33 @@ def test_get_extra_nodes(
     }
 
 
+def test_get_sd_parent_map(
+    mock_sd_get_organization_response: GetOrganizationResponse,
+) -> None:
+    # Act
+    parents = get_sd_parent_map(mock_sd_get_organization_response)
+
+    # Assert
+    assert parents == {
+        UUID("30000000-0000-0000-0000-000000000000"): (
+            SharedIdentifier.grandchild_org_unit_uuid
+        ),
+        UUID("40000000-0000-0000-0000-000000000000"): (
+            SharedIdentifier.grandchild_org_unit_uuid
+        ),
+        UUID("60000000-0000-0000-0000-000000000000"): UUID(
+            "50000000-0000-0000-0000-000000000000"
+        ),
+        SharedIdentifier.grandchild_org_unit_uuid: (
+            SharedIdentifier.child_org_unit_uuid
+        ),
+        UUID("50000000-0000-0000-0000-000000000000"): (
+            SharedIdentifier.child_org_unit_uuid
+        ),
+        SharedIdentifier.child_org_unit_uuid: None,
+    }
+
+
 def test_get_extra_nodes_with_no_extra(
     mock_sd_get_organization_response: GetOrganizationResponse,
     mock_sd_get_department_response: GetDepartmentResponse,
@@ -304,7 +333,7 @@ async def test__get_parent_node_returns_none_when_get_dep_parent_returns_none(
     mock__get_department_parent: MagicMock,
 ):
     # Arrange
-    sd_client = MagicMock(spec=SDClient)
+    sd_client = AsyncMock(spec=AsyncSDClient)
     ou_uuid = uuid4()
 
     # Act
@@ -322,7 +351,7 @@ async def test__get_parent_node_returns_none_when_unit_is_its_own_parent(
     mock__get_department_parent: MagicMock,
 ):
     # Arrange
-    sd_client = MagicMock(spec=SDClient)
+    sd_client = AsyncMock(spec=AsyncSDClient)
     ou_uuid = uuid4()
 
     mock__get_department_parent.return_value = GetDepartmentParentResponse(
@@ -3,7 +3,7 @@
 from datetime import datetime
 from typing import Any
 from typing import cast
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
 from uuid import uuid4
 
 import pytest
@@ -183,7 +183,7 @@ async def test_get_department_timeline(sdtoolplus_settings):
         },
     ]
 
-    mock_sd_client = MagicMock()
+    mock_sd_client = AsyncMock()
     mock_sd_client.get_department_parent_history.return_value = parse_obj_as(
         list[DepartmentParentHistoryObj], sd_parent_history_resp
     )
@@ -290,7 +290,7 @@ async def test_get_department_timeline_department_not_found(sdtoolplus_settings)
     # Arrange
     dep_uuid = uuid4()
 
-    mock_sd_client = MagicMock()
+    mock_sd_client = AsyncMock()
 
     # Act
     department_timeline = await get_department_timeline(
@@ -326,7 +326,7 @@ async def test_get_department_timeline_parent_not_found(sdtoolplus_settings):
         ],
     }
 
-    mock_sd_client = MagicMock()
+    mock_sd_client = AsyncMock()
     mock_sd_client.get_department_parent_history.side_effect = SDParentNotFound(
         "Parent history not found!"
     )
@@ -352,8 +352,8 @@ async def test_get_department_timeline_parent_not_found(sdtoolplus_settings):
 
 async def test_get_department_empty_department_list():
     # Arrange
-    mock_sd_client = MagicMock()
-    mock_sd_client.get_department = MagicMock(
+    mock_sd_client = AsyncMock()
+    mock_sd_client.get_department = AsyncMock(
         return_value=GetDepartmentResponse(
             RegionIdentifier="RI", InstitutionIdentifier="II", Department=[]
         )
@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+from uuid import uuid4
+
+from sdtoolplus.config import SDToolPlusSettings
+from sdtoolplus.exceptions import CannotProcessOrgUnitError
+from sdtoolplus.sync.org_unit import sync_ous
+
+ROOT = uuid4()
+CHILD1 = uuid4()
+CHILD2 = uuid4()
+GRANDCHILD1 = uuid4()
+GRANDCHILD2 = uuid4()
+
+PARENTS = {
+    ROOT: None,
+    CHILD1: ROOT,
+    CHILD2: ROOT,
+    GRANDCHILD1: CHILD1,
+    GRANDCHILD2: CHILD2,
+}
+
+
+@patch("sdtoolplus.sync.org_unit.sync_ou")
+async def test_sync_ous_syncs_ancestors_first(mock_sync_ou: AsyncMock) -> None:
+    # Arrange
+    events: list[tuple[str, object]] = []
+    running = 0
+    max_running = 0
+
+    async def sync_ou(org_unit, **kwargs) -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        events.append(("start", org_unit))
+        await asyncio.sleep(0.01)
+        events.append(("end", org_unit))
+        running -= 1
+
+    mock_sync_ou.side_effect = sync_ou
+
+    # Act
+    failed = await sync_ous(
+        sd_client=MagicMock(),
+        gql_client=AsyncMock(),
+        institution_identifier="II",
+        # Given in reverse order to ensure that the scheduler does the ordering
+        org_units={
+            unit: 10_000 for unit in [GRANDCHILD2, GRANDCHILD1, CHILD2, CHILD1, ROOT]
+        },
+        parents=PARENTS,
+        settings=MagicMock(spec=SDToolPlusSettings),
+        max_concurrency=10,
+    )
+
+    # Assert
+    assert failed == set()
+    assert mock_sync_ou.await_count == 5
+    for unit, parent in PARENTS.items():
+        if parent is not None:
+            assert events.index(("end", parent)) < events.index(("start", unit))
+    # The siblings are synced concurrently
+    assert max_running == 2
+
+
+@patch("sdtoolplus.sync.org_unit.sync_ou")
+async def test_sync_ous_respects_max_concurrency(mock_sync_ou: AsyncMock) -> None:
+    # Arrange
+    running = 0
+    max_running = 0
+
+    async def sync_ou(org_unit, **kwargs) -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    mock_sync_ou.side_effect = sync_ou
+
+    # Act
+    await sync_ous(
+        sd_client=MagicMock(),
+        gql_client=AsyncMock(),
+        institution_identifier="II",
+        org_units={uuid4(): 10_000 for _ in range(10)},
+        parents={},
+        settings=MagicMock(spec=SDToolPlusSettings),
+        max_concurrency=3,
+    )
+
+    # Assert
+    assert mock_sync_ou.await_count == 10
+    assert max_running == 3
+
+
+@patch("sdtoolplus.sync.org_unit.sync_ou")
+async def test_sync_ous_continues_when_a_unit_fails(mock_sync_ou: AsyncMock) -> None:
+    # Arrange
+    async def sync_ou(org_unit, **kwargs) -> None:
+        if org_unit == CHILD1:
+            raise CannotProcessOrgUnitError()
+
+    mock_sync_ou.side_effect = sync_ou
+
+    # Act
+    failed = await sync_ous(
+        sd_client=MagicMock(),
+        gql_client=AsyncMock(),
+        institution_identifier="II",
+        org_units={unit: 10_000 for unit in PARENTS},
+        parents=PARENTS,
+        settings=MagicMock(spec=SDToolPlusSettings),
+        max_concurrency=10,
+    )
+
+    # Assert
+    assert failed == {CHILD1}
+    assert mock_sync_ou.await_count == 5
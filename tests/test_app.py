@@ -10,7 +10,6 @@ from uuid import uuid4
 import pytest
 from anytree import find_by_attr  # type: ignore
 from fastramqpi.raclients.graph.client import PersistentGraphQLClient
-from httpx import Response
 from more_itertools import one
 from sdclient.responses import GetDepartmentResponse
 from sdclient.responses import GetOrganizationResponse
@@ -19,6 +18,7 @@ from sdtoolplus.app import App
 from sdtoolplus.app import _get_mo_root_uuid
 from sdtoolplus.app import _get_mo_subtree_path_for_root
 from sdtoolplus.app import _get_sd_root_uuid
+from sdtoolplus.app import execute_institutions
 from sdtoolplus.config import SDToolPlusSettings
 from sdtoolplus.mo_class import MOOrgUnitLevelMap
 from sdtoolplus.mo_org_unit_importer import OrgUnitNode
@@ -255,24 +255,6 @@ class TestApp:
             mock_graphql_execute.assert_not_called()
             mock_client_post.assert_not_called()
 
-    def test_call_apply_ny_logic(self, sdtoolplus_settings: SDToolPlusSettings) -> None:
-        # Arrange
-        app: App = self._get_app_instance(sdtoolplus_settings)
-        org_unit_uuid: OrgUnitUUID = uuid4()
-        mock_response = MagicMock(spec_set=Response)
-        with patch.object(
-            app.client, "post", return_value=mock_response
-        ) as mock_client_post:
-            # Act
-            app._call_apply_ny_logic(org_unit_uuid)
-
-            # Assert
-            mock_client_post.assert_called_once_with(
-                f"/trigger/apply-ny-logic/{org_unit_uuid}",
-                params={"institution_identifier": "sd_institution_identifier"},
-            )
-            mock_response.raise_for_status.assert_called_once()
-
     def _add_mock(self, stack: ExitStack, name: str, value: Any = None):
         """Mock out `name` using `value` (or None)"""
         return stack.enter_context(patch(f"sdtoolplus.app.{name}", return_value=value))
@@ -354,6 +336,34 @@ class TestApp:
             # Assert
             assert mock_get_sd_tree.call_args.args[3] == mo_org_uuid
 
+    @patch("sdtoolplus.app.get_graphql_client")
+    @patch("sdtoolplus.app.get_sd_tree")
+    async def test_get_sd_tree_uses_shared_sd_client(
+        self,
+        mock_get_sd_tree: MagicMock,
+        mock_get_graphql_client: MagicMock,
+        mock_graphql_session,
+        mock_mo_org_tree_import,
+        sdtoolplus_settings: SDToolPlusSettings,
+    ):
+        with ExitStack() as stack:
+            # Arrange
+            mock_get_graphql_client.return_value = mock_graphql_session
+            self._add_mock(stack, "MOOrgTreeImport", mock_mo_org_tree_import)
+            sd_client = MagicMock()
+
+            app_ = App(sdtoolplus_settings, sd_client=sd_client)
+
+            # Act
+            await app_.get_sd_tree(MagicMock())
+            await app_.get_sd_tree(MagicMock())
+
+            # Assert
+            assert [call.args[0] for call in mock_get_sd_tree.call_args_list] == [
+                sd_client,
+                sd_client,
+            ]
+
     def test_httpx_ny_logic_timeout(
         self,
         sdtoolplus_settings: SDToolPlusSettings,
@@ -593,3 +603,77 @@ def test__get_mo_subtree_path_for_root_multiple_inst_ids(
         UUID("30000000-0000-0000-0000-000000000000"),
         UUID("40000000-0000-0000-0000-000000000000"),
     ]
+
+
+async def test_execute_institutions(sdtoolplus_settings: SDToolPlusSettings):
+    # Arrange
+    sdtoolplus_settings.mo_subtree_paths_for_root = {"II": [], "II2": []}
+    apps = [App(sdtoolplus_settings, "II"), App(sdtoolplus_settings, "II2")]
+
+    mo_org_units = [MagicMock()]
+    mock_get_org_units = MagicMock(return_value=mo_org_units)
+    apps[0].mo_org_tree_import.get_org_units = mock_get_org_units  # type: ignore
+
+    results = {
+        app.current_inst_id: [(MagicMock(), MagicMock(), uuid4())] for app in apps
+    }
+
+    def get_mock_execute(app: App):
+        async def execute(dry_run: bool):
+            assert dry_run is True
+            for result in results[app.current_inst_id]:
+                yield result
+
+        return execute
+
+    with ExitStack() as stack:
+        mock_use_mo_org_units = [
+            stack.enter_context(patch.object(app, "use_mo_org_units")) for app in apps
+        ]
+        for app in apps:
+            stack.enter_context(
+                patch.object(app, "execute", side_effect=get_mock_execute(app))
+            )
+
+        # Act
+        actual = await execute_institutions(apps, dry_run=True, concurrency=2)
+
+    # Assert
+    assert actual == results
+    # The MO units are fetched once and shared by the apps
+    mock_get_org_units.assert_called_once_with()
+    for mock in mock_use_mo_org_units:
+        mock.assert_called_once_with(mo_org_units)
+
+
+async def test_execute_institutions_returns_errors_per_institution(
+    sdtoolplus_settings: SDToolPlusSettings,
+):
+    # Arrange
+    sdtoolplus_settings.mo_subtree_paths_for_root = {"II": [], "II2": []}
+    apps = [App(sdtoolplus_settings, "II"), App(sdtoolplus_settings, "II2")]
+    apps[0].mo_org_tree_import.get_org_units = MagicMock(return_value=[])  # type: ignore
+
+    result = (MagicMock(), MagicMock(), uuid4())
+    error = ValueError("SD is down")
+
+    async def execute_ok(dry_run: bool):
+        yield result
+
+    async def execute_failing(dry_run: bool):
+        raise error
+        yield
+
+    with ExitStack() as stack:
+        for app in apps:
+            stack.enter_context(patch.object(app, "use_mo_org_units"))
+        stack.enter_context(patch.object(apps[0], "execute", side_effect=execute_ok))
+        stack.enter_context(
+            patch.object(apps[1], "execute", side_effect=execute_failing)
+        )
+
+        # Act
+        actual = await execute_institutions(apps, concurrency=2)
+
+    # Assert
+    assert actual == {"II": [result], "II2": error}
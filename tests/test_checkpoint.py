@@ -0,0 +1,40 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+from uuid import uuid4
+
+from sdtoolplus.checkpoint import ADD
+from sdtoolplus.checkpoint import UPDATE
+from sdtoolplus.checkpoint import CheckpointedTreeDiff
+from sdtoolplus.checkpoint import get_run_checkpoint
+from sdtoolplus.mo_org_unit_importer import OrgUnitNode
+
+
+def test_checkpointed_tree_diff_restores_planned_mutations():
+    # Arrange
+    root = OrgUnitNode(uuid=uuid4(), user_key="root", name="root")
+    obsolete = OrgUnitNode(uuid=uuid4(), user_key="Udgået", name="Udgået", parent=root)
+    unit = OrgUnitNode(uuid=uuid4(), user_key="A", name="A", parent=root)
+    child = OrgUnitNode(uuid=uuid4(), user_key="B", name="B", parent=unit)
+    moved = OrgUnitNode(uuid=uuid4(), user_key="C", name="C", parent=obsolete)
+
+    checkpoint = get_run_checkpoint("II", [unit, child], [moved], [obsolete.uuid])
+
+    # Act
+    tree_diff = CheckpointedTreeDiff(checkpoint)
+
+    # Assert
+    assert [entry.mutation for entry in checkpoint] == [ADD, ADD, UPDATE]
+    assert [entry.position for entry in checkpoint] == [0, 1, 2]
+
+    added = list(tree_diff.get_units_to_add())
+    updated = list(tree_diff.get_units_to_update())
+    assert [u.uuid for u in added] == [unit.uuid, child.uuid]
+    assert [u.uuid for u in updated] == [moved.uuid]
+    # Units are linked to their parents from the original tree
+    assert [u.parent.uuid for u in added + updated] == [
+        root.uuid,
+        unit.uuid,
+        obsolete.uuid,
+    ]
+    assert [u.depth for u in added + updated] == [1, 2, 1]
+    assert tree_diff.units_in_obsolete_units_subtree == {moved.uuid}
@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: MPL-2.0
 import uuid
 from unittest.mock import MagicMock
+from unittest.mock import patch
 
 from anytree.render import RenderTree  # type: ignore
 from freezegun import freeze_time
@@ -389,6 +390,74 @@ class TestOrgTreeDiff:
         assert len(org_tree_diff.nodes_processed) == 0
         assert len(org_tree_diff.engs_in_subtree) == 0
         assert len(org_tree_diff.units_with_engs) == 0
+        assert len(org_tree_diff.units_with_active_engs) == 0
+
+    def test_prefetch_units_with_active_engagements(
+        self,
+        mock_graphql_session: _MockGraphQLSession,
+        sdtoolplus_settings: SDToolPlusSettings,
+    ):
+        # Arrange
+        mo_tree, _ = MOOrgTreeImport(mock_graphql_session).as_single_tree(
+            SharedIdentifier.root_org_uuid, "", None
+        )
+        org_tree_diff = OrgTreeDiff(mo_tree, mo_tree, MagicMock(), sdtoolplus_settings)
+
+        #     root
+        #    /    \
+        #   A      B
+        #           \
+        #            C  <-- C has engagement
+        root = OrgUnitNode(uuid=uuid.uuid4(), user_key="root", name="Root")
+        A = OrgUnitNode(uuid=uuid.uuid4(), parent=root, user_key="a", name="A")
+        B = OrgUnitNode(uuid=uuid.uuid4(), parent=root, user_key="b", name="B")
+        C = OrgUnitNode(uuid=uuid.uuid4(), parent=B, user_key="c", name="C")
+
+        def page(*units: OrgUnitNode, next_cursor: str | None) -> dict:
+            return {
+                "org_units": {
+                    "objects": [
+                        {
+                            "current": {
+                                "uuid": str(unit.uuid),
+                                "engagements": (
+                                    [{"uuid": str(uuid.uuid4())}] if unit is C else []
+                                ),
+                            }
+                        }
+                        for unit in units
+                    ],
+                    "page_info": {"next_cursor": next_cursor},
+                }
+            }
+
+        gql_client = MagicMock()
+        gql_client.execute.side_effect = [
+            page(root, A, next_cursor="cursor"),
+            page(B, C, next_cursor=None),
+        ]
+
+        # Act
+        with patch(
+            "sdtoolplus.diff_org_trees.get_graphql_client", return_value=gql_client
+        ):
+            org_tree_diff._prefetch_units_with_active_engagements([root])
+
+        # Assert
+        assert gql_client.execute.call_count == 2
+        first_call, second_call = gql_client.execute.call_args_list
+        assert set(first_call.kwargs["variable_values"]["uuids"]) == {
+            str(node.uuid) for node in (root, A, B, C)
+        }
+        assert first_call.kwargs["variable_values"]["cursor"] is None
+        assert second_call.kwargs["variable_values"]["cursor"] == "cursor"
+        assert org_tree_diff.units_with_active_engs == {C.uuid}
+
+        # The subtree checks are answered without querying MO again
+        assert org_tree_diff._subtree_has_active_engagements(root) is True
+        assert org_tree_diff._subtree_has_active_engagements(A) is False
+        assert gql_client.execute.call_count == 2
+        assert org_tree_diff.units_with_engs == {("C", C.uuid)}
 
 
 def test_uuid_to_nodes_map(
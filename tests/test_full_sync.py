@@ -0,0 +1,118 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from sdclient.exceptions import SDCallError
+from sqlalchemy import Engine
+
+from sdtoolplus.db.rundb import get_full_sync_cursor
+from sdtoolplus.full_sync import queue_all_sd_employments
+from sdtoolplus.models import Person
+
+
+def _get_person(cpr: str) -> Person:
+    return Person(cpr=cpr, given_name="Chuck", surname="Norris")
+
+
+async def _get_sd_person_engagements(
+    sd_client: AsyncMock, institution_identifier: str, cpr: str
+) -> MagicMock:
+    # One employment per person with the last digits of the CPR as identifier
+    employment = MagicMock(EmploymentIdentifier=cpr[-2:])
+    return MagicMock(Person=[MagicMock(Employment=[employment])])
+
+
+@patch("sdtoolplus.full_sync.get_sd_person_engagements")
+async def test_queue_all_sd_employments(
+    mock_get_sd_person_engagements: AsyncMock, sqlite_engine: Engine
+) -> None:
+    # Arrange
+    cprs = [f"01010112{i:02}" for i in range(10)]
+    mock_get_sd_person_engagements.side_effect = _get_sd_person_engagements
+    publisher = AsyncMock()
+
+    # Act
+    error_cprs = await queue_all_sd_employments(
+        sd_client=AsyncMock(),
+        publisher=publisher,
+        engine=sqlite_engine,
+        institution_identifier="II",
+        sd_persons=[_get_person(cpr) for cpr in reversed(cprs)]
+        + [_get_person("0101010000")],
+        concurrency=3,
+    )
+
+    # Assert
+    assert error_cprs == []
+    # Persons with a CPR ending in 0000 are skipped
+    assert (
+        sorted(
+            call.kwargs["cpr"]
+            for call in mock_get_sd_person_engagements.await_args_list
+        )
+        == cprs
+    )
+    assert publisher.publish.await_count == 10
+    # The cursor is removed when the sync completes
+    assert await get_full_sync_cursor(sqlite_engine, "II") is None
+
+
+@patch("sdtoolplus.full_sync.get_sd_person_engagements")
+async def test_queue_all_sd_employments_failure_and_resume(
+    mock_get_sd_person_engagements: AsyncMock, sqlite_engine: Engine
+) -> None:
+    # Arrange
+    cprs = [f"01010112{i:02}" for i in range(6)]
+    failing_cpr = cprs[3]
+
+    async def get_sd_person_engagements(sd_client, institution_identifier, cpr):
+        if cpr == failing_cpr:
+            raise SDCallError("SD is closed")
+        return await _get_sd_person_engagements(sd_client, institution_identifier, cpr)
+
+    mock_get_sd_person_engagements.side_effect = get_sd_person_engagements
+    sd_persons = [_get_person(cpr) for cpr in cprs]
+
+    # Act
+    error_cprs = await queue_all_sd_employments(
+        sd_client=AsyncMock(),
+        publisher=AsyncMock(),
+        engine=sqlite_engine,
+        institution_identifier="II",
+        sd_persons=sd_persons,
+        concurrency=2,
+    )
+
+    # Assert
+    assert error_cprs == [failing_cpr]
+    cursor = await get_full_sync_cursor(sqlite_engine, "II")
+    assert cursor is not None
+    # The cursor stops before the person who failed
+    assert cursor.cpr == cprs[2]
+    assert (cursor.processed, cursor.total) == (6, 6)
+
+    # Act: resume from the cursor when SD is available again
+    mock_get_sd_person_engagements.reset_mock()
+    mock_get_sd_person_engagements.side_effect = _get_sd_person_engagements
+    error_cprs = await queue_all_sd_employments(
+        sd_client=AsyncMock(),
+        publisher=AsyncMock(),
+        engine=sqlite_engine,
+        institution_identifier="II",
+        sd_persons=sd_persons,
+        concurrency=2,
+        resume_after=cursor.cpr,
+    )
+
+    # Assert
+    assert error_cprs == []
+    assert (
+        sorted(
+            call.kwargs["cpr"]
+            for call in mock_get_sd_person_engagements.await_args_list
+        )
+        == cprs[3:]
+    )
+    assert await get_full_sync_cursor(sqlite_engine, "II") is None
@@ -1,5 +1,6 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+import time
 from unittest.mock import MagicMock
 from unittest.mock import patch
 from uuid import UUID
@@ -75,9 +76,41 @@ class TestMOOrgTreeImport:
             )
         ]
 
+    def test_get_org_units_is_paginated(self, mock_graphql_session):
+        # Arrange
+        org_units = mock_graphql_session.tree_as_flat_list_of_dicts
+        session = MagicMock()
+        session.execute.side_effect = [
+            {
+                "org_units": {
+                    "objects": [{"current": org_units[0]}, {"current": None}],
+                    "page_info": {"next_cursor": "cursor1"},
+                }
+            },
+            {
+                "org_units": {
+                    "objects": [{"current": org_units[1]}],
+                    "page_info": {"next_cursor": None},
+                }
+            },
+        ]
+        instance = MOOrgTreeImport(session, page_size=2)
+
+        # Act
+        actual = instance.get_org_units()
+
+        # Assert
+        assert actual == parse_obj_as(list[OrgUnit], org_units)
+        assert [
+            call.kwargs["variable_values"] for call in session.execute.call_args_list
+        ] == [
+            {"uuids": None, "limit": 2, "cursor": None},
+            {"uuids": None, "limit": 2, "cursor": "cursor1"},
+        ]
+
     def test_build_trees(self, mock_graphql_session):
         instance = MOOrgTreeImport(mock_graphql_session)
-        trees = instance._build_trees(
+        trees = instance.build_trees(
             parse_obj_as(list[OrgUnit], mock_graphql_session.tree_as_flat_list_of_dicts)
         )
         assert trees == mock_graphql_session.expected_trees
@@ -89,7 +122,42 @@ class TestMOOrgTreeImport:
         org_uuid, org_units = flat_org_units
         with patch.object(MOOrgTreeImport, "get_org_uuid", return_value=org_uuid):
             instance = MOOrgTreeImport(None)
-            instance._build_trees(org_units)
+            instance.build_trees(org_units)
+
+    def test_build_trees_benchmark_large_tree(self):
+        # Arrange: a synthetic tree with 10 roots and 20.000 units in total, where
+        # each unit has 10 children. The units are given in reverse order to
+        # ensure that the children are listed before their parents.
+        org_uuid = uuid4()
+        org_units: list[OrgUnit] = []
+        parents = [org_uuid]
+        while len(org_units) < 20_000:
+            unit = OrgUnit(
+                uuid=uuid4(),
+                parent_uuid=parents[len(org_units) // 10],
+                user_key="unit",
+                name="unit",
+                org_unit_level_uuid=None,
+                org_unit_hierarchy=None,
+                validity=None,
+            )
+            org_units.append(unit)
+            parents.append(unit.uuid)
+        org_units.reverse()
+
+        with patch.object(MOOrgTreeImport, "get_org_uuid", return_value=org_uuid):
+            instance = MOOrgTreeImport(None)
+
+            # Act
+            start = time.perf_counter()
+            trees = instance.build_trees(org_units)
+            duration = time.perf_counter() - start
+
+        # Assert
+        assert len(trees) == 10
+        assert sum(len(tree.descendants) + 1 for tree in trees) == 20_000
+        # The quadratic implementation took minutes for this tree
+        assert duration < 10
 
     def test_as_single_tree(self, mock_graphql_session):
         instance = MOOrgTreeImport(mock_graphql_session)
@@ -173,7 +241,7 @@ class TestMOOrgTreeImport:
         )
 
         instance = MOOrgTreeImport(mock_graphql_session)
-        instance._build_trees = MagicMock(return_value=[unit1, unit2])
+        instance.build_trees = MagicMock(return_value=[unit1, unit2])
 
         # Act
         actual, _ = instance.as_single_tree(
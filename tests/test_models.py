@@ -20,6 +20,7 @@ from sdtoolplus.models import EngagementUnitId
 from sdtoolplus.models import EngType
 from sdtoolplus.models import LeaveTimeline
 from sdtoolplus.models import Timeline
+from sdtoolplus.models import TimelineSegment
 from sdtoolplus.models import UnitId
 from sdtoolplus.models import UnitLevel
 from sdtoolplus.models import UnitName
@@ -285,6 +286,46 @@ def test_timeline_entity_at_no_value():
         timeline.entity_at(YESTERDAY_START - timedelta(hours=12))
 
 
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        YESTERDAY_START - timedelta(hours=12),
+        TOMORROW_START,
+        TOMORROW_START + timedelta(hours=12),
+        INFINITY,
+    ],
+)
+def test_timeline_entity_at_no_value_in_holes_and_after_end(timestamp: datetime):
+    # Arrange
+    active1 = Active(start=YESTERDAY_START, end=TODAY_START, value=True)
+    active2 = Active(start=DAY_AFTER_TOMORROW_START, end=INFINITY, value=False)
+
+    timeline = Timeline[Active](intervals=(active1, active2))
+
+    # Act + Assert
+    assert timeline.entity_at(TODAY_START - timedelta(hours=1)) == active1
+    assert timeline.entity_at(DAY_AFTER_TOMORROW_START) == active2
+    with pytest.raises(NoValueError):
+        timeline.entity_at(timestamp)
+
+
+def test_timeline_entity_at_after_copy():
+    # Arrange
+    active1 = Active(start=YESTERDAY_START, end=TODAY_START, value=True)
+    active2 = Active(start=TODAY_START, end=TOMORROW_START, value=False)
+
+    timeline = Timeline[Active](intervals=(active1,))
+    timeline.entity_at(YESTERDAY_START)
+
+    # Act
+    copied = timeline.copy(update={"intervals": (active2,)})
+
+    # Assert
+    assert copied.entity_at(TODAY_START) == active2
+    with pytest.raises(NoValueError):
+        copied.entity_at(YESTERDAY_START)
+
+
 def test_timeline_get_interval_endpoints():
     # Arrange
     t1 = datetime(2001, 1, 1, tzinfo=TZ)
@@ -449,6 +490,72 @@ def test_unit_timeline_get_ou_interval_endpoints():
     assert endpoints == {t1, t2, t3, t4, t5, t6, t7}
 
 
+def test_timeline_diff():
+    """
+    Test that the diff yields the segments where the two timelines differ:
+
+    Time  ------t1--------t2--------t3--------t4--------t5------>
+
+    Self (active) |---------------------------------------|
+    Self (key)    |---1---|---2-----|         |----4------|
+
+    Other (active)|---------------------------------------|
+    Other (key)   |---1---|----------3--------|----4------|
+
+    Diff          |--eq---|--diff---|--diff---|----eq-----|
+    """
+    # Arrange
+    t1 = datetime(2001, 1, 1, tzinfo=TZ)
+    t2 = datetime(2002, 1, 1, tzinfo=TZ)
+    t3 = datetime(2003, 1, 1, tzinfo=TZ)
+    t4 = datetime(2004, 1, 1, tzinfo=TZ)
+    t5 = datetime(2005, 1, 1, tzinfo=TZ)
+
+    active = Timeline[Active](intervals=(Active(start=t1, end=t5, value=True),))
+    timeline = EngagementTimeline(
+        eng_active=active,
+        eng_key=Timeline[EngagementKey](
+            intervals=(
+                EngagementKey(start=t1, end=t2, value="1"),
+                EngagementKey(start=t2, end=t3, value="2"),
+                EngagementKey(start=t4, end=t5, value="4"),
+            )
+        ),
+    )
+    other = EngagementTimeline(
+        eng_active=active,
+        eng_key=Timeline[EngagementKey](
+            intervals=(
+                EngagementKey(start=t1, end=t2, value="1"),
+                EngagementKey(start=t2, end=t4, value="3"),
+                EngagementKey(start=t4, end=t5, value="4"),
+            )
+        ),
+    )
+
+    # Act
+    segments = list(timeline.diff(other))
+
+    # Assert
+    assert segments == [
+        TimelineSegment(
+            start=t2,
+            end=t3,
+            values={"eng_active": True, "eng_key": "2"},
+            other_values={"eng_active": True, "eng_key": "3"},
+        ),
+        TimelineSegment(
+            start=t3,
+            end=t4,
+            values={"eng_active": True},
+            other_values={"eng_active": True, "eng_key": "3"},
+        ),
+    ]
+    for segment in segments:
+        assert not timeline.equal_at(segment.start, other)
+    assert list(other.diff(other)) == []
+
+
 def test_is_equal_no_parent():
     """Test the comparison 'equal_at' in the case where one timeline is not active and the other has no parent in the same interval
         We are testing this scenario:
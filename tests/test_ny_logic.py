@@ -0,0 +1,131 @@
+# SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+from uuid import uuid4
+
+import httpx
+import pytest
+from respx import MockRouter
+from sqlalchemy import Engine
+
+from sdtoolplus.db.rundb import get_apply_ny_logic_failures
+from sdtoolplus.db.rundb import persist_apply_ny_logic_failure
+from sdtoolplus.ny_logic import ApplyNYLogicDispatcher
+
+BASE_URL = "http://sdlon:8000"
+
+
+def _get_dispatcher(client: httpx.AsyncClient, engine=None) -> ApplyNYLogicDispatcher:
+    return ApplyNYLogicDispatcher(
+        client, "II", engine, concurrency=2, retries=2, retry_backoff=1
+    )
+
+
+async def test_dispatcher_calls_apply_ny_logic(respx_mock: MockRouter) -> None:
+    # Arrange
+    org_unit_uuids = [uuid4() for _ in range(5)]
+    route = respx_mock.post(
+        url__startswith=f"{BASE_URL}/trigger/apply-ny-logic/",
+        params={"institution_identifier": "II"},
+    ).respond(200)
+
+    # Act
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        async with _get_dispatcher(client) as dispatcher:
+            for org_unit_uuid in org_unit_uuids:
+                dispatcher.submit(org_unit_uuid)
+
+    # Assert
+    assert route.call_count == 5
+    assert {call.request.url.path for call in route.calls} == {
+        f"/trigger/apply-ny-logic/{org_unit_uuid}" for org_unit_uuid in org_unit_uuids
+    }
+    assert dispatcher.failed == []
+
+
+@patch("sdtoolplus.ny_logic.asyncio.sleep", new_callable=AsyncMock)
+async def test_dispatcher_retries_with_backoff(
+    mock_sleep: AsyncMock, respx_mock: MockRouter, sqlite_engine: Engine
+) -> None:
+    # Arrange
+    org_unit_uuid = uuid4()
+    await persist_apply_ny_logic_failure(sqlite_engine, "II", org_unit_uuid, "error")
+
+    route = respx_mock.post(f"{BASE_URL}/trigger/apply-ny-logic/{org_unit_uuid}").mock(
+        side_effect=[
+            httpx.Response(500),
+            httpx.ConnectError("Connection refused"),
+            httpx.Response(200),
+        ]
+    )
+
+    # Act
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        async with _get_dispatcher(client, sqlite_engine) as dispatcher:
+            dispatcher.submit(org_unit_uuid)
+
+    # Assert
+    assert route.call_count == 3
+    assert [call.args for call in mock_sleep.await_args_list] == [(1,), (2,)]
+    assert dispatcher.failed == []
+    # The failure recorded in a previous run is removed
+    assert await get_apply_ny_logic_failures(sqlite_engine, "II") == []
+
+
+@patch("sdtoolplus.ny_logic.asyncio.sleep", new_callable=AsyncMock)
+async def test_dispatcher_records_failures(
+    mock_sleep: AsyncMock, respx_mock: MockRouter, sqlite_engine: Engine
+) -> None:
+    # Arrange
+    failing_uuid = uuid4()
+    ok_uuid = uuid4()
+    failing_route = respx_mock.post(
+        f"{BASE_URL}/trigger/apply-ny-logic/{failing_uuid}"
+    ).respond(500)
+    respx_mock.post(f"{BASE_URL}/trigger/apply-ny-logic/{ok_uuid}").respond(200)
+
+    # Act
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        async with _get_dispatcher(client, sqlite_engine) as dispatcher:
+            dispatcher.submit(failing_uuid)
+            dispatcher.submit(ok_uuid)
+
+    # Assert
+    assert failing_route.call_count == 3
+    assert dispatcher.failed == [failing_uuid]
+    assert await get_apply_ny_logic_failures(sqlite_engine, "II") == [failing_uuid]
+    assert await get_apply_ny_logic_failures(sqlite_engine, "AB") == []
+
+
+async def test_dispatcher_records_unprocessed_units_on_error(
+    respx_mock: MockRouter, sqlite_engine: Engine
+) -> None:
+    # Arrange
+    org_unit_uuids = [uuid4() for _ in range(4)]
+    started = asyncio.Event()
+
+    async def hang(request: httpx.Request) -> httpx.Response:
+        started.set()
+        await asyncio.Event().wait()
+        raise AssertionError("unreachable")
+
+    respx_mock.post(url__startswith=f"{BASE_URL}/trigger/apply-ny-logic/").mock(
+        side_effect=hang
+    )
+
+    # Act
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        with pytest.raises(ValueError):
+            async with _get_dispatcher(client, sqlite_engine) as dispatcher:
+                for org_unit_uuid in org_unit_uuids:
+                    dispatcher.submit(org_unit_uuid)
+                await started.wait()
+                raise ValueError("Run failed")
+
+    # Assert: the units in flight and the queued units are all recorded
+    assert sorted(dispatcher.failed) == sorted(org_unit_uuids)
+    assert sorted(await get_apply_ny_logic_failures(sqlite_engine, "II")) == sorted(
+        org_unit_uuids
+    )
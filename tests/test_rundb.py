@@ -1,51 +1,223 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
-from sqlalchemy import create_engine
+from datetime import datetime
+from datetime import timedelta
+from uuid import uuid4
 
-from sdtoolplus.db.models import Base
+from freezegun import freeze_time
+from more_itertools import one
+from sqlalchemy import Engine
+
+from sdtoolplus.config import TIMEZONE
+from sdtoolplus.db.models import RunCheckpoint
 from sdtoolplus.db.rundb import Status
+from sdtoolplus.db.rundb import delete_engagement_fingerprints
 from sdtoolplus.db.rundb import delete_last_run
+from sdtoolplus.db.rundb import delete_run_checkpoint
+from sdtoolplus.db.rundb import get_employment_change_watermark
+from sdtoolplus.db.rundb import get_engagement_fingerprint
+from sdtoolplus.db.rundb import get_full_sync_cursor
+from sdtoolplus.db.rundb import get_pending_run_checkpoint
+from sdtoolplus.db.rundb import get_runs
 from sdtoolplus.db.rundb import get_status
+from sdtoolplus.db.rundb import has_run_checkpoint
+from sdtoolplus.db.rundb import mark_run_checkpoint_applied
+from sdtoolplus.db.rundb import persist_employment_change_watermark
+from sdtoolplus.db.rundb import persist_engagement_fingerprint
+from sdtoolplus.db.rundb import persist_full_sync_cursor
+from sdtoolplus.db.rundb import persist_run_checkpoint
 from sdtoolplus.db.rundb import persist_status
+from sdtoolplus.db.rundb import run_db_end_operations
+
+
+async def test_persist_and_get_status(sqlite_engine: Engine):
+    # Act
+    await persist_status(sqlite_engine, Status.COMPLETED)
+    await persist_status(sqlite_engine, Status.RUNNING)
+    status = await get_status(sqlite_engine)
+
+    # Assert
+    assert status == Status.RUNNING
+
+
+async def test_status_is_completed_for_empty_table(sqlite_engine: Engine):
+    # Act
+    status = await get_status(sqlite_engine)
+
+    # Assert
+    assert status == Status.COMPLETED
+
+
+async def test_delete_last_run(sqlite_engine: Engine):
+    # Arrange
+    await persist_status(sqlite_engine, Status.COMPLETED)
+    await persist_status(sqlite_engine, Status.RUNNING)
+
+    # Act
+    await delete_last_run(sqlite_engine)
+
+    # Assert
+    status = await get_status(sqlite_engine)
+    assert status == Status.COMPLETED
 
 
-async def test_persist_and_get_status():
+async def test_dry_runs_are_ignored_by_status(sqlite_engine: Engine):
     # Arrange
-    engine = create_engine("sqlite:///:memory:")
-    Base.metadata.create_all(engine)
+    await persist_status(sqlite_engine, Status.RUNNING)
 
     # Act
-    await persist_status(engine, Status.COMPLETED)
-    await persist_status(engine, Status.RUNNING)
-    status = await get_status(engine)
+    await persist_status(sqlite_engine, Status.COMPLETED, dry_run=True)
+    status = await get_status(sqlite_engine)
+    await delete_last_run(sqlite_engine)
 
     # Assert
     assert status == Status.RUNNING
+    runs = await get_runs(sqlite_engine, 10)
+    assert [(run.status, run.dry_run) for run in runs] == [("completed", True)]
 
 
-async def test_status_is_completed_for_empty_table():
+@freeze_time("2025-01-01 12:00:00")
+async def test_run_db_end_operations_records_statistics(sqlite_engine: Engine):
     # Arrange
-    engine = create_engine("sqlite:///:memory:")
-    Base.metadata.create_all(engine)
+    started = datetime.now(tz=TIMEZONE) - timedelta(seconds=90)
 
     # Act
-    status = await get_status(engine)
+    await run_db_end_operations(
+        sqlite_engine, False, "II", started, units_added=3, units_updated=2
+    )
+    await run_db_end_operations(sqlite_engine, True, "AB")
 
     # Assert
-    assert status == Status.COMPLETED
+    dry_run, run = await get_runs(sqlite_engine, 10)
+    assert run.status == "completed"
+    assert run.institution_identifier == "II"
+    assert run.dry_run is False
+    assert run.duration == 90
+    assert run.units_added == 3
+    assert run.units_updated == 2
+
+    assert dry_run.institution_identifier == "AB"
+    assert dry_run.dry_run is True
+    assert dry_run.duration is None
+    assert dry_run.units_added is None
+
 
+async def test_run_db_end_operations_records_failed_run(sqlite_engine: Engine):
+    # Act
+    await run_db_end_operations(
+        sqlite_engine, False, units_added=1, units_updated=0, status=Status.FAILED
+    )
+
+    # Assert
+    assert await get_status(sqlite_engine) == Status.FAILED
+    run = one(await get_runs(sqlite_engine, 10))
+    assert run.units_added == 1
 
-async def test_delete_last_run():
+
+async def test_persist_and_get_employment_change_watermark(sqlite_engine: Engine):
     # Arrange
-    engine = create_engine("sqlite:///:memory:")
-    Base.metadata.create_all(engine)
+    t1 = datetime(2025, 1, 1, 12, 0, 0)
+    t2 = datetime(2025, 1, 2, 12, 0, 0)
+
+    # Act
+    before = await get_employment_change_watermark(sqlite_engine, "II")
+    await persist_employment_change_watermark(sqlite_engine, "II", t1)
+    await persist_employment_change_watermark(sqlite_engine, "II", t2)
+    await persist_employment_change_watermark(sqlite_engine, "AB", t1)
 
-    await persist_status(engine, Status.COMPLETED)
-    await persist_status(engine, Status.RUNNING)
+    # Assert
+    assert before is None
+    assert await get_employment_change_watermark(sqlite_engine, "II") == t2
+    assert await get_employment_change_watermark(sqlite_engine, "AB") == t1
+
+
+async def test_run_checkpoint(sqlite_engine: Engine):
+    # Arrange
+    unit1, unit2 = uuid4(), uuid4()
+    checkpoint = [
+        RunCheckpoint(
+            institution_identifier="II",
+            org_unit_uuid=org_unit_uuid,
+            position=position,
+            mutation="add",
+            parent_uuid=uuid4(),
+            name=f"Unit {position}",
+            user_key=f"U{position}",
+            in_obsolete_units_subtree=False,
+            applied=False,
+        )
+        for position, org_unit_uuid in enumerate([unit1, unit2])
+    ]
 
     # Act
-    await delete_last_run(engine)
+    await persist_run_checkpoint(sqlite_engine, "II", checkpoint)
+    await mark_run_checkpoint_applied(sqlite_engine, "II", unit1)
 
     # Assert
-    status = await get_status(engine)
-    assert status == Status.COMPLETED
+    assert await has_run_checkpoint(sqlite_engine, "II")
+    assert not await has_run_checkpoint(sqlite_engine, "AB")
+    pending = await get_pending_run_checkpoint(sqlite_engine, "II")
+    assert [entry.org_unit_uuid for entry in pending] == [unit2]
+
+    await delete_run_checkpoint(sqlite_engine, "II")
+    assert not await has_run_checkpoint(sqlite_engine, "II")
+
+
+async def test_persist_and_get_full_sync_cursor(sqlite_engine: Engine):
+    # Act
+    await persist_full_sync_cursor(sqlite_engine, "II", "0101011234", 100, 1000)
+    await persist_full_sync_cursor(sqlite_engine, "II", "0101011235", 200, 1000)
+
+    # Assert
+    cursor = await get_full_sync_cursor(sqlite_engine, "II")
+    assert cursor is not None
+    assert (cursor.cpr, cursor.processed, cursor.total) == ("0101011235", 200, 1000)
+    assert await get_full_sync_cursor(sqlite_engine, "AB") is None
+
+
+async def test_persist_get_and_delete_engagement_fingerprints(sqlite_engine: Engine):
+    # Arrange
+    unit1 = uuid4()
+    unit2 = uuid4()
+    unit3 = uuid4()
+    await persist_engagement_fingerprint(
+        sqlite_engine, "II", "0101011234", "12345", "sd1", "mo1", [unit1]
+    )
+    await persist_engagement_fingerprint(
+        sqlite_engine, "II", "0101011234", "12345", "sd2", "mo2", [unit2, unit3]
+    )
+    await persist_engagement_fingerprint(
+        sqlite_engine, "II", "0101011234", "23456", "sd3", "mo3", [unit1, unit3]
+    )
+    await persist_engagement_fingerprint(
+        sqlite_engine, "II", "0101011234", "34567", "sd4", "mo4", [unit2]
+    )
+
+    # Act
+    fingerprint = await get_engagement_fingerprint(
+        sqlite_engine, "II", "0101011234", "12345"
+    )
+    # unit1 is no longer covered by 12345, since it has been persisted again
+    await delete_engagement_fingerprints(sqlite_engine, [unit1])
+    after_unit1 = {
+        emp_id: await get_engagement_fingerprint(
+            sqlite_engine, "II", "0101011234", emp_id
+        )
+        for emp_id in ("12345", "23456", "34567")
+    }
+    await delete_engagement_fingerprints(sqlite_engine, [unit3])
+    after_unit3 = {
+        emp_id: await get_engagement_fingerprint(
+            sqlite_engine, "II", "0101011234", emp_id
+        )
+        for emp_id in ("12345", "23456", "34567")
+    }
+
+    # Assert
+    assert fingerprint is not None
+    assert (fingerprint.sd_fingerprint, fingerprint.mo_fingerprint) == ("sd2", "mo2")
+    assert {emp_id for emp_id, fp in after_unit1.items() if fp is not None} == {
+        "12345",
+        "34567",
+    }
+    assert {emp_id for emp_id, fp in after_unit3.items() if fp is not None} == {"34567"}
@@ -13,12 +13,18 @@ from sdclient.responses import EmploymentPersonWithLists
 from sdclient.responses import EmploymentStatus
 from sdclient.responses import EmploymentWithLists
 from sdclient.responses import GetEmploymentChangedResponse
+from sqlalchemy import Engine
 
 from sdtoolplus.config import SDToolPlusSettings
+from sdtoolplus.db.rundb import persist_engagement_fingerprint
 from sdtoolplus.models import Active
+from sdtoolplus.models import EngagementTimeline
+from sdtoolplus.models import LeaveTimeline
 from sdtoolplus.models import Timeline
 from sdtoolplus.models import UnitParent
 from sdtoolplus.models import UnitTimeline
+from sdtoolplus.sync.engagement import _fingerprint
+from sdtoolplus.sync.engagement import _remove_ranges
 from sdtoolplus.sync.engagement import sync_engagement
 from sdtoolplus.sync.org_unit import patch_missing_parents
 from tests.integration.conftest import UNKNOWN_UNIT
@@ -188,7 +194,7 @@ async def test_skip_missing_sd_employment_timelines(
     This scenario occurs as described in https://redmine.magenta.dk/issues/64950:
     """
     # Arrange
-    mock_sd_client = MagicMock()
+    mock_sd_client = AsyncMock()
     mock_sd_client.get_employment_changed.return_value = GetEmploymentChangedResponse(
         Person=[
             EmploymentPersonWithLists(
@@ -218,6 +224,7 @@ async def test_skip_missing_sd_employment_timelines(
     await sync_engagement(
         sd_client=mock_sd_client,
         gql_client=mock_gql_client,
+        engine=MagicMock(),
         institution_identifier="II",
         cpr="0101011234",
         employment_identifier="12345",
@@ -226,3 +233,137 @@ async def test_skip_missing_sd_employment_timelines(
 
     # Assert
     mock_get_engagement_timeline.assert_not_awaited()
+
+
+@pytest.mark.parametrize(
+    "sd_changed,mo_changed,skipped",
+    [
+        (False, False, True),
+        (True, False, False),
+        (False, True, False),
+    ],
+)
+@patch("sdtoolplus.sync.engagement.engagement_ou_strategy")
+@patch("sdtoolplus.sync.engagement.get_mo_leave_timeline")
+@patch("sdtoolplus.sync.engagement.get_engagement_timeline")
+@patch("sdtoolplus.sync.engagement.get_sd_leave_timeline")
+@patch("sdtoolplus.sync.engagement.get_employment_timeline")
+async def test_sync_engagement_skips_unchanged_engagement(
+    mock_get_employment_timeline: MagicMock,
+    mock_get_sd_leave_timeline: MagicMock,
+    mock_get_engagement_timeline: AsyncMock,
+    mock_get_mo_leave_timeline: AsyncMock,
+    mock_engagement_ou_strategy: AsyncMock,
+    settings: SDToolPlusSettings,
+    sqlite_engine: Engine,
+    sd_changed: bool,
+    mo_changed: bool,
+    skipped: bool,
+) -> None:
+    # Arrange
+    tz = ZoneInfo("Europe/Copenhagen")
+    sd_eng_timeline = EngagementTimeline(
+        eng_active=Timeline[Active](
+            intervals=(
+                Active(
+                    start=datetime(2001, 1, 1, tzinfo=tz),
+                    end=datetime(2002, 1, 1, tzinfo=tz),
+                    value=True,
+                ),
+            )
+        )
+    )
+    mock_get_employment_timeline.return_value = sd_eng_timeline
+    mock_get_sd_leave_timeline.return_value = LeaveTimeline()
+    mock_get_engagement_timeline.return_value = EngagementTimeline()
+    mock_get_mo_leave_timeline.return_value = LeaveTimeline()
+    # Stop the sync after the fingerprint check
+    mock_engagement_ou_strategy.side_effect = ValueError("Not skipped")
+
+    mock_gql_client = AsyncMock()
+    mock_gql_client.get_person.return_value = MagicMock(objects=[MagicMock()])
+
+    await persist_engagement_fingerprint(
+        sqlite_engine,
+        "II",
+        "0101011234",
+        "12345",
+        sd_fingerprint=_fingerprint(
+            EngagementTimeline() if sd_changed else sd_eng_timeline,
+            LeaveTimeline(),
+        ),
+        mo_fingerprint=_fingerprint(
+            sd_eng_timeline if mo_changed else EngagementTimeline(),
+            LeaveTimeline(),
+        ),
+        org_unit_uuids=[],
+    )
+
+    # Act
+    async def sync() -> None:
+        await sync_engagement(
+            sd_client=AsyncMock(),
+            gql_client=mock_gql_client,
+            engine=sqlite_engine,
+            institution_identifier="II",
+            cpr="0101011234",
+            employment_identifier="12345",
+            settings=settings.copy(update={"skip_unchanged_engagements": True}),
+        )
+
+    # Assert
+    if skipped:
+        await sync()
+        mock_engagement_ou_strategy.assert_not_awaited()
+    else:
+        with pytest.raises(ValueError, match="Not skipped"):
+            await sync()
+
+
+def test_remove_ranges() -> None:
+    """
+    Time  -----t1-----t2-----t3--t3.5--t4-----t5-----t6-----t7------>
+
+    Input      |------True------|------False------|      |--True---->
+    Removal           |------------|   |         |-------------|
+    Output     |-True-|            |---False-----|             |-True->
+
+    The removal range at t4 is empty and hence removes nothing.
+    """
+    # Arrange
+    tz = ZoneInfo("Europe/Copenhagen")
+
+    t1 = datetime(2001, 1, 1, tzinfo=tz)
+    t2 = datetime(2002, 1, 1, tzinfo=tz)
+    t3 = datetime(2003, 1, 1, tzinfo=tz)
+    t3_5 = datetime(2003, 7, 1, tzinfo=tz)
+    t4 = datetime(2004, 1, 1, tzinfo=tz)
+    t5 = datetime(2005, 1, 1, tzinfo=tz)
+    t6 = datetime(2006, 1, 1, tzinfo=tz)
+    t7 = datetime(2007, 1, 1, tzinfo=tz)
+    infinity = datetime.max.replace(tzinfo=tz)
+
+    timeline = Timeline[Active](
+        intervals=(
+            Active(start=t1, end=t3, value=True),
+            Active(start=t3, end=t5, value=False),
+            Active(start=t6, end=infinity, value=True),
+        )
+    )
+    removal_ranges = (
+        Active(start=t2, end=t3_5, value=True),
+        Active(start=t4, end=t4, value=True),
+        Active(start=t5, end=t7, value=True),
+    )
+
+    # Act
+    clipped = _remove_ranges(timeline, removal_ranges)
+
+    # Assert
+    assert clipped == Timeline[Active](
+        intervals=(
+            Active(start=t1, end=t2, value=True),
+            Active(start=t3_5, end=t5, value=False),
+            Active(start=t7, end=infinity, value=True),
+        )
+    )
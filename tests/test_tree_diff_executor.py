@@ -1,8 +1,11 @@
 # SPDX-FileCopyrightText: Magenta ApS <https://magenta.dk>
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
 import uuid
 from datetime import date
 from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
 from unittest.mock import patch
 
 import pytest
@@ -11,6 +14,8 @@ from graphql import GraphQLSchema
 from more_itertools import one
 from ramodels.mo import Validity
 
+from sdtoolplus.autogenerated_graphql_client import GraphQLClientGraphQLError
+from sdtoolplus.autogenerated_graphql_client import GraphQLClientGraphQLMultiError
 from sdtoolplus.config import TIMEZONE
 from sdtoolplus.config import SDToolPlusSettings
 from sdtoolplus.diff_org_trees import OrgTreeDiff
@@ -20,6 +25,7 @@ from sdtoolplus.tree_diff_executor import AddOrgUnitMutation
 from sdtoolplus.tree_diff_executor import Mutation
 from sdtoolplus.tree_diff_executor import TreeDiffExecutor
 from sdtoolplus.tree_diff_executor import UpdateOrgUnitMutation
+from sdtoolplus.tree_diff_executor import _group_by_depth
 from sdtoolplus.tree_diff_executor import _truncate_start_date
 
 from .conftest import SharedIdentifier
@@ -325,6 +331,216 @@ class TestTreeDiffExecutor:
         # Assert
         assert org_unit_node.validity.from_date == sdtoolplus_settings.min_mo_datetime  # type: ignore
 
+    async def test_execute_by_level(
+        self,
+        mock_graphql_session: _MockGraphQLSession,
+        mock_org_tree_diff: OrgTreeDiff,
+        mock_mo_org_unit_type: MOClass,
+        sdtoolplus_settings: SDToolPlusSettings,
+    ):
+        # Arrange
+        sdtoolplus_settings.tree_diff_executor_concurrency = 2
+
+        running = 0
+        max_running = 0
+        created: list[uuid.UUID] = []
+
+        async def mutate(input):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0)
+            running -= 1
+            created.append(input.uuid)
+            return SimpleNamespace(uuid=input.uuid)
+
+        gql_client = AsyncMock()
+        gql_client.create_org_unit.side_effect = mutate
+        gql_client.update_org_unit.side_effect = mutate
+
+        tree_diff_executor = TreeDiffExecutor(
+            mock_graphql_session,  # type: ignore
+            sdtoolplus_settings,
+            sdtoolplus_settings.sd_institution_identifier,
+            mock_org_tree_diff,
+            mock_mo_org_unit_type,
+            SharedIdentifier.root_org_uuid,
+            gql_client,
+        )
+
+        # Act
+        results = [x async for x in tree_diff_executor.execute()]
+
+        # Assert
+        units_to_add = list(mock_org_tree_diff.get_units_to_add())
+        units_to_update = list(mock_org_tree_diff.get_units_to_update())
+        expected = sorted(units_to_add, key=lambda u: u.depth) + sorted(
+            units_to_update, key=lambda u: u.depth
+        )
+        assert [unit for unit, _, _ in results] == expected
+        assert [result for _, _, result in results] == [u.uuid for u in expected]
+        assert all(
+            isinstance(mutation, AddOrgUnitMutation) for _, mutation, _ in results[:2]
+        )
+
+        # Each parent is created before its children
+        for unit in units_to_add:
+            if unit.parent in units_to_add:
+                assert created.index(unit.parent.uuid) < created.index(unit.uuid)
+
+        assert 1 < max_running <= 2
+
+    async def test_execute_by_level_yields_successes_before_raising(
+        self,
+        mock_graphql_session: _MockGraphQLSession,
+        mock_org_tree_diff: OrgTreeDiff,
+        mock_mo_org_unit_type: MOClass,
+        sdtoolplus_settings: SDToolPlusSettings,
+    ):
+        # Arrange
+        sdtoolplus_settings.tree_diff_executor_concurrency = 2
+
+        levels = _group_by_depth(mock_org_tree_diff.get_units_to_add())
+        failing_level = next(i for i, level in enumerate(levels) if len(level) > 1)
+        failing_unit, *succeeding_units = levels[failing_level]
+
+        async def mutate(input):
+            if input.uuid == failing_unit.uuid:
+                raise ValueError("MO is down")
+            return SimpleNamespace(uuid=input.uuid)
+
+        gql_client = AsyncMock()
+        gql_client.create_org_unit.side_effect = mutate
+        gql_client.update_org_unit.side_effect = mutate
+
+        tree_diff_executor = TreeDiffExecutor(
+            mock_graphql_session,  # type: ignore
+            sdtoolplus_settings,
+            sdtoolplus_settings.sd_institution_identifier,
+            mock_org_tree_diff,
+            mock_mo_org_unit_type,
+            SharedIdentifier.root_org_uuid,
+            gql_client,
+        )
+
+        # Act
+        results = []
+        with pytest.raises(ValueError, match="MO is down"):
+            async for result in tree_diff_executor.execute():
+                results.append(result)
+
+        # Assert
+        expected = [
+            unit for level in levels[:failing_level] for unit in level
+        ] + succeeding_units
+        assert [unit for unit, _, _ in results] == expected
+        gql_client.update_org_unit.assert_not_awaited()
+
+    async def test_add_unit_async_fixes_parent_validity_once_per_parent(
+        self,
+        mock_graphql_session: _MockGraphQLSession,
+        mock_org_tree_diff: OrgTreeDiff,
+        mock_mo_org_unit_type: MOClass,
+        sdtoolplus_settings: SDToolPlusSettings,
+    ):
+        # Arrange
+        sdtoolplus_settings.extend_parent_validities = True
+        validity = Validity(from_date=datetime(2001, 1, 1, tzinfo=TIMEZONE))
+        parent = OrgUnitNode(
+            uuid=uuid.uuid4(),
+            parent_uuid=SharedIdentifier.root_org_uuid,
+            user_key="parent",
+            name="parent",
+            validity=validity,
+        )
+        children = [
+            OrgUnitNode(
+                uuid=uuid.uuid4(),
+                parent_uuid=parent.uuid,
+                user_key=name,
+                name=name,
+                parent=parent,
+                org_unit_level_uuid=uuid.uuid4(),
+                validity=validity,
+            )
+            for name in ("child1", "child2")
+        ]
+
+        parent_fixed = False
+        updating = 0
+        max_updating = 0
+
+        async def create_org_unit(input):
+            await asyncio.sleep(0)
+            if not parent_fixed:
+                raise GraphQLClientGraphQLMultiError(
+                    errors=[
+                        GraphQLClientGraphQLError(
+                            message="ErrorCodes.V_DATE_OUTSIDE_ORG_UNIT_RANGE"
+                        )
+                    ],
+                    data={},
+                )
+            return SimpleNamespace(uuid=input.uuid)
+
+        async def update_org_unit(input):
+            nonlocal parent_fixed, updating, max_updating
+            updating += 1
+            max_updating = max(max_updating, updating)
+            await asyncio.sleep(0)
+            updating -= 1
+            parent_fixed = True
+            return SimpleNamespace(uuid=input.uuid)
+
+        gql_client = AsyncMock()
+        gql_client.create_org_unit.side_effect = create_org_unit
+        gql_client.update_org_unit.side_effect = update_org_unit
+
+        sd_client = AsyncMock()
+        sd_client.get_department.return_value = SimpleNamespace(
+            Department=[
+                SimpleNamespace(
+                    ActivationDate=date(1999, 1, 1),
+                    DeactivationDate=date(9999, 12, 31),
+                )
+            ]
+        )
+
+        tree_diff_executor = TreeDiffExecutor(
+            mock_graphql_session,  # type: ignore
+            sdtoolplus_settings,
+            sdtoolplus_settings.sd_institution_identifier,
+            mock_org_tree_diff,
+            mock_mo_org_unit_type,
+            SharedIdentifier.root_org_uuid,
+            gql_client,
+            sd_client,
+        )
+
+        # Act
+        results = await asyncio.gather(
+            *(
+                tree_diff_executor._add_unit_async(
+                    AddOrgUnitMutation(
+                        mock_graphql_session,  # type: ignore
+                        child,
+                        mock_mo_org_unit_type,
+                        SharedIdentifier.root_org_uuid,
+                    ),
+                    child,
+                )
+                for child in children
+            )
+        )
+
+        # Assert
+        assert results == [child.uuid for child in children]
+        update_input = one(gql_client.update_org_unit.await_args_list).args[0]
+        assert update_input.uuid == parent.uuid
+        assert update_input.validity.from_ == datetime(1999, 1, 1, tzinfo=TIMEZONE)
+        assert update_input.validity.to is None
+        assert max_updating == 1
+
 
 @pytest.mark.parametrize(
     "initial_start_date, expected",